@@ -8,7 +8,8 @@ import requests
 import logging
 from datetime import datetime
 from dotenv import load_dotenv
-from settings import load_settings
+from settings import load_settings, get_settings, get_endpoint_list
+from http_server import WSGIServer, server_options, notify_systemd
 import psutil
 
 app = Flask(__name__)
@@ -21,7 +22,7 @@ logger = logging.getLogger('app')
 
 def get_control_api_url():
     """Get the control service API base URL"""
-    settings = load_settings()
+    settings = get_settings()
     port = settings.get('control_port', 5001)
     return f"http://127.0.0.1:{port}"
 
@@ -69,7 +70,7 @@ def index():
     try:
         status = fetch_control_status()
         health = fetch_control_health()
-        settings = load_settings()
+        settings = get_settings()
         
         # Format snapshot data for display
         snapshot = status.get("snapshot", {}) if status and not status.get("error") else {}
@@ -161,9 +162,14 @@ def settings_page():
             settings['http_timeout_seconds'] = int(request.form.get('http_timeout_seconds', settings['http_timeout_seconds']))
             settings['heater_min_off_time_seconds'] = int(request.form.get('heater_min_off_time_seconds', settings['heater_min_off_time_seconds']))
 
-            # String values
-            settings['primary_endpoint'] = request.form.get('primary_endpoint', settings['primary_endpoint'])
-            settings['fallback_endpoint'] = request.form.get('fallback_endpoint', settings['fallback_endpoint'])
+            settings['hedge_delay_seconds'] = float(request.form.get('hedge_delay_seconds', settings.get('hedge_delay_seconds', 1)))
+
+            # Ordered endpoint list (one URL per line); primary/fallback mirror the first and last entry
+            endpoints = [line.strip() for line in request.form.get('endpoints', '').splitlines() if line.strip()]
+            if endpoints:
+                settings['endpoints'] = endpoints
+                settings['primary_endpoint'] = endpoints[0]
+                settings['fallback_endpoint'] = endpoints[-1]
 
             # Save updated settings
             with open('settings.json', 'w') as f:
@@ -175,7 +181,7 @@ def settings_page():
             flash(f'Error updating settings: {e}', 'error')
             logger.error(f"Settings update error: {e}")
     
-    return render_template('settings.html', settings=settings)
+    return render_template('settings.html', settings=settings, endpoints=get_endpoint_list(settings))
 
 @app.route('/dashboard')
 def dashboard():
@@ -363,5 +369,10 @@ if __name__ == '__main__':
     if not os.path.exists('alert_status.txt'):
         set_alert_active(False)
     
-    # Run Flask app
-    app.run(debug=False, host='0.0.0.0', port=5000)
+    # Serve on waitress; the port is bound before systemd is told we are ready
+    server = WSGIServer('0.0.0.0', 5000, app, **server_options(get_settings()))
+    notify_systemd("READY=1")
+    try:
+        server.serve_forever()
+    finally:
+        server.shutdown()
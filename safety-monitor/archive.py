@@ -0,0 +1,323 @@
+# archive.py
+# Monthly columnar archive of sky_data rows older than the live window.
+#
+# One file per calendar month (sky_data_YYYY-MM.arc) holding a sorted
+# float64 epoch column and one fixed-width column per snapshot field:
+# float32 for numeric fields (NaN = missing), int8 codes for text fields
+# (-1 = missing, code table in the header; int16 for a month with more than
+# 127 distinct values); fields without any reading that month are left out. Columns are 64-byte aligned so readers memory-map the
+# file and take zero-copy NumPy views; a time range is found by binary
+# search on the epoch column.
+#
+# Layout: b"SKYARC01", uint32 header length, JSON header, padding, columns
+# (column offsets in the header are relative to the aligned data start).
+
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+from calendar import monthrange
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app_logging import setup_logger
+from store_data import SKY_DATA_COLUMNS, TEXT_COLUMNS
+
+logger = setup_logger('archive', 'archive.log', level=logging.WARNING)
+
+MAGIC = b"SKYARC01"
+ALIGNMENT = 64
+FETCH_ROWS = 10000
+
+def column_dtype(field):
+    if field == "epoch":
+        return np.dtype("<f8")
+    return np.dtype("i1") if field in TEXT_COLUMNS else np.dtype("<f4")
+
+def code_dtype(count):
+    """Narrowest signed integer dtype for count distinct text values (-1 = missing)"""
+    for dtype in (np.dtype("i1"), np.dtype("<i2"), np.dtype("<i4")):
+        if count <= np.iinfo(dtype).max:
+            return dtype
+
+def month_bounds(year, month):
+    """Epoch seconds of the start of the month and of the next month (UTC)"""
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    days = monthrange(year, month)[1]
+    return start.timestamp(), start.timestamp() + days * 86400
+
+def month_of(epoch):
+    moment = datetime.fromtimestamp(epoch, tz=timezone.utc)
+    return moment.year, moment.month
+
+def next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+def archive_path(directory, year, month):
+    return os.path.join(directory, f"sky_data_{year:04d}-{month:02d}.arc")
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def write_archive(path, columns, codes):
+    """
+    Write a month file atomically. columns maps "epoch" and each field to a
+    NumPy array of the column dtype (same length, sorted by epoch).
+    """
+    layout, offset = [], 0
+    for name, values in columns.items():
+        layout.append({"name": name, "dtype": values.dtype.str, "offset": offset})
+        offset = _aligned(offset + values.nbytes)
+    encoded = json.dumps({"version": 1, "count": len(columns["epoch"]), "codes": codes, "columns": layout}).encode()
+    data_start = _aligned(len(MAGIC) + 4 + len(encoded))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(encoded)) + encoded)
+        for entry, values in zip(layout, columns.values()):
+            f.write(b"\0" * (data_start + entry["offset"] - f.tell()))
+            f.write(np.ascontiguousarray(values).tobytes())
+        f.write(b"\0" * (data_start + offset - f.tell()))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class ArchiveFile:
+    """Read-only memory-mapped month file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a sky_data archive")
+        (length,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self._mmap[start:start + length])
+        data_start = _aligned(start + length)
+        self.count = header["count"]
+        self.codes = header["codes"]
+        self.columns = {
+            entry["name"]: np.frombuffer(self._mmap, dtype=np.dtype(entry["dtype"]),
+                                         count=self.count, offset=data_start + entry["offset"])
+            for entry in header["columns"]
+        }
+
+    def slice(self, start, end):
+        """Index slice of start <= epoch <= end (binary search)"""
+        epochs = self.columns["epoch"]
+        return slice(int(np.searchsorted(epochs, start, side="left")),
+                     int(np.searchsorted(epochs, end, side="right")))
+
+    def read(self, field, start, end):
+        """Zero-copy (epochs, values) views for start <= epoch <= end"""
+        selected = self.slice(start, end)
+        epochs = self.columns["epoch"][selected]
+        if field not in self.columns:
+            if field not in SKY_DATA_COLUMNS:
+                raise KeyError(field)
+            # Field omitted from the file: no readings that month
+            return epochs, np.full(len(epochs), -1 if field in TEXT_COLUMNS else np.nan, column_dtype(field))
+        return epochs, self.columns[field][selected]
+
+    def close(self):
+        self.columns = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # Views still held by a caller; the mapping goes when they do
+
+class ArchiveReader:
+    """Month files of one directory, opened (mapped) on first use"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def months(self):
+        """Archived (year, month) pairs, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        for name in os.listdir(self.directory):
+            if name.startswith("sky_data_") and name.endswith(".arc"):
+                try:
+                    year, month = name[9:-4].split("-")
+                    found.append((int(year), int(month)))
+                except ValueError:
+                    continue
+        return sorted(found)
+
+    def archived_until(self):
+        """End epoch of the newest archived month, None if there is none"""
+        months = self.months()
+        return month_bounds(*months[-1])[1] if months else None
+
+    def open(self, year, month):
+        with self._lock:
+            archive = self._files.get((year, month))
+            if archive is None:
+                archive = self._files[(year, month)] = ArchiveFile(archive_path(self.directory, year, month))
+            return archive
+
+    def segments(self, field, start, end):
+        """Yield zero-copy (epochs, values) views per month overlapping the range"""
+        for year, month in self.months():
+            month_start, month_end = month_bounds(year, month)
+            if month_end <= start or month_start > end:
+                continue
+            epochs, values = self.open(year, month).read(field, start, end)
+            if len(epochs):
+                yield epochs, values
+
+    def read(self, field, start, end):
+        """(epochs, values) over the range; only copies when it spans several months"""
+        parts = list(self.segments(field, start, end))
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.empty(0, column_dtype("epoch")), np.empty(0, column_dtype(field))
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def close(self):
+        with self._lock:
+            for archive in self._files.values():
+                archive.close()
+            self._files.clear()
+
+def compact_month(conn, directory, year, month):
+    """Write one month of sky_data rows to its archive file; returns the row count"""
+    start, end = month_bounds(year, month)
+    (count,) = conn.execute("SELECT COUNT(*) FROM sky_data WHERE epoch >= ? AND epoch < ?", (start, end)).fetchone()
+    columns = {"epoch": np.empty(count, column_dtype("epoch"))}
+    for field in SKY_DATA_COLUMNS:
+        # Text codes are collected as int32 and narrowed once the month's distinct values are known
+        columns[field] = np.empty(count, np.dtype("<i4") if field in TEXT_COLUMNS else column_dtype(field))
+    codes = {field: [] for field in TEXT_COLUMNS}
+    lookup = {field: {} for field in TEXT_COLUMNS}
+
+    cursor = conn.execute(f"SELECT epoch, {', '.join(SKY_DATA_COLUMNS)} FROM sky_data "
+                          f"WHERE epoch >= ? AND epoch < ? ORDER BY epoch", (start, end))
+    index = 0
+    while True:
+        rows = cursor.fetchmany(FETCH_ROWS)
+        if not rows:
+            break
+        chunk = slice(index, index + len(rows))
+        values = list(zip(*rows))
+        columns["epoch"][chunk] = values[0]
+        for field, column in zip(SKY_DATA_COLUMNS, values[1:]):
+            if field in TEXT_COLUMNS:
+                table = lookup[field]
+                for value in set(column) - set(table) - {None}:
+                    table[value] = len(codes[field])
+                    codes[field].append(value)
+                columns[field][chunk] = [-1 if value is None else table[value] for value in column]
+            else:
+                columns[field][chunk] = [np.nan if not isinstance(value, (int, float)) else value for value in column]
+        index += len(rows)
+
+    # Fields with no reading all month (e.g. sensors not fitted) take no space
+    for field in SKY_DATA_COLUMNS:
+        column = columns[field]
+        if count and (np.all(column == -1) if field in TEXT_COLUMNS else np.all(np.isnan(column))):
+            del columns[field]
+        elif field in TEXT_COLUMNS:
+            columns[field] = column.astype(code_dtype(len(codes[field])))
+
+    os.makedirs(directory, exist_ok=True)
+    write_archive(archive_path(directory, year, month), columns, codes)
+    return index
+
+def lower_thread_priority():
+    """Run the calling thread at the lowest CPU (and derived I/O) priority"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError) as e:
+        logger.warning(f"Unable to lower compactor priority: {e}")
+
+class ArchiveCompactor:
+    """
+    Background job archiving every complete month that lies entirely
+    outside the live window. Runs on its own low-priority thread; raw
+    rows are only pruned by the store once their month is archived.
+    """
+
+    def __init__(self, database, directory, store=None):
+        self.database = database
+        self.directory = directory
+        self.store = store
+        self.reader = ArchiveReader(directory)
+        self.stats = {"runs": 0, "months_archived": 0, "rows_archived": 0,
+                      "archived_until": self.reader.archived_until(), "last_error": None}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive",
+                                            initializer=lower_thread_priority)
+        self._future = None
+        if store is not None:
+            store.raw_prune_floor = self.stats["archived_until"] or 0
+
+    def request(self, live_window, now):
+        """Start a compaction run unless one is in progress; never blocks"""
+        if self._future is not None and not self._future.done():
+            return False
+        self._future = self._executor.submit(self._run, live_window, now)
+        return True
+
+    def _run(self, live_window, now):
+        self.stats["runs"] += 1
+        try:
+            if not os.path.exists(self.database):
+                return
+            with closing(sqlite3.connect(f"file:{self.database}?mode=ro", uri=True)) as conn:
+                self.compact(conn, live_window, now)
+            self.stats["last_error"] = None
+        except (sqlite3.Error, OSError) as e:
+            self.stats["last_error"] = str(e)
+            logger.error(f"Archive compaction failed: {e}")
+
+    def compact(self, conn, live_window, now):
+        """Archive the complete months older than now - live_window, oldest first"""
+        (oldest,) = conn.execute("SELECT MIN(epoch) FROM sky_data").fetchone()
+        if oldest is None:
+            return
+        year, month = month_of(oldest)
+        archived = set(self.reader.months())
+        while month_bounds(year, month)[1] <= now - live_window:
+            if (year, month) not in archived:
+                rows = compact_month(conn, self.directory, year, month)
+                self.stats["months_archived"] += 1
+                self.stats["rows_archived"] += rows
+                logger.warning(f"Archived {rows} rows for {year:04d}-{month:02d}")
+            self.stats["archived_until"] = month_bounds(year, month)[1]
+            if self.store is not None:
+                self.store.raw_prune_floor = self.stats["archived_until"]
+            year, month = next_month(year, month)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.reader.close()
+
+if __name__ == "__main__":
+    import sys
+    from history import to_epoch
+    if len(sys.argv) < 4:
+        print("Usage: python archive.py <field> <from> <to> [archive_dir]")
+        sys.exit(1)
+    field = sys.argv[1]
+    reader = ArchiveReader(sys.argv[4] if len(sys.argv) > 4 else "archive")
+    epochs, values = reader.read(field, to_epoch(sys.argv[2]), to_epoch(sys.argv[3]))
+    if field in TEXT_COLUMNS:
+        print(f"{len(epochs)} points")
+    elif len(values):
+        print(f"{len(epochs)} points, mean {np.nanmean(values):.2f}, "
+              f"min {np.nanmin(values):.2f}, max {np.nanmax(values):.2f}")
+    else:
+        print("No archived points in range")
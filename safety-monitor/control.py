@@ -2,14 +2,34 @@
 # control.py - Standalone Safety Monitor Control Service
 # Handles HTTP polling, validation, safety logic, relay control, and local API
 
+import math
+import os
 import time
 import json
 import logging
+import queue
+import signal
+import sqlite3
 import threading
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
 from datetime import datetime, timezone
-from flask import Flask, jsonify, request
-from settings import load_settings
-from fetch_data import fetch_sensor_data_http
+from types import MappingProxyType
+import numpy as np
+from flask import Flask, Response, jsonify, request
+from settings import get_settings, get_endpoint_list, settings_service
+from fetch_data import fetch_with_health, fetch_sensor_data_hedged, fetch_multi_station_http, warm_http_sessions, get_http_session_stats, close_http_sessions
+from fetch_data import validate_snapshot, request_backfill, backfill_stats, get_allsky_data_cached, allsky_cache_stats, ALLSKY_DATA_FILE
+from fetch_data import start_local_node_poll, get_local_node_data, local_node_stats, LOCAL_NODE_SNAPSHOT_FIELDS
+from history import MeasurementHistory, to_epoch
+from gorilla import CompressedHistory
+from store_data import SkyDataStore, NUMERIC_COLUMNS
+from rollup import query_history
+from archive import ArchiveCompactor, ArchiveReader, month_bounds, FETCH_ROWS
+from endpoint_health import order_endpoints, get_endpoint_health, get_all_endpoint_stats
+from lora_payload import decode_uplink, parse_network_uplink
+from event_stream import EventBroker, TooManyClients, format_sse
+from http_server import WSGIServer, serve_in_background, server_options, stream_client_limit, notify_systemd
 from weather_indicators import calculate_indicators, calculate_dewPoint
 from meteocalc import heat_index, Temp
 
@@ -39,30 +59,110 @@ RELAY_FAN_IN = 26
 RELAY_HEATER = 20
 RELAY_FAN_OUT = 21
 
+# Relay group order; the first pin is the lgpio group leader
+RELAY_PINS = (RELAY_FAN_IN, RELAY_FAN_OUT, RELAY_HEATER)
+RELAY_NAMES = {RELAY_FAN_IN: "fan_in", RELAY_FAN_OUT: "fan_out", RELAY_HEATER: "heater"}
+RELAY_GROUP_MASK = (1 << len(RELAY_PINS)) - 1
+
+class RelayDriver:
+    """
+    Edge-triggered relay output. Keeps a shadow of the pin levels and only
+    touches the GPIO chip on a transition: one group write for all relays,
+    followed by a read-back to verify. Counts actuations per relay.
+    """
+
+    def __init__(self):
+        self.levels = None  # Shadow {pin: level}, None = unknown (forces a full write)
+        self.actuations = {pin: 0 for pin in RELAY_PINS}
+        self.writes = 0
+        self.skipped_writes = 0
+        self.verify_failures = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bits(levels):
+        return sum(levels[pin] << index for index, pin in enumerate(RELAY_PINS))
+
+    def claim(self, levels):
+        """Claim the relay pins as one output group at the given levels"""
+        with self._lock:
+            if GPIO_AVAILABLE:
+                lgpio.group_claim_output(GPIO_CHIP, list(RELAY_PINS), [levels[pin] for pin in RELAY_PINS])
+            self.levels = dict(levels)
+
+    def apply(self, levels):
+        """Drive the relays to levels {pin: 0|1}; returns True if the pins were written"""
+        with self._lock:
+            if levels == self.levels:
+                self.skipped_writes += 1
+                return False
+            changed = [pin for pin in RELAY_PINS if self.levels is None or levels[pin] != self.levels[pin]]
+            if GPIO_AVAILABLE:
+                try:
+                    mask = sum(1 << RELAY_PINS.index(pin) for pin in changed)
+                    lgpio.group_write(GPIO_CHIP, RELAY_PINS[0], self._bits(levels), mask)
+                    readback = lgpio.group_read(GPIO_CHIP, RELAY_PINS[0]) & RELAY_GROUP_MASK
+                except Exception:
+                    # Pin levels unknown after a failed write: rewrite everything next time
+                    self.levels = None
+                    raise
+                self.writes += 1
+                if readback != self._bits(levels):
+                    self.verify_failures += 1
+                    logger.error(f"Relay read-back mismatch: wrote {self._bits(levels):03b}, read {readback:03b}")
+                    self.levels = None
+                    return True
+            else:
+                self.writes += 1
+            if self.levels is not None:
+                for pin in changed:
+                    self.actuations[pin] += 1
+            self.levels = dict(levels)
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "levels": None if self.levels is None else {RELAY_NAMES[pin]: level for pin, level in self.levels.items()},
+                "actuations": {RELAY_NAMES[pin]: count for pin, count in self.actuations.items()},
+                "writes": self.writes,
+                "skipped_writes": self.skipped_writes,
+                "verify_failures": self.verify_failures
+            }
+
+relay_driver = RelayDriver()
+
+def relay_levels(fan_on, heater_on):
+    """Pin levels for the requested states - relays are active LOW"""
+    return {
+        RELAY_FAN_IN: 0 if fan_on else 1,
+        RELAY_FAN_OUT: 0 if fan_on else 1,
+        RELAY_HEATER: 0 if heater_on else 1
+    }
+
 def setup_gpio():
     global GPIO_CHIP
     """Initialize GPIO pins for relay control"""
     if GPIO_AVAILABLE:
         GPIO_CHIP = lgpio.gpiochip_open(0)
-        for pin in [RELAY_FAN_IN, RELAY_FAN_OUT, RELAY_HEATER]:
-            lgpio.gpio_claim_output(GPIO_CHIP, pin, 1)
-
-        # Safe defaults
-        lgpio.gpio_write(GPIO_CHIP, RELAY_FAN_IN, 0)
-        lgpio.gpio_write(GPIO_CHIP, RELAY_FAN_OUT, 0)
-        lgpio.gpio_write(GPIO_CHIP, RELAY_HEATER, 1)
+        # Claimed directly at the safe defaults
+        relay_driver.claim(relay_levels(fan_on=True, heater_on=False))
         logger.warning("GPIO initialized - safe defaults applied (fans ON, heater OFF)")
 
 def set_relays(fan_on, heater_on):
-    """Set relay states - fail-safe defaults if GPIO unavailable"""
-    if GPIO_AVAILABLE:
-        try:
-            # Relays are active LOW
-            lgpio.gpio_write(GPIO_CHIP, RELAY_FAN_IN, 0 if fan_on else 1)
-            lgpio.gpio_write(GPIO_CHIP, RELAY_FAN_OUT, 0 if fan_on else 1)
-            lgpio.gpio_write(GPIO_CHIP, RELAY_HEATER, 0 if heater_on else 1)
-        except Exception as e:
-            logger.error(f"GPIO operation failed: {e}")
+    """Set relay states - only writes the GPIO chip when a relay changes"""
+    try:
+        relay_driver.apply(relay_levels(fan_on, heater_on))
+    except Exception as e:
+        logger.error(f"GPIO operation failed: {e}")
+
+def release_gpio():
+    """Enforce safe defaults and release the GPIO chip"""
+    global GPIO_CHIP
+    set_relays(fan_on=True, heater_on=False)
+    if GPIO_AVAILABLE and GPIO_CHIP is not None:
+        lgpio.gpiochip_close(GPIO_CHIP)
+        GPIO_CHIP = None
 
 # Global state for control servicedatetime 
 state = {
@@ -72,10 +172,16 @@ state = {
     "fan_status": "ON",
     "heater_status": "OFF",
     "primary_failure_count": 0,
+    "active_endpoint_index": None,  # Position in the ordered endpoint list
     "last_primary_attempt": None,
     "last_error": None,
     "control_start_time": utcnow(),
     "cycle_count": 0,
+    "unchanged_cycles": 0,  # Cycles short-circuited on an unchanged measurement
+    "fetch_failure_streak": 0,  # Consecutive failed fetch cycles
+    "next_fetch_time": 0.0,  # time.monotonic() before which fetch retries are deferred
+    "deferred_fetches": 0,  # Cycles that skipped the fetch stage due to backoff
+    "budget_overruns": 0,  # Cycles whose fetch stage exceeded cycle_budget_seconds
     "fan_override": None,  # None = AUTO, True = MANUAL ON, False = MANUAL OFF
     "heater_override": None,  # None = AUTO, True = MANUAL ON, False = MANUAL OFF
     "last_override_action": None,  # Last manual command description
@@ -85,6 +191,73 @@ state = {
 # Thread lock for state modifications
 state_lock = threading.Lock()
 
+# Serializes snapshot installs (fetch worker) with snapshot merges, safety
+# logic and state publishing (control thread)
+control_lock = threading.RLock()
+
+# Latest uplink pushed by the network server (TTN/Chirpstack webhook)
+latest_uplink = {"values": None, "received": None}  # received = time.monotonic()
+# === Published state ===
+# The control thread works on the mutable state dict above and publishes an
+# immutable, versioned copy after each evaluation. API handlers read
+# published_state once (a single reference read) and never take a lock, so
+# every field they return comes from the same version.
+
+published_state = MappingProxyType({**state, "version": 0})
+_published_snapshot = None  # state["snapshot"] object of the last publish
+
+# Versions that change something a client acts on are pushed to /events
+event_broker = EventBroker(history_size=100, client_queue_size=16, max_clients=8)
+
+def state_changes(previous, record, new_snapshot):
+    """Event-worthy differences between two published versions"""
+    changes = []
+    if new_snapshot:
+        changes.append("snapshot")
+    if record["mode"] != previous["mode"]:
+        changes.append("mode")
+    if (record["fan_status"], record["heater_status"]) != (previous["fan_status"], previous["heater_status"]):
+        changes.append("relays")
+    if (record["fan_override"], record["heater_override"]) != (previous["fan_override"], previous["heater_override"]):
+        changes.append("overrides")
+    if record["last_override_time"] != previous["last_override_time"]:
+        # Manual commands and safety rejections of overrides
+        changes.append("override_action")
+    return changes
+
+def publish_state():
+    """Publish a read-only copy of state (snapshot copied too); returns the new version"""
+    global published_state, _published_snapshot
+    with control_lock:
+        previous = published_state
+        record = dict(state)
+        if state["snapshot"] is not None:
+            record["snapshot"] = MappingProxyType(dict(state["snapshot"]))
+        record["version"] = previous["version"] + 1
+        published_state = MappingProxyType(record)
+        
+        new_snapshot = state["snapshot"] is not _published_snapshot and state["snapshot"] is not None
+        _published_snapshot = state["snapshot"]
+        changes = state_changes(previous, record, new_snapshot)
+        if changes:
+            event_broker.publish(record["version"], state_event_data(published_state, changes))
+        return record["version"]
+
+uplink_stats = {"received": 0, "rejected": 0, "last_error": None,
+                "last_device": None, "last_received_at": None, "last_rssi": None, "last_snr": None}
+
+# In-memory measurement history (one point per new measurement, plus backfill).
+# Fixed-capacity columns, sized once at startup (default 7 days at 10 s).
+HISTORY_FIELDS = ("temperature", "humidity", "dew_point", "heat_index", "raining", "wind", "cpu_temperature",
+                  "sky_temperature", "ambient_temperature", "sqm_lux", "cloud_coverage", "brightness",
+                  "bortle", "camera_temp", "star_count")
+measurement_history = MeasurementHistory(HISTORY_FIELDS, max_points=get_settings().get("history_capacity", 60480))
+# Long history of the same fields in Gorilla-compressed blocks (default one year)
+compressed_history = CompressedHistory(HISTORY_FIELDS, block_size=get_settings().get("compressed_block_size", 256),
+                                       retention_seconds=get_settings().get("compressed_history_days", 365) * 86400)
+sky_data_store = None  # SkyDataStore (batched SQLite writer) once run_control_service starts it
+archive_compactor = None  # ArchiveCompactor (monthly columnar files) when archiving is enabled
+
 def get_cpu_temperature():
     """Fetch CPU temperature from system"""
     try:
@@ -111,25 +284,7 @@ def compute_derived_values(snapshot, settings):
                 logger.warning(f"Failed to compute dew point or heat index: {e}")
         
         # Weather indicators (cloud coverage, brightness, bortle)
-        ambient_temp = snapshot.get("ambient_temperature")
-        sky_temp = snapshot.get("sky_temperature")
-        sqm_lux = snapshot.get("sqm_lux")
-        
-        if ambient_temp is not None and sky_temp is not None and sqm_lux is not None:
-            try:
-                cloud_coverage, cloud_indicator, brightness, bortle = calculate_indicators(
-                    ambient_temp, sky_temp, sqm_lux
-                )
-                if cloud_coverage is not None:
-                    snapshot["cloud_coverage"] = round(cloud_coverage, 2)
-                if cloud_indicator is not None:
-                    snapshot["cloud_coverage_indicator"] = round(cloud_indicator, 2)
-                if brightness is not None:
-                    snapshot["brightness"] = round(brightness, 2)
-                if bortle is not None:
-                    snapshot["bortle"] = round(bortle, 2)
-            except Exception as e:
-                logger.warning(f"Failed to compute weather indicators: {e}")
+        compute_sky_indicators(snapshot)
         
         # CPU temperature
         cpu_temp = get_cpu_temperature()
@@ -139,6 +294,87 @@ def compute_derived_values(snapshot, settings):
     except Exception as e:
         logger.error(f"Error in compute_derived_values: {e}")
 
+def merge_allsky_data(snapshot, settings):
+    """
+    Merge cached AllSky camera values into the snapshot with their own age.
+    Values older than allsky_max_age_seconds are dropped rather than acted on.
+    """
+    (camera_temp, star_count, day_or_night), mtime = get_allsky_data_cached(
+        settings.get("allsky_data_file", ALLSKY_DATA_FILE))
+    age = None if mtime is None else round(time.time() - mtime, 1)
+    if age is not None and age > settings.get("allsky_max_age_seconds", 600):
+        camera_temp, star_count, day_or_night = None, None, None
+    snapshot["camera_temp"] = camera_temp
+    snapshot["star_count"] = star_count
+    snapshot["day_or_night"] = day_or_night
+    snapshot["allsky_age_seconds"] = age
+
+def compute_sky_indicators(snapshot):
+    """Compute cloud coverage, brightness and bortle from sky/ambient temperature and SQM lux"""
+    ambient_temp = snapshot.get("ambient_temperature")
+    sky_temp = snapshot.get("sky_temperature")
+    sqm_lux = snapshot.get("sqm_lux")
+    
+    if ambient_temp is not None and sky_temp is not None and sqm_lux is not None:
+        try:
+            cloud_coverage, cloud_indicator, brightness, bortle = calculate_indicators(
+                ambient_temp, sky_temp, sqm_lux
+            )
+            if cloud_coverage is not None:
+                snapshot["cloud_coverage"] = round(cloud_coverage, 2)
+            if cloud_indicator is not None:
+                snapshot["cloud_coverage_indicator"] = round(cloud_indicator, 2)
+            if brightness is not None:
+                snapshot["brightness"] = round(brightness, 2)
+            if bortle is not None:
+                snapshot["bortle"] = round(bortle, 2)
+        except Exception as e:
+            logger.warning(f"Failed to compute weather indicators: {e}")
+
+def merge_local_node_data(snapshot, settings, wait_until):
+    """
+    Merge the allsky-sensors node readings into the snapshot and recompute
+    the sky indicators. Node fields are cleared when the node is unreachable
+    for longer than local_node_max_age_seconds.
+    """
+    values, age = get_local_node_data(settings, wait_until)
+    for field in LOCAL_NODE_SNAPSHOT_FIELDS:
+        snapshot[field] = values.get(field) if values else None
+    snapshot["local_node_age_seconds"] = None if age is None else round(age, 1)
+    if values:
+        compute_sky_indicators(snapshot)
+
+def uplink_is_fresh(settings):
+    """True while pushed uplinks arrive within uplink_max_age_seconds"""
+    received = latest_uplink["received"]
+    return received is not None and time.monotonic() - received <= settings.get("uplink_max_age_seconds", 180)
+
+def merge_uplink_data(snapshot, settings):
+    """
+    Merge the latest pushed uplink into the snapshot and recompute the sky
+    indicators. A stale uplink is not acted on; its fields are cleared
+    unless the LAN poll of the node is configured to take over.
+    """
+    received = latest_uplink["received"]
+    snapshot["uplink_age_seconds"] = None if received is None else round(time.monotonic() - received, 1)
+    if uplink_is_fresh(settings):
+        for field in LOCAL_NODE_SNAPSHOT_FIELDS:
+            snapshot[field] = latest_uplink["values"].get(field)
+        compute_sky_indicators(snapshot)
+    elif received is not None and not settings.get("local_node_url"):
+        for field in LOCAL_NODE_SNAPSHOT_FIELDS:
+            snapshot[field] = None
+
+def store_uplink(values, meta):
+    """Command (control thread): make a decoded uplink the latest node reading"""
+    latest_uplink["values"] = values
+    latest_uplink["received"] = time.monotonic()
+    uplink_stats["received"] += 1
+    uplink_stats["last_device"] = meta["device_id"]
+    uplink_stats["last_received_at"] = meta["received_at"]
+    uplink_stats["last_rssi"] = meta["gateway_rssi"]
+    uplink_stats["last_snr"] = meta["gateway_snr"]
+
 def apply_safety_logic(snapshot, settings):
     """
     Apply safety control logic to determine fan and heater states.
@@ -240,34 +476,130 @@ def apply_safety_logic(snapshot, settings):
     
     return fan_on, heater_on
 
-def fetch_and_update_snapshot(settings):
+def measurement_epoch(snapshot):
+    """Epoch seconds of a snapshot's measurement_timestamp, or None"""
+    try:
+        return to_epoch((snapshot or {}).get("measurement_timestamp"))
+    except ValueError:
+        return None
+
+def install_snapshot(snapshot, settings):
+    """
+    Make a valid fetched snapshot current, skipping work for unchanged measurements.
+    Called with control_lock held.
+    """
+    current = state["snapshot"]
+    if snapshot is not current:
+        # The unchanged-measurement cache is per endpoint: after a fail-back
+        # an endpoint can hand back a snapshot older than the installed one
+        new_epoch, current_epoch = measurement_epoch(snapshot), measurement_epoch(current)
+        if new_epoch is not None and current_epoch is not None and new_epoch < current_epoch:
+            snapshot = current
+    if snapshot is current:
+        # Unchanged measurement: derived values still hold, only
+        # the age and the local CPU reading need refreshing
+        state["unchanged_cycles"] += 1
+        epoch = measurement_epoch(snapshot)
+        if epoch is not None:
+            snapshot["age_seconds"] = time.time() - epoch
+        cpu_temp = get_cpu_temperature()
+        if cpu_temp is not None:
+            snapshot["cpu_temperature"] = cpu_temp
+    else:
+        compute_derived_values(snapshot, settings)
+        with control_lock:
+            state["snapshot"] = snapshot
+        record_history(snapshot, settings)
+
+def insert_backfilled(points):
+    """Backfill callback: add dew point to backfilled points and insert them"""
+    for _, point in points:
+        if 0 < point["humidity"] <= 100:
+            point["dew_point"] = round(calculate_dewPoint(point["temperature"], point["humidity"]), 2)
+    if sky_data_store:
+        for epoch, point in points:
+            sky_data_store.add(point, epoch)
+    with control_lock:  # compressed_history may be swapped by the startup rebuild
+        for epoch, point in sorted(points, key=lambda item: item[0]):
+            compressed_history.append(epoch, {field: point.get(field) for field in HISTORY_FIELDS})
+    return measurement_history.insert_many(points)
+
+def record_history(snapshot, settings):
+    """Add a new measurement to the history and backfill any gap before it"""
+    epoch = measurement_epoch(snapshot)
+    if epoch is None:
+        return
+    previous = measurement_history.latest_time()
+    point = {field: snapshot.get(field) for field in HISTORY_FIELDS}
+    if not measurement_history.insert(epoch, point):
+        return  # Already recorded (e.g. re-fetched after a restart or from another endpoint)
+    compressed_history.append(epoch, point)
+    if sky_data_store:
+        sky_data_store.add(dict(snapshot, fan_status=state["fan_status"],
+                                heater_status=state["heater_status"], mode=state["mode"]), epoch)
+    
+    # Gap after an outage: fetch the missing window in the background
+    if (previous is not None and settings.get("backfill_enabled", True)
+            and snapshot.get("source_endpoint")
+            and epoch - previous > settings.get("backfill_gap_seconds", 900)):
+        logger.warning(f"Measurement gap of {epoch - previous:.0f}s - requesting backfill")
+        request_backfill(snapshot["source_endpoint"], previous, epoch, settings, insert_backfilled)
+
+def _settled(success, settle):
+    """Run the caller's bookkeeping inside the control_lock section that applied the outcome"""
+    if settle is not None:
+        settle(success)
+    return success
+
+def fetch_and_update_snapshot(settings, deadline=None, settle=None):
     """
-    Fetch sensor data via HTTP with primary/fallback logic.
+    Fetch sensor data via HTTP from the ordered endpoint list.
+    Uses hedged requests when enabled, otherwise the best endpoint by
+    latency/error statistics and circuit breaker state.
+    deadline (time.monotonic()) bounds the whole fetch stage.
+    The fetch runs on a worker thread: only the network I/O happens outside
+    control_lock, and the outcome is applied to state - together with
+    settle(success), if given - in one locked section, so no published
+    version shows it half applied.
     Returns True if successful, False otherwise.
     """
-    use_primary = True
-    now = utcnow()
+    if settings.get("multi_station_mode") and settings.get("multi_station_ids"):
+        if fetch_and_update_snapshot_multi(settings, deadline, settle):
+            return True
+        logger.warning("Multi-station fetch failed - falling back to endpoint list")
     
-    # Check if we should retry primary after fallback period
-    if state["mode"] == "FALLBACK":
-        if state["last_primary_attempt"]:
-            elapsed = (now - state["last_primary_attempt"]).total_seconds()
-            if elapsed >= settings["fallback_retry_interval_seconds"]:
-                use_primary = True
-                logger.warning("Retrying primary endpoint after fallback interval")
-            else:
-                use_primary = False
+    endpoints = get_endpoint_list(settings)
+    if settings.get("hedged_fetch", True) and len(endpoints) > 1:
+        return fetch_and_update_snapshot_hedged(endpoints, settings, deadline, settle)
+    
+    now = utcnow()
     
-    endpoint = settings["primary_endpoint"] if use_primary else settings["fallback_endpoint"]
+    # Best endpoint by statistics; an open primary breaker is retried via
+    # its half-open probe instead of a fixed fallback interval
+    candidates = order_endpoints(endpoints, settings)
+    index, endpoint = candidates[0]
+    use_primary = index == 0
+    for _, unused in candidates[1:]:
+        get_endpoint_health(unused).release_probe()
     
     try:
-        # Fetch sensor data via HTTP
-        snapshot = fetch_sensor_data_http(endpoint, settings)
-        
+        # Fetch sensor data via HTTP - one attempt, retries happen on later cycles
+        snapshot = fetch_with_health(endpoint, settings, deadline)
+    except Exception as e:
+        logger.error(f"Exception fetching sensor data from {endpoint}: {e}")
+        with control_lock:
+            state["last_error"] = str(e)
+            if use_primary:
+                state["primary_failure_count"] += 1
+                state["last_primary_attempt"] = now
+            return _settled(False, settle)
+    
+    # The fetch runs on a worker: apply the whole result under control_lock
+    with control_lock:
         if snapshot and snapshot.get("valid"):
             # Success - update state
-            compute_derived_values(snapshot, settings)
-            state["snapshot"] = snapshot
+            install_snapshot(snapshot, settings)
+            state["active_endpoint_index"] = index
             
             if use_primary:
                 state["mode"] = "NORMAL"
@@ -278,96 +610,643 @@ def fetch_and_update_snapshot(settings):
                 logger.warning(f"Fallback endpoint successful - mode: FALLBACK")
             
             state["last_error"] = None
-            return True
-        else:
-            # Fetch failed or invalid
-            if use_primary:
-                state["primary_failure_count"] += 1
-                state["last_primary_attempt"] = now
-                logger.warning(f"Primary endpoint failed (count: {state['primary_failure_count']})")
-                
-                if state["primary_failure_count"] >= settings["primary_failure_threshold"]:
-                    logger.error("Primary failure threshold exceeded - switching to fallback")
-                    state["mode"] = "FALLBACK"
-            else:
-                logger.error("Fallback endpoint also failed")
-            
-            state["last_error"] = "Sensor data fetch failed or invalid"
-            return False
-            
-    except Exception as e:
-        logger.error(f"Exception fetching sensor data from {endpoint}: {e}")
-        state["last_error"] = str(e)
+            return _settled(True, settle)
         
+        # Fetch failed or invalid
         if use_primary:
             state["primary_failure_count"] += 1
             state["last_primary_attempt"] = now
+            logger.warning(f"Primary endpoint failed (count: {state['primary_failure_count']})")
+            
+            if state["primary_failure_count"] >= settings["primary_failure_threshold"]:
+                logger.error("Primary failure threshold exceeded - circuit breaker opens, switching to fallback")
+                state["mode"] = "FALLBACK"
+        else:
+            logger.error(f"Fallback endpoint {index} also failed")
         
+        state["last_error"] = "Sensor data fetch failed or invalid"
+        return _settled(False, settle)
+
+def fetch_and_update_snapshot_multi(settings, deadline=None, settle=None):
+    """
+    Fetch all configured stations in one request and use the fused snapshot.
+    settle is only called on success: a failure falls back to the endpoint list.
+    Returns True if successful, False otherwise.
+    """
+    try:
+        snapshot = fetch_multi_station_http(settings, deadline)
+    except Exception as e:
+        logger.error(f"Exception in multi-station fetch: {e}")
         return False
+    
+    with control_lock:
+        if not snapshot.get("valid"):
+            state["last_error"] = f"Multi-station fetch failed: {snapshot.get('errors')}"
+            return False
+        
+        install_snapshot(snapshot, settings)
+        state["active_endpoint_index"] = None
+        state["mode"] = "NORMAL"
+        state["primary_failure_count"] = 0
+        state["last_error"] = None
+        return _settled(True, settle)
 
-def control_loop_iteration(settings):
-    """Single iteration of the control loop"""
-    state["cycle_count"] += 1
+def fetch_and_update_snapshot_hedged(endpoints, settings, deadline=None, settle=None):
+    """
+    Race the ordered endpoint list; the first valid snapshot wins.
+    Mode is NORMAL when the highest-priority endpoint won, FALLBACK otherwise.
+    Returns True if successful, False otherwise.
+    """
+    now = utcnow()
+    try:
+        snapshot, index = fetch_sensor_data_hedged(endpoints, settings, deadline)
+    except Exception as e:
+        logger.error(f"Exception in hedged fetch: {e}")
+        snapshot, index = None, None
     
-    # Fetch and update snapshot
-    fetch_success = fetch_and_update_snapshot(settings)
+    with control_lock:
+        if index is None:
+            state["primary_failure_count"] += 1
+            state["last_primary_attempt"] = now
+            state["last_error"] = "Sensor data fetch failed or invalid on all endpoints"
+            return _settled(False, settle)
+        
+        install_snapshot(snapshot, settings)
+        state["active_endpoint_index"] = index
+        state["last_error"] = None
+        
+        if index == 0:
+            if state["mode"] != "NORMAL":
+                logger.warning("Primary endpoint successful - mode: NORMAL")
+            state["mode"] = "NORMAL"
+            state["primary_failure_count"] = 0
+        else:
+            if state["mode"] != "FALLBACK":
+                logger.warning(f"Endpoint {index} won the hedged fetch - mode: FALLBACK")
+            state["mode"] = "FALLBACK"
+            state["primary_failure_count"] += 1
+            state["last_primary_attempt"] = now
+        return _settled(True, settle)
+
+def run_fetch_stage(settings):
+    """
+    Fetch within the cycle budget. A failed fetch is not retried inline:
+    the next attempt is scheduled onto a later cycle with linear backoff,
+    so safety logic and relays are re-evaluated on every cycle.
+    """
+    now = time.monotonic()
+    with control_lock:
+        if now < state["next_fetch_time"]:
+            state["deferred_fetches"] += 1
+            return False
+    
+    budget = settings.get("cycle_budget_seconds", settings["sleep_time"] * 0.8)
     
-    # Apply safety logic (will enforce fail-safe defaults if needed)
-    fan_on, heater_on = apply_safety_logic(state["snapshot"], settings)
+    def settle(fetch_success):
+        # Called with control_lock held, in the section that applied the fetch outcome
+        if time.monotonic() - now > budget:
+            state["budget_overruns"] += 1
+            logger.warning(f"Fetch stage exceeded cycle budget of {budget}s")
+        
+        if fetch_success:
+            state["fetch_failure_streak"] = 0
+            state["next_fetch_time"] = 0.0
+        else:
+            state["fetch_failure_streak"] += 1
+            backoff = min(settings.get("retry_backoff_seconds", 2) * state["fetch_failure_streak"],
+                          settings.get("retry_backoff_max_seconds", 60))
+            state["next_fetch_time"] = time.monotonic() + backoff
     
-    # Set physical relays
-    set_relays(fan_on, heater_on)
+    return fetch_and_update_snapshot(settings, deadline=now + budget, settle=settle)
+
+def local_node_polled(settings):
+    """While uplinks are pushed the LAN poll of the node is only a watchdog
+    that takes over once they stop arriving"""
+    return bool(settings.get("local_node_url")) and not uplink_is_fresh(settings)
+
+def evaluate_safety(settings):
+    """Merge the latest inputs into the snapshot, apply safety logic and set the relays"""
+    with control_lock:
+        state["cycle_count"] += 1
+        
+        # AllSky camera and node values (non-blocking, latest available)
+        if state["snapshot"]:
+            merge_allsky_data(state["snapshot"], settings)
+            if local_node_polled(settings):
+                merge_local_node_data(state["snapshot"], settings, None)
+            merge_uplink_data(state["snapshot"], settings)
+        expire_restored_snapshot()
+        
+        # Apply safety logic (will enforce fail-safe defaults if needed)
+        fan_on, heater_on = apply_safety_logic(state["snapshot"], settings)
+        
+        # Set physical relays
+        set_relays(fan_on, heater_on)
+        record_first_decision()
+        publish_state()
     
     # Log status periodically
     if state["cycle_count"] % 10 == 0:
         logger.warning(f"Control loop #{state['cycle_count']}: mode={state['mode']}, "
                       f"fan={state['fan_status']}, heater={state['heater_status']}")
 
+# === Scheduler ===
+# Every stage runs on its own cadence on the monotonic clock: local sensors
+# every second, the MeetJeStad fetch every minute, persistence every five
+# minutes. The fetch runs on a worker thread so a slow upstream never delays
+# the fast stages. Safety evaluation is event-driven: any stage that sees new
+# input triggers it, with sleep_time as the watchdog interval.
+
+class ScheduledTask:
+    """A stage with its own interval and lateness/missed-deadline accounting"""
+
+    def __init__(self, name, func, interval_key, default_interval, run_async=False):
+        self.name = name
+        self.func = func
+        self.interval_key = interval_key
+        self.default_interval = default_interval
+        self.run_async = run_async
+        self.next_due = time.monotonic()
+        self.triggered = None  # time.monotonic() of the first pending trigger
+        self.future = None
+        self.runs = 0
+        self.missed = 0
+        self.last_lateness = None
+        self.max_lateness = 0.0
+        self.last_duration = None
+        self.max_duration = 0.0
+
+    def interval(self, settings):
+        interval = settings.get(self.interval_key, self.default_interval)
+        # validate_settings rejects these, but never let a bad value stall the loop
+        return interval if interval > 0 else self.default_interval
+
+    def trigger(self):
+        """Request a run as soon as possible (thread-safe)"""
+        if self.triggered is None:
+            self.triggered = time.monotonic()
+
+    def reschedule(self, when):
+        """Bring the next run forward to time.monotonic() value when"""
+        self.next_due = min(self.next_due, when)
+
+    def run_if_due(self, now, settings, executor):
+        triggered = self.triggered
+        if triggered is None and now < self.next_due:
+            return
+        self.triggered = None
+        interval = self.interval(settings)
+        
+        # Lateness against the slot (or the trigger that asked for this run)
+        lateness = max(now - (self.next_due if triggered is None else min(triggered, self.next_due)), 0.0)
+        self.last_lateness = round(lateness, 3)
+        self.max_lateness = max(self.max_lateness, self.last_lateness)
+        
+        if lateness >= interval:
+            # Whole slots passed without a run: count them and re-anchor instead of bursting
+            self.missed += int(lateness // interval)
+            self.next_due = now + interval
+        else:
+            self.next_due = max(self.next_due + interval, now) if triggered is None else now + interval
+        
+        if self.future is not None and not self.future.done():
+            # Previous run still in progress - this slot is missed
+            self.missed += 1
+            logger.warning(f"Scheduled task {self.name} missed its deadline: previous run still in progress")
+            return
+        self.runs += 1
+        if self.run_async:
+            self.future = executor.submit(self._run, settings)
+        else:
+            self._run(settings)
+
+    def _run(self, settings):
+        start = time.monotonic()
+        try:
+            self.func(settings)
+        except Exception as e:
+            logger.error(f"Scheduled task {self.name} failed: {e}")
+        duration = time.monotonic() - start
+        self.last_duration = round(duration, 3)
+        self.max_duration = max(self.max_duration, self.last_duration)
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "missed_deadlines": self.missed,
+            "last_lateness_seconds": self.last_lateness,
+            "max_lateness_seconds": self.max_lateness,
+            "last_duration_seconds": self.last_duration,
+            "max_duration_seconds": self.max_duration,
+            "due_in_seconds": round(max(self.next_due - time.monotonic(), 0), 3),
+            "running": self.future is not None and not self.future.done()
+        }
+
+class Scheduler:
+    """Runs due tasks and sleeps until the next deadline or a trigger"""
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.wakeup = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="scheduler")
+
+    def start(self):
+        """Make every task due now"""
+        now = time.monotonic()
+        for task in self.tasks:
+            task.next_due = now
+
+    def run_pending(self, settings):
+        now = time.monotonic()
+        for task in self.tasks:
+            task.run_if_due(now, settings, self.executor)
+
+    def wait(self):
+        """Block until the earliest deadline or until trigger() is called"""
+        now = time.monotonic()
+        if any(task.triggered is not None for task in self.tasks):
+            return
+        timeout = min(task.next_due for task in self.tasks) - now
+        if timeout > 0:
+            self.wakeup.wait(timeout)
+        self.wakeup.clear()
+
+    def trigger(self, task):
+        task.trigger()
+        self.wakeup.set()
+
+    def stats(self):
+        return {task.name: task.stats() for task in self.tasks}
+
+# === Command queue ===
+# Manual actuator commands and pushed uplinks are queued for the control
+# thread, which applies a whole batch and then evaluates safety once. Only
+# that thread runs the safety logic or writes GPIO; request threads wait on
+# a future for the published result.
+
+COMMAND_QUEUE_SIZE = 32
+command_queue = queue.Queue(maxsize=COMMAND_QUEUE_SIZE)
+command_stats = {"processed": 0, "failed": 0, "rejected": 0, "timeouts": 0,
+                 "last_latency_ms": None, "max_latency_ms": 0.0, "mean_latency_ms": None}
+
+class CommandQueueFull(Exception):
+    """The control thread is not keeping up with queued commands"""
+
+def submit_command(apply):
+    """
+    Queue apply() to run on the control thread. Returns a Future that
+    resolves to the published state once the relays have been set.
+    """
+    future = Future()
+    try:
+        command_queue.put_nowait((apply, future, time.monotonic()))
+    except queue.Full:
+        command_stats["rejected"] += 1
+        raise CommandQueueFull(f"Command queue full ({COMMAND_QUEUE_SIZE} pending)")
+    scheduler.trigger(commands_task)
+    return future
+
+def wait_for_command(future, settings):
+    """Wait for a submitted command; raises FutureTimeoutError after command_timeout_seconds"""
+    try:
+        return future.result(timeout=settings.get("command_timeout_seconds", 5))
+    except FutureTimeoutError:
+        command_stats["timeouts"] += 1
+        raise
+
+def process_commands(settings):
+    """Control thread: apply every queued command, then evaluate safety once for the batch"""
+    batch = []
+    while True:
+        try:
+            batch.append(command_queue.get_nowait())
+        except queue.Empty:
+            break
+    if not batch:
+        return
+    
+    applied = []
+    for apply, future, enqueued in batch:
+        try:
+            apply()
+            applied.append((future, enqueued))
+        except Exception as e:
+            command_stats["failed"] += 1
+            future.set_exception(e)
+    
+    try:
+        evaluate_safety(settings)
+    except Exception as e:
+        # Fail the callers now instead of leaving them to time out;
+        # the scheduler logs the error like any other stage failure
+        for future, _ in applied:
+            command_stats["failed"] += 1
+            future.set_exception(e)
+        raise
+    written = time.monotonic()
+    current = published_state
+    
+    # Command-to-GPIO latency: queue wait plus the safety evaluation and relay write
+    for future, enqueued in applied:
+        latency_ms = round((written - enqueued) * 1000, 2)
+        command_stats["processed"] += 1
+        command_stats["last_latency_ms"] = latency_ms
+        command_stats["max_latency_ms"] = max(command_stats["max_latency_ms"], latency_ms)
+        mean = command_stats["mean_latency_ms"]
+        command_stats["mean_latency_ms"] = latency_ms if mean is None else \
+            round(mean + (latency_ms - mean) / command_stats["processed"], 2)
+        future.set_result(current)
+
+def on_settings_changed(new, old):
+    """Settings reload subscriber: log the changed keys and apply new cadences at once"""
+    changed = sorted(key for key in new if new.get(key) != old.get(key))
+    logger.warning(f"Settings reloaded: {', '.join(changed) or 'no changes'}")
+    for task in scheduler.tasks:
+        if task.interval_key in changed:
+            task.reschedule(time.monotonic() + task.interval(new))
+    scheduler.wakeup.set()
+
+_local_inputs_seen = {"local_node": None, "allsky_mtime": None}
+
+def poll_local_sensors(settings):
+    """Poll the LAN node and AllSky file; trigger safety evaluation on new values"""
+    if local_node_polled(settings):
+        start_local_node_poll(settings)
+        values, _ = get_local_node_data(settings)
+        if values is not None and values is not _local_inputs_seen["local_node"]:
+            _local_inputs_seen["local_node"] = values
+            scheduler.trigger(safety_task)
+    _, mtime = get_allsky_data_cached(settings.get("allsky_data_file", ALLSKY_DATA_FILE))
+    if mtime != _local_inputs_seen["allsky_mtime"]:
+        _local_inputs_seen["allsky_mtime"] = mtime
+        scheduler.trigger(safety_task)
+
+def scheduled_fetch(settings):
+    """MeetJeStad fetch; a failure brings the retry forward to the backoff time"""
+    previous = state["snapshot"]
+    if run_fetch_stage(settings):
+        if state["snapshot"] is not previous:
+            scheduler.trigger(safety_task)
+    else:
+        # Mode and last_error changed without new input to evaluate
+        with control_lock:
+            publish_state()
+            next_fetch_time = state["next_fetch_time"]
+        if next_fetch_time:
+            fetch_task.reschedule(next_fetch_time)
+            scheduler.wakeup.set()
+
+def scheduled_persist(settings):
+    save_state_snapshot()
+
+def scheduled_archive(settings):
+    """Start compacting complete months outside the live window (runs on its own low-priority thread)"""
+    if archive_compactor:
+        archive_compactor.request(settings.get("retention_raw_days", 7) * 86400, time.time())
+
+commands_task = ScheduledTask("commands", process_commands, "command_poll_interval_seconds", 1)
+safety_task = ScheduledTask("safety", evaluate_safety, "sleep_time", 10)
+local_sensors_task = ScheduledTask("local_sensors", poll_local_sensors, "local_sensor_interval_seconds", 1)
+fetch_task = ScheduledTask("meetjestad", scheduled_fetch, "fetch_interval_seconds", 60, run_async=True)
+persist_task = ScheduledTask("persistence", scheduled_persist, "persist_interval_seconds", 300)
+archive_task = ScheduledTask("archive", scheduled_archive, "archive_interval_seconds", 3600)
+scheduler = Scheduler([commands_task, fetch_task, local_sensors_task, safety_task, persist_task, archive_task])
+
 # Flask API for local status
 app = Flask(__name__)
+api_server = None  # WSGIServer once run_control_service has bound the port
 app.logger.setLevel(logging.ERROR)  # Suppress Flask info logs
 
+# === /status cache ===
+# The status body only changes when a new state version is published, so it
+# is serialized once per version and served from cached bytes with an ETag.
+# Only the volatile age/uptime fields are appended per request. Live
+# counters that change between versions are served by /diagnostics.
+
+_status_cache = {"version": None}
+status_cache_stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+def build_status_body(current):
+    """Version-derived part of the /status response"""
+    fan_override = current["fan_override"]
+    heater_override = current["heater_override"]
+    return {
+        "snapshot": dict(current["snapshot"] or {}),
+        "mode": current["mode"],
+        "fan_status": current["fan_status"],
+        "heater_status": current["heater_status"],
+        "fan_mode": "AUTO" if fan_override is None else "MANUAL",
+        "heater_mode": "AUTO" if heater_override is None else "MANUAL",
+        "last_error": current["last_error"],
+        "cycle_count": current["cycle_count"],
+        "state_version": current["version"],
+        "unchanged_cycles": current["unchanged_cycles"],
+        "active_endpoint_index": current["active_endpoint_index"],
+        "fetch_stage": {
+            "budget_overruns": current["budget_overruns"],
+            "deferred_fetches": current["deferred_fetches"],
+            "fetch_failure_streak": current["fetch_failure_streak"]
+        },
+        "last_override_action": current["last_override_action"],
+        "last_override_time": current["last_override_time"]
+    }
+
+def get_status_cache(current):
+    """Cached serialization for the published version, rebuilt on a version change"""
+    global _status_cache
+    cache = _status_cache
+    if cache["version"] == current["version"]:
+        status_cache_stats["hits"] += 1
+        return cache
+    status_cache_stats["misses"] += 1
+    body = json.dumps(build_status_body(current), separators=(",", ":"), default=str)
+    snapshot = current["snapshot"] or {}
+    try:
+        received_epoch = to_epoch(snapshot.get("received_timestamp"))
+    except ValueError:
+        received_epoch = None
+    start_epoch = current["control_start_time"].timestamp()
+    cache = {
+        "version": current["version"],
+        "prefix": body[:-1].encode(),  # without the closing brace
+        "etag": f"{int(start_epoch)}-{current['version']}",
+        "received_epoch": received_epoch,
+        "start_epoch": start_epoch
+    }
+    _status_cache = cache  # single reference swap
+    return cache
+
+def state_event_data(current, changes):
+    """JSON data of a /events state message"""
+    return json.dumps({"version": current["version"], "changes": changes, "state": build_status_body(current)},
+                      separators=(",", ":"), default=str)
+
+@app.route('/events', methods=['GET'])
+def api_events():
+    """
+    Server-Sent Events stream of state versions with relevant changes
+    (snapshot, mode, relays, overrides). Resumes from Last-Event-ID when the
+    buffered history covers the gap, otherwise starts with a full resync.
+    """
+    heartbeat = get_settings().get("sse_heartbeat_seconds", 15)
+    last_event_id = request.headers.get("Last-Event-ID", request.args.get("last_event_id"))
+    try:
+        last_event_id = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        last_event_id = None
+    try:
+        client, resumed = event_broker.subscribe(last_event_id)
+    except TooManyClients as e:
+        return jsonify({"error": str(e)}), 503
+    
+    def stream():
+        try:
+            yield b"retry: 3000\n\n"  # client reconnect delay (ms)
+            if not resumed:
+                current = published_state
+                yield format_sse(current["version"], state_event_data(current, ["resync"]))
+            while True:
+                message = client.next(timeout=heartbeat)
+                yield b": heartbeat\n\n" if message is None else message[1]
+        finally:
+            event_broker.unsubscribe(client)
+    
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/status', methods=['GET'])
 def api_status():
-    """Return current snapshot and control state"""
-    with state_lock:
-        snapshot = state.get("snapshot") or {}
-        mode = state["mode"]
-        fan_status = state["fan_status"]
-        heater_status = state["heater_status"]
-        fan_override = state["fan_override"]
-        heater_override = state["heater_override"]
-        last_error = state["last_error"]
-        cycle_count = state["cycle_count"]
-        control_start_time = state["control_start_time"]
-        last_override_action = state["last_override_action"]
-        last_override_time = state["last_override_time"]
-    
-    age = None
-    if snapshot.get("received_timestamp"):
-        try:
-            received_dt = datetime.fromisoformat(snapshot["received_timestamp"])
-            age = (utcnow()- received_dt).total_seconds()
-        except:
-            pass
+    """Return current snapshot and control state (ETag per state version)"""
+    cache = get_status_cache(published_state)
+    if request.if_none_match.contains_weak(cache["etag"]):
+        status_cache_stats["not_modified"] += 1
+        response = Response(status=304)
+    else:
+        now = time.time()
+        age = None if cache["received_epoch"] is None else round(now - cache["received_epoch"], 1)
+        volatile = f',"age_seconds":{json.dumps(age)},"uptime_seconds":{round(now - cache["start_epoch"], 1)}}}'
+        response = Response(cache["prefix"] + volatile.encode(), mimetype="application/json")
+    response.set_etag(cache["etag"], weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/history', methods=['GET'])
+def api_history():
+    """
+    Downsampled history of one field: /history?field=temperature&from=&to=&step=
+    from/to are epoch seconds or ISO timestamps (default: the last 24 hours),
+    step is the bucket size in seconds (positive; omitted = automatic), raised
+    so at most history_max_buckets buckets are returned. Ranges starting before the in-memory history are
+    read from the compressed history when it reaches back far enough,
+    otherwise from the coarsest adequate rollup tier of the history database.
+    """
+    settings = get_settings()
+    field = request.args.get("field")
+    if field not in HISTORY_FIELDS:
+        return jsonify({"error": f"field must be one of {', '.join(HISTORY_FIELDS)}"}), 400
+    try:
+        end = _history_time(request.args.get("to"), time.time())
+        start = _history_time(request.args.get("from"), end - 86400)
+        step = float(request.args.get("step") or 0)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid from/to/step: {e}"}), 400
+    if not all(math.isfinite(value) for value in (start, end, step)):
+        return jsonify({"error": "from/to/step must be finite"}), 400
+    if request.args.get("step") and step <= 0:
+        return jsonify({"error": "step must be positive"}), 400
+    if end < start:
+        return jsonify({"error": "from must not be after to"}), 400
+    max_buckets = settings.get("history_max_buckets", 1000)
+    step = max(step, (end - start) / max_buckets, 1)
     
-    # Determine control mode for each actuator
-    fan_mode = "AUTO" if fan_override is None else "MANUAL"
-    heater_mode = "AUTO" if heater_override is None else "MANUAL"
+    oldest = measurement_history.oldest_time()
+    compressed_oldest = compressed_history.oldest_time()
+    if oldest is not None and start < oldest and compressed_oldest is not None and compressed_oldest <= start:
+        result = compressed_history.downsample(field, start, end, step)
+        return jsonify(dict(field=field, start=start, end=end, step=step, source="compressed", **result))
+    if sky_data_store and field in NUMERIC_COLUMNS and (oldest is None or start < oldest):
+        try:
+            with closing(sqlite3.connect(f"file:{sky_data_store.path}?mode=ro", uri=True)) as conn:
+                stored = query_history(conn, field, start, end, step, NUMERIC_COLUMNS)
+            # Measurements not yet committed by the batched writer come from memory
+            written = sky_data_store.stats["last_epoch"]
+            recent = measurement_history.downsample(field, start if written is None else max(start, written + 0.001),
+                                                    end, step, origin=start)
+            return jsonify(dict(field=field, start=start, end=end, step=step, source=stored.pop("tier"),
+                                **merge_buckets(stored, recent)))
+        except sqlite3.Error as e:
+            logger.warning(f"History database query failed, using in-memory history: {e}")
     
+    result = measurement_history.downsample(field, start, end, step)
+    return jsonify(dict(field=field, start=start, end=end, step=step, source="memory", **result))
+
+def merge_buckets(older, newer):
+    """Concatenate two downsampled results with the same alignment, combining a shared bucket"""
+    merged = {key: list(values) for key, values in older.items()}
+    first = 0
+    if merged["t"] and newer["t"] and merged["t"][-1] == newer["t"][0]:
+        count_a, count_b = merged["count"][-1], newer["count"][0]
+        if count_b:
+            if count_a:
+                mean = (merged["mean"][-1] * count_a + newer["mean"][0] * count_b) / (count_a + count_b)
+                merged["mean"][-1] = round(mean, 3)
+                merged["min"][-1] = min(merged["min"][-1], newer["min"][0])
+                merged["max"][-1] = max(merged["max"][-1], newer["max"][0])
+            else:
+                for key in ("mean", "min", "max"):
+                    merged[key][-1] = newer[key][0]
+            merged["count"][-1] = count_a + count_b
+        first = 1
+    for key in merged:
+        merged[key].extend(newer[key][first:])
+    return merged
+
+def _history_time(value, default):
+    """Query parameter as epoch seconds; accepts epoch numbers or ISO timestamps"""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return to_epoch(value)
+
+def cycle_timing():
+    """Lateness and overruns of the safety cycle plus the fetch budget counters"""
+    safety = safety_task.stats()
+    current = published_state
+    return {
+        "last_duration_seconds": safety["last_duration_seconds"],
+        "last_lateness_seconds": safety["last_lateness_seconds"],
+        "max_lateness_seconds": safety["max_lateness_seconds"],
+        "cycle_overruns": safety["missed_deadlines"],
+        "budget_overruns": current["budget_overruns"],
+        "deferred_fetches": current["deferred_fetches"],
+        "fetch_failure_streak": current["fetch_failure_streak"]
+    }
+
+@app.route('/diagnostics', methods=['GET'])
+def api_diagnostics():
+    """Live counters of the control service stages (not cached)"""
     return jsonify({
-        "snapshot": snapshot,
-        "age_seconds": age,
-        "mode": mode,
-        "fan_status": fan_status,
-        "heater_status": heater_status,
-        "fan_mode": fan_mode,
-        "heater_mode": heater_mode,
-        "last_error": last_error,
-        "cycle_count": cycle_count,
-        "uptime_seconds": (utcnow()- control_start_time).total_seconds(),
-        "last_override_action": last_override_action,
-        "last_override_time": last_override_time
+        "scheduler": scheduler.stats(),
+        "cycle_timing": cycle_timing(),
+        "history_points": len(measurement_history),
+        "history_capacity": measurement_history.max_points,
+        "compressed_history": dict(compressed_history.stats, **compressed_history.compression()),
+        "backfill": dict(backfill_stats),
+        "store": dict(sky_data_store.stats) if sky_data_store else None,
+        "archive": dict(archive_compactor.stats) if archive_compactor else None,
+        "startup": dict(startup_stats),
+        "allsky_cache": dict(allsky_cache_stats),
+        "local_node": dict(local_node_stats),
+        "uplink": dict(uplink_stats),
+        "settings": dict(settings_service.stats),
+        "relays": relay_driver.stats(),
+        "commands": dict(command_stats, queued=command_queue.qsize()),
+        "status_cache": dict(status_cache_stats),
+        "events": event_broker.stats(),
+        "api_server": api_server.stats if api_server else None,
+        "http_sessions": get_http_session_stats()
     })
 
 @app.route('/actuators', methods=['POST'])
@@ -385,26 +1264,24 @@ def api_actuators():
         fan_command = data.get("fan")
         heater_command = data.get("heater")
         response = {"fan": None, "heater": None}
+        overrides = {}
         override_action_parts = []
         
         # Process fan command
         if fan_command is not None:
             fan_command = fan_command.lower()
             if fan_command == "auto":
-                with state_lock:
-                    state["fan_override"] = None
+                overrides["fan_override"] = None
                 response["fan"] = {"mode": "AUTO", "message": "Fan set to AUTO mode"}
                 override_action_parts.append("Fan AUTO")
                 logger.warning("Fan set to AUTO mode via API")
             elif fan_command == "on":
-                with state_lock:
-                    state["fan_override"] = True
+                overrides["fan_override"] = True
                 response["fan"] = {"mode": "MANUAL", "state": "ON", "message": "Fan manually set ON"}
                 override_action_parts.append("Fan ON")
                 logger.warning("Fan manually set ON via API")
             elif fan_command == "off":
-                with state_lock:
-                    state["fan_override"] = False
+                overrides["fan_override"] = False
                 response["fan"] = {"mode": "MANUAL", "state": "OFF", "message": "Fan manually set OFF (will be validated for safety)"}
                 override_action_parts.append("Fan OFF")
                 logger.warning("Fan manually set OFF via API (safety validation applies)")
@@ -415,20 +1292,17 @@ def api_actuators():
         if heater_command is not None:
             heater_command = heater_command.lower()
             if heater_command == "auto":
-                with state_lock:
-                    state["heater_override"] = None
+                overrides["heater_override"] = None
                 response["heater"] = {"mode": "AUTO", "message": "Heater set to AUTO mode"}
                 override_action_parts.append("Heater AUTO")
                 logger.warning("Heater set to AUTO mode via API")
             elif heater_command == "on":
-                with state_lock:
-                    state["heater_override"] = True
+                overrides["heater_override"] = True
                 response["heater"] = {"mode": "MANUAL", "state": "ON", "message": "Heater manually set ON (safety rules apply)"}
                 override_action_parts.append("Heater ON")
                 logger.warning("Heater manually set ON via API (safety validation applies)")
             elif heater_command == "off":
-                with state_lock:
-                    state["heater_override"] = False
+                overrides["heater_override"] = False
                 response["heater"] = {"mode": "MANUAL", "state": "OFF", "message": "Heater manually set OFF"}
                 override_action_parts.append("Heater OFF")
                 logger.warning("Heater manually set OFF via API")
@@ -437,22 +1311,25 @@ def api_actuators():
         
         # Record override action
         if override_action_parts:
-            with state_lock:
-                state["last_override_action"] = ", ".join(override_action_parts)
-                state["last_override_time"] = utcnow().isoformat() + "Z"
+            overrides["last_override_action"] = ", ".join(override_action_parts)
+            overrides["last_override_time"] = utcnow().isoformat() + "Z"
         
-        # Immediately apply safety logic with new overrides
-        settings = load_settings()
-        fan_on, heater_on = apply_safety_logic(state["snapshot"], settings)
-        set_relays(fan_on, heater_on)
+        # The control thread applies the overrides and re-evaluates safety at once
+        settings = get_settings()
+        try:
+            current = wait_for_command(submit_command(lambda: state.update(overrides)), settings)
+        except CommandQueueFull as e:
+            return jsonify({"error": str(e)}), 503
+        except FutureTimeoutError:
+            return jsonify({"error": "Control loop did not apply the command in time"}), 504
         
-        with state_lock:
-            response["applied_state"] = {
-                "fan_status": state["fan_status"],
-                "heater_status": state["heater_status"],
-                "fan_mode": "AUTO" if state["fan_override"] is None else "MANUAL",
-                "heater_mode": "AUTO" if state["heater_override"] is None else "MANUAL"
-            }
+        response["applied_state"] = {
+            "fan_status": current["fan_status"],
+            "heater_status": current["heater_status"],
+            "fan_mode": "AUTO" if current["fan_override"] is None else "MANUAL",
+            "heater_mode": "AUTO" if current["heater_override"] is None else "MANUAL",
+            "state_version": current["version"]
+        }
         
         return jsonify(response), 200
         
@@ -460,102 +1337,335 @@ def api_actuators():
         logger.error(f"Error in /actuators endpoint: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/uplink', methods=['POST'])
+def api_uplink():
+    """
+    Webhook for network-server uplinks (TTN v3 or Chirpstack v4 JSON).
+    The base64 frm_payload is decoded here; the control thread merges it
+    into the snapshot and re-evaluates safety without waiting for a cycle.
+    Requires "Authorization: Bearer <uplink_webhook_token>"; refused while
+    the token is empty. The API listens on 127.0.0.1 only, so the network
+    server reaches it through a reverse proxy (admin/uplink-proxy.nginx.conf).
+    """
+    settings = get_settings()
+    token = settings.get("uplink_webhook_token")
+    if not token:
+        # Never accept unauthenticated uplinks, even on loopback behind a proxy
+        uplink_stats["rejected"] += 1
+        return jsonify({"error": "Uplink webhook disabled: set uplink_webhook_token"}), 503
+    if request.headers.get("Authorization") != f"Bearer {token}":
+        uplink_stats["rejected"] += 1
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    try:
+        payload, meta = parse_network_uplink(request.get_json(silent=True))
+        values = decode_uplink(payload, settings.get("raining_threshold", 100))
+    except ValueError as e:
+        uplink_stats["rejected"] += 1
+        uplink_stats["last_error"] = str(e)
+        logger.warning(f"Rejected uplink: {e}")
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        current = wait_for_command(submit_command(lambda: store_uplink(values, meta)), settings)
+    except CommandQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    except FutureTimeoutError:
+        return jsonify({"error": "Control loop did not apply the uplink in time"}), 504
+    return jsonify({
+        "accepted": True,
+        "mode": current["mode"],
+        "fan_status": current["fan_status"],
+        "heater_status": current["heater_status"],
+        "state_version": current["version"]
+    }), 200
+
+@app.route('/endpoints', methods=['GET'])
+def api_endpoints():
+    """Per-endpoint latency histograms, EWMA statistics and breaker state"""
+    return jsonify(get_all_endpoint_stats())
+
 @app.route('/health', methods=['GET'])
 def api_health():
     """Health check endpoint"""
+    current = published_state
     return jsonify({
         "status": "running",
-        "mode": state["mode"],
-        "active_endpoint": "primary" if state["mode"] == "NORMAL" else "fallback",
-        "uptime_seconds": (utcnow()- state["control_start_time"]).total_seconds()
+        "mode": current["mode"],
+        "active_endpoint": "primary" if current["mode"] == "NORMAL" else "fallback",
+        "uptime_seconds": (utcnow()- current["control_start_time"]).total_seconds(),
+        "state_version": current["version"]
     })
 
-def save_state_snapshot():
-    """Save last known good snapshot to disk (optional persistence)"""
+def retention_seconds(settings):
+    """Per-tier retention of the history database (0 = keep forever)"""
+    days = {"raw": settings.get("retention_raw_days", 7), "1m": settings.get("retention_1m_days", 30),
+            "15m": settings.get("retention_15m_days", 365), "1h": settings.get("retention_1h_days", 0)}
+    return {tier: value * 86400 for tier, value in days.items()}
+
+# === Warm restart ===
+# save_state_snapshot persists the last good snapshot, mode and heater off
+# time; restore_state_snapshot reads them back at startup so the first
+# safety evaluation can act on them instead of waiting for a fetch.
+
+STATE_FILE = "state.json"
+startup_stats = {"restored": False, "restore_error": None, "state_age_seconds": None, "data_age_seconds": None,
+                 "heater_off_time_restored": False, "restored_snapshot_expired": False,
+                 "first_decision_ms": None, "first_decision_source": None,
+                 "history_points_loaded": 0, "history_load_seconds": None}
+_startup = {"started": None, "restored_snapshot": None, "expires": None}  # time.monotonic() values
+
+def load_compressed_history(settings, history, now=None):
+    """
+    Fill history from disk: the archived months, then the raw sky_data rows
+    after them, back to its retention. Spans that only survive as rollups
+    (raw rows pruned with the archive disabled) are not restored.
+    Returns the number of points loaded.
+    """
+    since = (time.time() if now is None else now) - history.retention_seconds
+    loaded = 0
+    if settings.get("archive_enabled", True):
+        reader = ArchiveReader(settings.get("archive_dir", "archive"))
+        try:
+            for year, month in reader.months():
+                month_end = month_bounds(year, month)[1]
+                if month_end <= since:
+                    continue
+                archive = reader.open(year, month)
+                epochs = archive.columns["epoch"][archive.slice(since, month_end)]
+                columns = {field: archive.read(field, since, month_end)[1] for field in HISTORY_FIELDS}
+                loaded += history.load(epochs, columns)
+        finally:
+            reader.close()
+    
+    # Raw rows still in the database; rows already loaded from the archive are skipped by load()
+    if sky_data_store and os.path.exists(sky_data_store.path):
+        with closing(sqlite3.connect(f"file:{sky_data_store.path}?mode=ro", uri=True)) as conn:
+            cursor = conn.execute(f"SELECT epoch, {', '.join(HISTORY_FIELDS)} FROM sky_data "
+                                  f"WHERE epoch >= ? ORDER BY epoch", (since,))
+            while True:
+                rows = cursor.fetchmany(FETCH_ROWS)
+                if not rows:
+                    break
+                data = np.array(rows, dtype=np.float64)  # NULL -> NaN
+                loaded += history.load(data[:, 0], dict(zip(HISTORY_FIELDS, data[:, 1:].T)))
+    return loaded
+
+def rebuild_compressed_history(settings):
+    """
+    Startup job: load the long-range history from disk into a new
+    CompressedHistory, then swap it in. Encoding a year takes a while, so it
+    runs beside the control loop; measurements recorded meanwhile are taken
+    over from the in-memory ring buffer under control_lock.
+    """
+    global compressed_history
+    started = time.monotonic()
+    try:
+        rebuilt = CompressedHistory(HISTORY_FIELDS, block_size=compressed_history.block_size,
+                                    retention_seconds=compressed_history.retention_seconds)
+        loaded = load_compressed_history(settings, rebuilt)
+        with control_lock:
+            newest = rebuilt.latest_time()
+            for epoch, point in measurement_history.range(newest):
+                if newest is None or epoch > newest:
+                    rebuilt.append(epoch, point)
+            compressed_history = rebuilt
+        startup_stats["history_points_loaded"] = loaded
+        startup_stats["history_load_seconds"] = round(time.monotonic() - started, 2)
+        logger.warning(f"Compressed history: {loaded} points loaded in {startup_stats['history_load_seconds']}s")
+    except (sqlite3.Error, OSError, ValueError) as e:
+        logger.error(f"Compressed history could not be loaded: {e}")
+
+def save_state_snapshot(path=STATE_FILE):
+    """Save last known good snapshot, mode and heater off time to disk"""
     try:
         if state["snapshot"] and state["snapshot"].get("valid"):
-            with open("state.json.tmp", "w") as f:
+            off_time = state["last_heater_off_time"]
+            with open(path + ".tmp", "w") as f:
                 json.dump({
                     "snapshot": state["snapshot"],
                     "mode": state["mode"],
+                    "heater_status": state["heater_status"],
+                    "last_heater_off_time": off_time.isoformat() if off_time else None,
+                    "active_endpoint_index": state["active_endpoint_index"],
                     "timestamp": utcnow().isoformat()
                 }, f, indent=2)
             # Atomic write
-            import os
-            os.replace("state.json.tmp", "state.json")
+            os.replace(path + ".tmp", path)
     except Exception as e:
         logger.error(f"Failed to save state snapshot: {e}")
 
+def restore_state_snapshot(settings, path=STATE_FILE):
+    """
+    Restore the state saved by save_state_snapshot. The heater off time is
+    always restored - a heater that was ON when saved counts as switched off
+    now - so the minimum off time survives a crash. The snapshot and mode are
+    only restored when the measurement is at most restore_max_age_seconds
+    old, the snapshot passes validate_snapshot and the mode was NORMAL or
+    FALLBACK; the bound is capped at max_data_age_seconds. The restored
+    snapshot is dropped once it reaches that age unless a fetch has
+    replaced it. Returns True if the snapshot was restored.
+    """
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+        saved_epoch = to_epoch(saved["timestamp"])
+        if saved_epoch is None:
+            raise ValueError("no timestamp")
+        off_time = saved.get("last_heater_off_time")
+        if off_time:
+            off_time = datetime.fromisoformat(off_time)
+            if off_time.tzinfo is None:
+                off_time = off_time.replace(tzinfo=timezone.utc)
+    except FileNotFoundError:
+        startup_stats["restore_error"] = "No saved state"
+        return False
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        startup_stats["restore_error"] = f"Unreadable saved state: {e}"
+        logger.warning(f"Ignoring saved state {path}: {e}")
+        return False
+    
+    now = time.time()
+    startup_stats["state_age_seconds"] = round(now - saved_epoch, 1)
+    if saved.get("heater_status") == "ON":
+        state["last_heater_off_time"] = utcnow()
+    elif off_time is not None:
+        state["last_heater_off_time"] = min(off_time, utcnow())
+    startup_stats["heater_off_time_restored"] = state["last_heater_off_time"] is not None
+    
+    snapshot = saved.get("snapshot")
+    # Never act on data the live fetch path would already reject
+    max_age = min(settings.get("restore_max_age_seconds", 300), settings.get("max_data_age_seconds", 300))
+    error = None
+    if not isinstance(snapshot, dict) or not snapshot.get("valid"):
+        error = "Saved snapshot is not valid"
+    elif saved.get("mode") not in ("NORMAL", "FALLBACK"):
+        error = f"Saved mode {saved.get('mode')} is not resumable"
+    elif any(not isinstance(snapshot.get(field), (int, float, type(None))) for field in HISTORY_FIELDS):
+        error = "Saved snapshot has non-numeric readings"
+    else:
+        try:
+            measured = to_epoch(snapshot.get("measurement_timestamp")) or saved_epoch
+        except (ValueError, TypeError) as e:
+            measured, error = None, f"Invalid measurement timestamp: {e}"
+        if measured is not None:
+            data_age = now - measured
+            startup_stats["data_age_seconds"] = round(data_age, 1)
+            snapshot = dict(snapshot, age_seconds=round(data_age, 1))
+            if data_age < -60 or now - saved_epoch < -60:
+                error = "Saved state is from the future"
+            elif not validate_snapshot(snapshot, dict(settings, max_data_age_seconds=max_age)):
+                error = f"Saved snapshot too old or incomplete (limit {max_age}s)"
+    if error:
+        startup_stats["restore_error"] = error
+        logger.warning(f"Saved snapshot not restored: {error}")
+        return False
+    
+    with control_lock:
+        state["snapshot"] = snapshot
+        state["mode"] = saved["mode"]
+        index = saved.get("active_endpoint_index")
+        state["active_endpoint_index"] = index if isinstance(index, int) else None
+    _startup["restored_snapshot"] = snapshot
+    _startup["expires"] = time.monotonic() + max_age - data_age
+    startup_stats["restored"] = True
+    startup_stats["restore_error"] = None
+    logger.warning(f"Restored {saved['mode']} state from {path} (measurement {data_age:.0f}s old)")
+    return True
+
+def expire_restored_snapshot():
+    """Drop a restored snapshot that no fetch has replaced within restore_max_age_seconds"""
+    if state["snapshot"] is not None and state["snapshot"] is _startup["restored_snapshot"] \
+            and time.monotonic() > _startup["expires"]:
+        logger.warning("Restored snapshot expired before a fetch succeeded")
+        state["snapshot"] = None
+        startup_stats["restored_snapshot_expired"] = True
+
+def record_first_decision():
+    """Time from service start to the first safety decision on a valid snapshot"""
+    if startup_stats["first_decision_ms"] is not None or _startup["started"] is None:
+        return
+    if state["snapshot"] and state["snapshot"].get("valid"):
+        startup_stats["first_decision_ms"] = round((time.monotonic() - _startup["started"]) * 1000, 1)
+        startup_stats["first_decision_source"] = \
+            "restored" if state["snapshot"] is _startup["restored_snapshot"] else "fetched"
+        logger.warning(f"First valid safety decision after {startup_stats['first_decision_ms']} ms "
+                       f"({startup_stats['first_decision_source']} snapshot)")
+
 def run_control_service():
     """Main entry point for control service"""
     logger.warning("=== Skymonitor Control Service Starting ===")
+    _startup["started"] = time.monotonic()
     
-    settings = load_settings()
+    settings = get_settings()
     setup_gpio()
     
     # Enforce safe defaults at startup
     set_relays(fan_on=True, heater_on=False)
     
-    logger.warning(f"Control loop interval: {settings['sleep_time']} seconds")
-    logger.warning(f"Primary endpoint: {settings['primary_endpoint']}")
-    logger.warning(f"Fallback endpoint: {settings['fallback_endpoint']}")
-    
-    # Start Flask API in background thread
-    from threading import Thread
-    import socket
+    # Warm restart: the first safety evaluation acts on the saved snapshot if it is fresh enough
+    restore_state_snapshot(settings)
     
-    def run_flask_api():
-        """Run Flask API with explicit error logging"""
-        try:
-            logger.warning(f"Attempting to bind Flask API to 127.0.0.1:{settings['control_port']}")
-            app.run(
-                host='127.0.0.1',
-                port=settings['control_port'],
-                debug=False,
-                use_reloader=False
-            )
-        except Exception as e:
-            logger.error(f"FATAL: Flask API failed to start: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+    logger.warning(f"Cadences: local sensors {settings.get('local_sensor_interval_seconds', 1)}s, "
+                   f"fetch {settings.get('fetch_interval_seconds', 60)}s, "
+                   f"persistence {settings.get('persist_interval_seconds', 300)}s, "
+                   f"safety watchdog {settings['sleep_time']}s")
+    endpoints = get_endpoint_list(settings)
+    for index, endpoint in enumerate(endpoints):
+        logger.warning(f"Endpoint {index}: {endpoint}")
+    logger.warning(f"Hedged fetch: {'ON' if settings.get('hedged_fetch', True) else 'OFF'}")
     
-    api_thread = Thread(target=run_flask_api)
-    api_thread.daemon = True
-    api_thread.start()
+    # Open keep-alive connections before the first cycle
+    warm_http_sessions(endpoints, settings)
     
-    # Verify Flask actually bound to port
-    time.sleep(1)  # Give Flask time to bind
+    # Start the API on a pooled server; binding is synchronous, so a busy
+    # port is reported here and the control loop still runs without the API
+    global api_server
     try:
-        test_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        test_sock.settimeout(2)
-        result = test_sock.connect_ex(('127.0.0.1', settings['control_port']))
-        test_sock.close()
-        if result == 0:
-            logger.warning(f"✓ Flask API successfully bound to http://127.0.0.1:{settings['control_port']}")
-        else:
-            logger.error(f"✗ Flask API NOT reachable on port {settings['control_port']} - control service will not accept connections")
-    except Exception as e:
-        logger.error(f"✗ Unable to verify Flask API startup: {e}")
+        event_broker.max_clients = stream_client_limit(settings)
+        api_server = WSGIServer('127.0.0.1', settings['control_port'], app, **server_options(settings))
+        serve_in_background(api_server, "control-api")
+        logger.warning(f"✓ Control API ready on http://127.0.0.1:{settings['control_port']} "
+                       f"({api_server.threads} workers, {event_broker.max_clients} event streams)")
+    except OSError as e:
+        logger.error(f"✗ Control API failed to bind port {settings['control_port']}: {e} - "
+                     f"control loop continues without API")
+    
+    # Measurement history on disk, written in batches by a background thread
+    global sky_data_store, archive_compactor
+    if settings.get("store_enabled", True):
+        sky_data_store = SkyDataStore(settings.get("database_file", "sky_data.db"),
+                                      batch_size=settings.get("store_batch_size", 60),
+                                      flush_interval=settings.get("store_flush_interval_seconds", 600),
+                                      max_buffered=settings.get("store_max_buffered_rows", 10000),
+                                      retention=retention_seconds(settings),
+                                      prune_limit=settings.get("prune_batch_rows", 5000)).start()
+        # Months outside the live window go to columnar files; raw rows are pruned once archived
+        if settings.get("archive_enabled", True):
+            archive_compactor = ArchiveCompactor(sky_data_store.path, settings.get("archive_dir", "archive"),
+                                                 sky_data_store)
     
-    # Main control loop
+    # Long-range history survives restarts: refill the compressed blocks in the background
+    threading.Thread(target=rebuild_compressed_history, args=(settings,), name="history-load", daemon=True).start()
+    
+    notify_systemd("READY=1")
+    
+    settings_service.subscribe(on_settings_changed)
+    
+    # systemctl stop sends SIGTERM: shut down through the same path as Ctrl-C so
+    # buffered history is committed and the relays are left in their safe state
+    def handle_sigterm(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
+    # Main control loop - each stage on its own cadence, safety on new input
     try:
+        scheduler.start()
         while True:
-            start_time = time.time()
-            
-            # Reload settings each iteration
-            settings = load_settings()
-            
-            # Run control logic
-            control_loop_iteration(settings)
-            
-            # Save state periodically (every 10th cycle)
-            if state["cycle_count"] % 10 == 0:
-                save_state_snapshot()
-            
-            # Sleep for configured interval
-            elapsed = time.time() - start_time
-            sleep_time = max(settings["sleep_time"] - elapsed, 0)
-            time.sleep(sleep_time)
+            # Cached; re-read only when settings.json changes
+            settings = get_settings()
+            scheduler.run_pending(settings)
+            scheduler.wait()
             
     except KeyboardInterrupt:
         logger.warning("Control service stopped by user")
@@ -563,12 +1673,16 @@ def run_control_service():
         logger.error(f"Fatal error in control loop: {e}")
         raise
     finally:
-        if GPIO_AVAILABLE:
-            # Enforce safe defaults on shutdown
-            GPIO.output(RELAY_FAN_IN, GPIO.LOW)   # Fan ON
-            GPIO.output(RELAY_FAN_OUT, GPIO.LOW)  # Fan ON
-            GPIO.output(RELAY_HEATER, GPIO.HIGH)  # Heater OFF
-            GPIO.cleanup()
+        save_state_snapshot()
+        close_http_sessions()
+        if archive_compactor:
+            archive_compactor.close()
+        if sky_data_store:
+            sky_data_store.close()  # Commits buffered rows
+        if api_server:
+            api_server.shutdown()
+        # Enforce safe defaults on shutdown (fan ON, heater OFF)
+        release_gpio()
         logger.warning("Control service shutdown complete")
 
 if __name__ == '__main__':
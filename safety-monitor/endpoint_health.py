@@ -0,0 +1,161 @@
+# endpoint_health.py
+# Per-endpoint latency histograms, EWMA latency/error rate and a circuit
+# breaker. Used by the fetch path to order endpoints: open breakers are
+# skipped, slow or error-prone endpoints are demoted, and both get a
+# single half-open probe once their cooldown has elapsed.
+
+import threading
+import time
+
+# Fixed histogram bucket upper bounds in milliseconds (last bucket = overflow)
+LATENCY_BUCKETS_MS = (50, 100, 200, 500, 1000, 2000, 5000)
+
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+class EndpointHealth:
+    """Latency/error statistics and circuit breaker for one endpoint"""
+
+    def __init__(self, url):
+        self.url = url
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.requests = 0
+        self.failures = 0
+        self.ewma_latency = None  # seconds
+        self.ewma_error_rate = 0.0
+        self.consecutive_failures = 0
+        self.breaker = CLOSED
+        self.cooldown = None
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.next_probe = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency, success, settings):
+        """Record one attempt's latency (seconds) and outcome"""
+        alpha = settings.get("ewma_alpha", 0.2)
+        latency_ms = latency * 1000
+        with self._lock:
+            index = 0
+            while index < len(LATENCY_BUCKETS_MS) and latency_ms > LATENCY_BUCKETS_MS[index]:
+                index += 1
+            self.buckets[index] += 1
+            self.requests += 1
+            self.ewma_latency = latency if self.ewma_latency is None else \
+                alpha * latency + (1 - alpha) * self.ewma_latency
+            self.ewma_error_rate = alpha * (0.0 if success else 1.0) + (1 - alpha) * self.ewma_error_rate
+            was_probe = self.probe_in_flight
+            self.probe_in_flight = False
+
+            if success:
+                self.consecutive_failures = 0
+                if self.breaker != CLOSED:
+                    self.breaker = CLOSED
+                    self.cooldown = None
+                return
+
+            self.failures += 1
+            self.consecutive_failures += 1
+            threshold = settings.get("primary_failure_threshold", 3)
+            if self.breaker == HALF_OPEN and was_probe:
+                self._trip(settings, doubled=True)
+            elif self.breaker == CLOSED and self.consecutive_failures >= threshold:
+                self._trip(settings, doubled=False)
+
+    def _trip(self, settings, doubled):
+        base = settings.get("breaker_cooldown_seconds", 30)
+        cap = settings.get("fallback_retry_interval_seconds", 300)
+        self.cooldown = min(self.cooldown * 2, cap) if doubled and self.cooldown else min(base, cap)
+        self.breaker = OPEN
+        self.open_until = time.monotonic() + self.cooldown
+
+    def is_degraded(self, settings):
+        """Succeeding but slow, or failing often"""
+        if self.ewma_latency is None:
+            return False
+        return (self.ewma_latency > settings.get("slow_endpoint_latency_seconds", 1.0)
+                or self.ewma_error_rate > settings.get("endpoint_error_rate_threshold", 0.5))
+
+    def classify(self, settings, now=None):
+        """
+        Return "healthy", "degraded", "probe" or "blocked" and claim the
+        probe slot when one is due. Only one probe is in flight at a time.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.breaker == OPEN and now >= self.open_until:
+                self.breaker = HALF_OPEN
+            if self.breaker == HALF_OPEN:
+                if self.probe_in_flight:
+                    return "blocked"
+                self.probe_in_flight = True
+                return "probe"
+            if self.breaker == OPEN:
+                return "blocked"
+            if self.is_degraded(settings):
+                # Periodically give a demoted endpoint its slot back to re-measure it
+                if now >= self.next_probe:
+                    self.next_probe = now + settings.get("breaker_cooldown_seconds", 30)
+                    return "probe"
+                return "degraded"
+            return "healthy"
+
+    def release_probe(self):
+        """Give back a probe slot that was claimed but not used this cycle"""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def snapshot(self):
+        """JSON-serializable view for the control API"""
+        with self._lock:
+            labels = [f"le_{b}ms" for b in LATENCY_BUCKETS_MS] + ["overflow"]
+            return {
+                "histogram": dict(zip(labels, self.buckets)),
+                "requests": self.requests,
+                "failures": self.failures,
+                "ewma_latency_ms": None if self.ewma_latency is None else round(self.ewma_latency * 1000, 1),
+                "ewma_error_rate": round(self.ewma_error_rate, 3),
+                "consecutive_failures": self.consecutive_failures,
+                "breaker": self.breaker,
+                "cooldown_seconds": self.cooldown,
+                "open_for_seconds": max(round(self.open_until - time.monotonic(), 1), 0) if self.breaker == OPEN else 0
+            }
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def get_endpoint_health(url):
+    with _registry_lock:
+        health = _registry.get(url)
+        if health is None:
+            health = _registry[url] = EndpointHealth(url)
+        return health
+
+def order_endpoints(endpoint_urls, settings):
+    """
+    Order endpoints for this cycle as [(index, url), ...], index being the
+    position in the configured list. Healthy endpoints and due probes keep
+    their priority, degraded ones follow, open breakers are left out. If
+    everything is blocked the configured order is returned unchanged so
+    the service never stops trying.
+    """
+    now = time.monotonic()
+    preferred, demoted = [], []
+    for index, url in enumerate(endpoint_urls):
+        status = get_endpoint_health(url).classify(settings, now)
+        if status in ("healthy", "probe"):
+            preferred.append((index, url))
+        elif status == "degraded":
+            demoted.append((index, url))
+    ordered = preferred + demoted
+    return ordered or list(enumerate(endpoint_urls))
+
+def get_all_endpoint_stats():
+    with _registry_lock:
+        items = list(_registry.items())
+    return {url: health.snapshot() for url, health in items}
+
+def reset_endpoint_health():
+    with _registry_lock:
+        _registry.clear()
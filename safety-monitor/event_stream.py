@@ -0,0 +1,94 @@
+# event_stream.py
+# Fan-out of control state events to Server-Sent Events clients.
+# Publishing never blocks: every client has its own bounded queue and a
+# slow client loses its oldest events (each event carries the full state,
+# so skipping ahead is safe). Recent events are kept for Last-Event-ID resume.
+
+import threading
+from collections import deque
+
+class TooManyClients(Exception):
+    """The event stream client limit has been reached"""
+
+def format_sse(event_id, data, event="state"):
+    """Encode one SSE message"""
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n".encode()
+
+class EventClient:
+    """Bounded per-client event queue"""
+
+    def __init__(self, max_queue):
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def push(self, event):
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(event)
+            self._cond.notify()
+
+    def next(self, timeout):
+        """Next (event_id, message) or None after timeout"""
+        with self._cond:
+            if not self._queue:
+                self._cond.wait(timeout)
+            return self._queue.popleft() if self._queue else None
+
+class EventBroker:
+    """Publishes (event_id, message) pairs to subscribed clients"""
+
+    def __init__(self, history_size=100, client_queue_size=16, max_clients=8):
+        self.client_queue_size = client_queue_size
+        self.max_clients = max_clients
+        self._history = deque(maxlen=history_size)
+        self._clients = set()
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, event_id, data, event="state"):
+        message = (event_id, format_sse(event_id, data, event))
+        with self._lock:
+            self._history.append(message)
+            self.published += 1
+            clients = list(self._clients)
+        for client in clients:
+            client.push(message)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Register a client. With last_event_id the missed events are queued
+        for it first; returns (client, resumed). resumed is False when the
+        history no longer covers the gap and the caller must send a full resync.
+        """
+        client = EventClient(self.client_queue_size)
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                raise TooManyClients(f"Event stream limit of {self.max_clients} clients reached")
+            resumed = False
+            if last_event_id is not None and self._history:
+                oldest, latest = self._history[0][0], self._history[-1][0]
+                if oldest <= last_event_id + 1 and last_event_id <= latest:
+                    missed = [message for message in self._history if message[0] > last_event_id]
+                    for message in missed[-self.client_queue_size:]:
+                        client.push(message)
+                    resumed = True
+            self._clients.add(client)
+        return client, resumed
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def stats(self):
+        with self._lock:
+            clients = list(self._clients)
+            return {
+                "clients": len(clients),
+                "published": self.published,
+                "buffered": len(self._history),
+                "dropped": sum(client.dropped for client in clients)
+            }
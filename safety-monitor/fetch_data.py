@@ -2,27 +2,134 @@
 # HTTP-only sensor data fetching
 # ALL serial port functionality has been REMOVED
 
+import os
 import requests
 import json
 import time
 import logging
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from requests.adapters import HTTPAdapter
 from app_logging import setup_logger, should_log
+from history import to_epoch
+from endpoint_health import get_endpoint_health, order_endpoints
+from weather_indicators import rain_detected
 
 logger = setup_logger('fetch_data', 'fetch_data.log', level=logging.WARNING)
 
-# === HTTP Polling Functions ===
+# === Pooled HTTP Sessions ===
+# One keep-alive session per endpoint origin (scheme://host:port).
+# Reusing a pooled connection skips the DNS lookup and TCP/TLS handshakes
+# that a bare requests.get() pays on every poll.
+
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+def _endpoint_origin(endpoint_url):
+    """Return scheme://host[:port] for an endpoint URL"""
+    parts = urlsplit(endpoint_url)
+    return f"{parts.scheme}://{parts.netloc}"
 
-def fetch_sensor_data_http(endpoint_url, settings, max_retries=3):
+def get_http_session(endpoint_url):
+    """Return the pooled keep-alive session for an endpoint's origin"""
+    origin = _endpoint_origin(endpoint_url)
+    with _http_sessions_lock:
+        session = _http_sessions.get(origin)
+        if session is None:
+            session = requests.Session()
+            # Retries are handled by fetch_sensor_data_http, not urllib3
+            session.mount(origin, HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0))
+            _http_sessions[origin] = session
+        return session
+
+def warm_http_sessions(endpoint_urls, settings):
     """
-    Fetch sensor data via HTTP with retry and backoff.
-    Returns a normalized snapshot dict with validity flag.
+    Open pooled connections to all endpoints ahead of the first control cycle.
+    Failures are logged and ignored - the regular fetch path will retry.
     """
     timeout = settings.get("http_timeout_seconds", 2)
-    backoff = settings.get("retry_backoff_seconds", 2)
-    max_age = settings.get("max_data_age_seconds", 300)
-    
-    snapshot = {
+    for endpoint_url in dict.fromkeys(u for u in endpoint_urls if u):
+        try:
+            get_http_session(endpoint_url).head(endpoint_url, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Connection warm-up failed for {_endpoint_origin(endpoint_url)}: {e}")
+
+def get_http_session_stats():
+    """
+    Report per-origin connection reuse.
+    handshakes = new connections opened, reused_requests = requests served
+    over an already open connection.
+    """
+    stats = {}
+    with _http_sessions_lock:
+        sessions = list(_http_sessions.items())
+    for origin, session in sessions:
+        pools = session.get_adapter(origin).poolmanager.pools
+        handshakes, total = 0, 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                handshakes += pool.num_connections
+                total += pool.num_requests
+        stats[origin] = {
+            "requests": total,
+            "handshakes": handshakes,
+            "reused_requests": max(total - handshakes, 0)
+        }
+    return stats
+
+def close_http_sessions():
+    """Close all pooled sessions (service shutdown)"""
+    with _http_sessions_lock:
+        for session in _http_sessions.values():
+            session.close()
+        _http_sessions.clear()
+
+# === Conditional GET / Unchanged Measurement Cache ===
+# MeetJeStad publishes every few minutes while we poll every cycle.
+# Per endpoint we keep the HTTP validators, the raw body, the record
+# timestamp and the snapshot built from it. An unchanged measurement
+# returns that same snapshot object, so callers can detect it by identity.
+# The cached snapshot may already be installed as state["snapshot"], so it
+# is never modified here; the control thread refreshes its age.
+
+_endpoint_cache = {}
+
+def _conditional_headers(endpoint_url):
+    """Build If-None-Match / If-Modified-Since headers from the last response"""
+    cached = _endpoint_cache.get(endpoint_url)
+    headers = {}
+    if cached:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+    return headers
+
+def _reuse_cached_snapshot(cached, max_age):
+    """
+    Return the cached snapshot (unmodified) if its measurement is still fresh.
+    Returns (snapshot, None) or (None, error) when the measurement is too old.
+    """
+    measurement_dt = cached["measurement_dt"]
+    if measurement_dt is not None:
+        age = (datetime.utcnow() - measurement_dt.replace(tzinfo=None)).total_seconds()
+        if age > max_age:
+            return None, f"Data too old: {age:.0f}s > {max_age}s"
+    return cached["snapshot"], None
+
+def clear_endpoint_cache():
+    """Forget validators and cached snapshots (forces a full fetch)"""
+    _endpoint_cache.clear()
+
+# === HTTP Polling Functions ===
+
+def new_snapshot():
+    """Return an empty, invalid snapshot with all known fields set to None"""
+    return {
         "valid": False,
         "errors": [],
         "received_timestamp": datetime.utcnow().isoformat(),
@@ -44,17 +151,63 @@ def fetch_sensor_data_http(endpoint_url, settings, max_retries=3):
         "star_count": None,
         "day_or_night": None
     }
+
+def _retry_backoff(attempt, max_retries, backoff, deadline):
+    """
+    Sleep before the next retry. With a deadline the sleep only happens if
+    it fits in the remaining budget - otherwise the retry belongs to a later cycle.
+    """
+    if attempt >= max_retries - 1:
+        return
+    delay = backoff * (attempt + 1)
+    if deadline is not None and time.monotonic() + delay >= deadline:
+        return
+    time.sleep(delay)
+
+def fetch_sensor_data_http(endpoint_url, settings, max_retries=3, deadline=None):
+    """
+    Fetch sensor data via HTTP with retry and backoff.
+    Returns a normalized snapshot dict with validity flag.
+    deadline is an optional time.monotonic() value: attempt timeouts are
+    clipped to it and no attempt is started once it has passed.
+    If the endpoint still serves the previous measurement (304, identical
+    body or identical record timestamp) the previously returned snapshot
+    object is returned as-is, with only age_seconds refreshed.
+    """
+    timeout = settings.get("http_timeout_seconds", 2)
+    backoff = settings.get("retry_backoff_seconds", 2)
+    max_age = settings.get("max_data_age_seconds", 300)
+    
+    snapshot = new_snapshot()
     
     for attempt in range(max_retries):
+        attempt_timeout = timeout
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                snapshot["errors"].append(f"Cycle budget exhausted before attempt {attempt + 1}")
+                break
+            attempt_timeout = min(timeout, remaining)
         try:
-            response = requests.get(endpoint_url, timeout=timeout)
+            response = get_http_session(endpoint_url).get(
+                endpoint_url, timeout=attempt_timeout, headers=_conditional_headers(endpoint_url)
+            )
             response.raise_for_status()
             
+            # Unchanged measurement - skip parsing entirely
+            cached = _endpoint_cache.get(endpoint_url)
+            if cached is not None and (response.status_code == 304 or response.content == cached["body"]):
+                reused, error = _reuse_cached_snapshot(cached, max_age)
+                if reused is not None:
+                    return reused
+                snapshot["errors"].append(error)
+                _retry_backoff(attempt, max_retries, backoff, deadline)
+                continue
+            
             data = response.json()
             if not data or not isinstance(data, list) or len(data) == 0:
                 snapshot["errors"].append("Empty or invalid JSON response")
-                if attempt < max_retries - 1:
-                    time.sleep(backoff * (attempt + 1))
+                _retry_backoff(attempt, max_retries, backoff, deadline)
                 continue
             
             # Parse MeetJeStad-style JSON
@@ -67,11 +220,21 @@ def fetch_sensor_data_http(endpoint_url, settings, max_retries=3):
             
             if temp is None or humidity is None:
                 snapshot["errors"].append("Missing required fields (temperature or humidity)")
-                if attempt < max_retries - 1:
-                    time.sleep(backoff * (attempt + 1))
+                _retry_backoff(attempt, max_retries, backoff, deadline)
+                continue
+            
+            # Same record timestamp as last time - body differs only cosmetically
+            if cached is not None and timestamp_str and timestamp_str == cached["fingerprint"]:
+                reused, error = _reuse_cached_snapshot(cached, max_age)
+                if reused is not None:
+                    cached["body"] = response.content
+                    return reused
+                snapshot["errors"].append(error)
+                _retry_backoff(attempt, max_retries, backoff, deadline)
                 continue
             
             # Parse timestamp and check age
+            measurement_dt = None
             if timestamp_str:
                 try:
                     measurement_dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
@@ -81,8 +244,7 @@ def fetch_sensor_data_http(endpoint_url, settings, max_retries=3):
                     
                     if age > max_age:
                         snapshot["errors"].append(f"Data too old: {age:.0f}s > {max_age}s")
-                        if attempt < max_retries - 1:
-                            time.sleep(backoff * (attempt + 1))
+                        _retry_backoff(attempt, max_retries, backoff, deadline)
                         continue
                 except Exception as e:
                     snapshot["errors"].append(f"Timestamp parse error: {e}")
@@ -91,6 +253,7 @@ def fetch_sensor_data_http(endpoint_url, settings, max_retries=3):
             snapshot["temperature"] = round(float(temp), 1) if temp is not None else None
             snapshot["humidity"] = round(float(humidity), 1) if humidity is not None else None
             snapshot["valid"] = True
+            snapshot["source_endpoint"] = endpoint_url
             
             # Optional fields
             if "rain" in record or "rain_intensity" in record:
@@ -98,6 +261,15 @@ def fetch_sensor_data_http(endpoint_url, settings, max_retries=3):
             if "wind_speed" in record:
                 snapshot["wind"] = record.get("wind_speed")
             
+            _endpoint_cache[endpoint_url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "body": response.content,
+                "fingerprint": timestamp_str,
+                "measurement_dt": measurement_dt,
+                "snapshot": snapshot
+            }
+            
             logger.warning(f"HTTP fetch successful: temp={snapshot['temperature']}, humid={snapshot['humidity']}, age={snapshot.get('age_seconds', 'N/A')}s")
             return snapshot
             
@@ -112,14 +284,356 @@ def fetch_sensor_data_http(endpoint_url, settings, max_retries=3):
             logger.error(f"Unexpected error in HTTP fetch: {e}")
         
         # Backoff before retry
-        if attempt < max_retries - 1:
-            time.sleep(backoff * (attempt + 1))
+        _retry_backoff(attempt, max_retries, backoff, deadline)
     
     # All retries failed
     snapshot["valid"] = False
     logger.error(f"HTTP fetch failed after {max_retries} attempts: {snapshot['errors']}")
     return snapshot
 
+# === Hedged Multi-Endpoint Fetching ===
+# Endpoints are raced in priority order: the next one is started when the
+# previous has not produced a valid snapshot within hedge_delay_seconds (or
+# failed outright). Worst-case latency is about one HTTP timeout instead of
+# the sum of all sequential retries.
+
+_hedge_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hedged-fetch")
+
+def fetch_with_health(endpoint_url, settings, deadline=None):
+    """Single-attempt fetch that feeds the endpoint's latency/error statistics"""
+    start = time.monotonic()
+    snapshot = fetch_sensor_data_http(endpoint_url, settings, 1, deadline)
+    get_endpoint_health(endpoint_url).record(time.monotonic() - start, bool(snapshot.get("valid")), settings)
+    return snapshot
+
+def fetch_sensor_data_hedged(endpoint_urls, settings, deadline=None):
+    """
+    Fetch from an ordered endpoint list with hedged requests.
+    The race order comes from order_endpoints (open breakers skipped,
+    degraded endpoints demoted).
+    Returns (snapshot, index) where index is the position of the winning
+    endpoint in endpoint_urls, or (invalid snapshot, None) if every endpoint
+    failed or the optional time.monotonic() deadline passed.
+    """
+    hedge_delay = settings.get("hedge_delay_seconds", 1)
+    ordered = order_endpoints(endpoint_urls, settings)
+    pending = {}
+    errors = []
+    last_failed = None
+    next_pos = 0
+    
+    def launch_next():
+        nonlocal next_pos
+        index, url = ordered[next_pos]
+        # Single attempt per endpoint - hedging replaces inline retries
+        pending[_hedge_executor.submit(fetch_with_health, url, settings, deadline)] = index
+        next_pos += 1
+    
+    def cancel_pending():
+        # Not-yet-started losers are cancelled; requests already in
+        # flight finish within their HTTP timeout and are discarded
+        for future, index in pending.items():
+            if future.cancel():
+                get_endpoint_health(endpoint_urls[index]).release_probe()
+    
+    try:
+        launch_next()
+        while pending:
+            hedge_timeout = hedge_delay if next_pos < len(ordered) else None
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0)
+                hedge_timeout = remaining if hedge_timeout is None else min(hedge_timeout, remaining)
+            done, _ = wait(pending, timeout=hedge_timeout, return_when=FIRST_COMPLETED)
+            if not done and deadline is not None and time.monotonic() >= deadline:
+                errors.append("Cycle budget exhausted")
+                cancel_pending()
+                break
+            if not done:
+                logger.warning(f"Endpoint {ordered[next_pos - 1][0]} slower than {hedge_delay}s - hedging to endpoint {ordered[next_pos][0]}")
+                launch_next()
+                continue
+            
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    snapshot = future.result()
+                except Exception as e:
+                    errors.append(f"Endpoint {index}: unexpected error: {e}")
+                    continue
+                if snapshot and snapshot.get("valid"):
+                    cancel_pending()
+                    return snapshot, index
+                last_failed = snapshot
+                errors.extend(f"Endpoint {index}: {e}" for e in snapshot.get("errors", []))
+            
+            # A failed endpoint does not need to wait out the hedge delay
+            if next_pos < len(ordered):
+                launch_next()
+    finally:
+        # Probe slots claimed by order_endpoints but never launched
+        for index, url in ordered[next_pos:]:
+            get_endpoint_health(url).release_probe()
+    
+    snapshot = last_failed or {"valid": False, "received_timestamp": datetime.utcnow().isoformat()}
+    snapshot["valid"] = False
+    snapshot["errors"] = errors
+    logger.error(f"Hedged fetch failed on all {len(ordered)} endpoints: {errors}")
+    return snapshot, None
+
+# === Multi-Station Fetching ===
+# The MeetJeStad API accepts several station ids in one query. All
+# stations are fetched in one round trip and temperature/humidity are
+# fused with an outlier-rejecting median, so one bad station is harmless
+# (with three or more stations configured).
+
+DEFAULT_FUSION_MAX_DEVIATION = {"temperature": 3.0, "humidity": 15.0}
+
+def build_multi_station_url(settings):
+    """Build the single MeetJeStad query covering all configured stations"""
+    station_ids = settings["multi_station_ids"]
+    base_url = settings.get("multi_station_base_url", "https://meetjestad.net/data/?type=sensors&format=json")
+    # limit covers a few records per station; only the newest per id is used
+    return f"{base_url}&ids={','.join(str(i) for i in station_ids)}&limit={2 * len(station_ids)}"
+
+def fuse_median(values, max_deviation):
+    """
+    Outlier-rejecting median over [(station_id, value), ...] in priority order.
+    Values further than max_deviation from the median of all values are
+    dropped. If every value is dropped (e.g. two stations disagreeing) the
+    highest-priority station is trusted.
+    Returns (fused_value, [station ids used]).
+    """
+    if not values:
+        return None, []
+    median = statistics.median(v for _, v in values)
+    kept = [(sid, v) for sid, v in values if abs(v - median) <= max_deviation]
+    if not kept:
+        kept = values[:1]
+    return statistics.median(v for _, v in kept), [sid for sid, _ in kept]
+
+def fetch_multi_station_http(settings, deadline=None):
+    """
+    Fetch all multi_station_ids in one HTTP request and fuse them into one snapshot.
+    Single attempt - retries are scheduled by the control loop.
+    snapshot["stations"] records each station's values, age and contribution.
+    """
+    url = build_multi_station_url(settings)
+    timeout = settings.get("http_timeout_seconds", 2)
+    max_age = settings.get("max_data_age_seconds", 300)
+    max_deviation = dict(DEFAULT_FUSION_MAX_DEVIATION, **settings.get("fusion_max_deviation", {}))
+    station_ids = [int(i) for i in settings["multi_station_ids"]]
+    snapshot = new_snapshot()
+    
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            snapshot["errors"].append("Cycle budget exhausted")
+            return snapshot
+    
+    try:
+        response = get_http_session(url).get(url, timeout=timeout, headers=_conditional_headers(url))
+        response.raise_for_status()
+        
+        cached = _endpoint_cache.get(url)
+        if cached is not None and (response.status_code == 304 or response.content == cached["body"]):
+            reused, error = _reuse_cached_snapshot(cached, max_age)
+            if reused is not None:
+                return reused
+            snapshot["errors"].append(error)
+            return snapshot
+        
+        data = response.json()
+        if not isinstance(data, list):
+            snapshot["errors"].append("Empty or invalid JSON response")
+            return snapshot
+    except requests.exceptions.RequestException as e:
+        snapshot["errors"].append(f"Request error: {e}")
+        logger.warning(f"Multi-station request failed: {e}")
+        return snapshot
+    except ValueError as e:
+        snapshot["errors"].append(f"Invalid JSON: {e}")
+        return snapshot
+    
+    # One pass: newest record per station
+    newest = {}
+    for record in data:
+        try:
+            sid = int(record.get("id"))
+            measurement_dt = datetime.fromisoformat(record["timestamp"].replace('Z', '+00:00')).replace(tzinfo=None)
+        except (TypeError, ValueError, KeyError, AttributeError):
+            continue
+        if sid in station_ids and (sid not in newest or measurement_dt > newest[sid][0]):
+            newest[sid] = (measurement_dt, record)
+    
+    now = datetime.utcnow()
+    stations = {}
+    temperatures, humidities, ages = [], [], {}
+    for sid in station_ids:
+        if sid not in newest:
+            stations[str(sid)] = {"status": "missing"}
+            continue
+        measurement_dt, record = newest[sid]
+        age = (now - measurement_dt).total_seconds()
+        entry = {
+            "temperature": record.get("temperature"),
+            "humidity": record.get("humidity"),
+            "measurement_timestamp": measurement_dt.isoformat(),
+            "age_seconds": age,
+            "status": "ok"
+        }
+        stations[str(sid)] = entry
+        if age > max_age:
+            entry["status"] = "too_old"
+            continue
+        ages[sid] = (age, measurement_dt)
+        if entry["temperature"] is not None:
+            temperatures.append((sid, float(entry["temperature"])))
+        if entry["humidity"] is not None:
+            humidities.append((sid, float(entry["humidity"])))
+    
+    temp, temp_used = fuse_median(temperatures, max_deviation["temperature"])
+    humidity, humidity_used = fuse_median(humidities, max_deviation["humidity"])
+    for sid in station_ids:
+        entry = stations[str(sid)]
+        if entry["status"] == "ok":
+            entry["used_temperature"] = sid in temp_used
+            entry["used_humidity"] = sid in humidity_used
+    snapshot["stations"] = stations
+    
+    if temp is None or humidity is None:
+        snapshot["errors"].append("No fresh station with temperature and humidity")
+        return snapshot
+    
+    # Age of the fused value is the age of its oldest contributor
+    used = set(temp_used) | set(humidity_used)
+    age, measurement_dt = max(ages[sid] for sid in used)
+    snapshot["measurement_timestamp"] = measurement_dt.isoformat()
+    snapshot["age_seconds"] = age
+    snapshot["temperature"] = round(temp, 1)
+    snapshot["humidity"] = round(humidity, 1)
+    snapshot["valid"] = True
+    
+    _endpoint_cache[url] = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "body": response.content,
+        "fingerprint": None,
+        "measurement_dt": measurement_dt,
+        "snapshot": snapshot
+    }
+    return snapshot
+
+# === Outage Backfill ===
+# After a gap in measurements the missing window is requested in one bulk
+# call (limit=N instead of limit=1) on a background worker, stream-parsed,
+# and handed to a callback as (epoch, point) pairs in timestamp order.
+
+BACKFILL_RECORDS_PER_HOUR = 60  # Upper bound on station publish rate, sizes limit=N
+
+_backfill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backfill")
+_backfill_future = None
+_last_backfill_start = None
+backfill_stats = {"runs": 0, "skipped": 0, "records_inserted": 0, "last_error": None}
+
+def _with_limit(endpoint_url, limit):
+    """Return endpoint_url with its limit= query parameter replaced"""
+    parts = urlsplit(endpoint_url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != "limit"]
+    query.append(("limit", str(limit)))
+    return urlunsplit(parts._replace(query=urlencode(query, safe=",")))
+
+def iter_json_array(chunks):
+    """
+    Incrementally decode the elements of a JSON array delivered as text chunks,
+    so a bulk response is never held as one parsed list.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    for chunk in chunks:
+        buffer += chunk
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # Element continues in the next chunk
+            yield item
+        buffer = buffer[pos:]
+    raise ValueError("Truncated JSON array")
+
+def run_backfill(endpoint_url, since_epoch, until_epoch, settings, on_records):
+    """
+    Fetch the measurements strictly between since_epoch and until_epoch
+    (bounded by backfill_max_window_seconds) and pass them to on_records.
+    Returns the number of records on_records reported as inserted.
+    """
+    window = min(until_epoch - since_epoch, settings.get("backfill_max_window_seconds", 21600))
+    start_epoch = until_epoch - window
+    limit = int(window / 3600 * BACKFILL_RECORDS_PER_HOUR) + 2
+    url = _with_limit(endpoint_url, limit)
+    timeout = settings.get("backfill_timeout_seconds", 10)
+    
+    points = []
+    with get_http_session(url).get(url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        response.encoding = response.encoding or "utf-8"
+        for record in iter_json_array(response.iter_content(chunk_size=8192, decode_unicode=True)):
+            try:
+                epoch = to_epoch(record.get("timestamp"))
+                temp = record.get("temperature")
+                humidity = record.get("humidity")
+            except (AttributeError, TypeError, ValueError):
+                continue
+            if epoch is None or temp is None or humidity is None:
+                continue
+            if start_epoch <= epoch < until_epoch and epoch != since_epoch:
+                points.append((epoch, {"temperature": round(float(temp), 1), "humidity": round(float(humidity), 1)}))
+    
+    points.sort(key=lambda p: p[0])
+    inserted = on_records(points)
+    logger.warning(f"Backfill inserted {inserted} of {len(points)} records over {window:.0f}s")
+    return inserted
+
+def _run_backfill_job(endpoint_url, since_epoch, until_epoch, settings, on_records):
+    try:
+        backfill_stats["records_inserted"] += run_backfill(endpoint_url, since_epoch, until_epoch, settings, on_records)
+        backfill_stats["last_error"] = None
+    except Exception as e:
+        backfill_stats["last_error"] = str(e)
+        logger.warning(f"Backfill failed: {e}")
+
+def request_backfill(endpoint_url, since_epoch, until_epoch, settings, on_records):
+    """
+    Schedule a backfill on the background worker without blocking the caller.
+    Rate-limited to one run at a time and one start per backfill_min_interval_seconds.
+    Returns True if the backfill was scheduled.
+    """
+    global _backfill_future, _last_backfill_start
+    now = time.monotonic()
+    min_interval = settings.get("backfill_min_interval_seconds", 60)
+    if (_backfill_future is not None and not _backfill_future.done()) or \
+            (_last_backfill_start is not None and now - _last_backfill_start < min_interval):
+        backfill_stats["skipped"] += 1
+        return False
+    _last_backfill_start = now
+    backfill_stats["runs"] += 1
+    _backfill_future = _backfill_executor.submit(
+        _run_backfill_job, endpoint_url, since_epoch, until_epoch, settings, on_records)
+    return True
+
 def validate_snapshot(snapshot, settings):
     """
     Validate snapshot freshness and completeness.
@@ -142,7 +656,9 @@ def validate_snapshot(snapshot, settings):
     
     return True
 
-def get_allsky_data(file_path='/home/robert/allsky/tmp/allskydata.json'):
+ALLSKY_DATA_FILE = '/home/robert/allsky/tmp/allskydata.json'
+
+def get_allsky_data(file_path=ALLSKY_DATA_FILE):
     """
     Reads allsky camera data from JSON file.
     This is NOT serial data - it's a file read from AllSky software.
@@ -180,3 +696,120 @@ def get_allsky_data(file_path='/home/robert/allsky/tmp/allskydata.json'):
         if should_log(message):
             logger.error(message)
         return None, None, None
+
+# === Change-Driven AllSky Cache ===
+# allskydata.json is rewritten by the AllSky software every few minutes
+# while the control loop reads it every cycle. The file is only re-read
+# and re-parsed when its (mtime, size, inode) changes; other cycles cost
+# a single stat().
+
+_allsky_cache = {"key": None, "values": (None, None, None), "mtime": None}
+allsky_cache_stats = {"reads": 0, "parses": 0}
+
+def get_allsky_data_cached(file_path=ALLSKY_DATA_FILE):
+    """
+    Return ((camera_temp, star_count, day_or_night), mtime) for the AllSky file,
+    parsing it only when it changed. mtime is None if the file is missing.
+    """
+    allsky_cache_stats["reads"] += 1
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        if _allsky_cache["key"] is not None:
+            message = f"Allsky data file not found: {file_path}"
+            if should_log(message):
+                logger.error(message)
+        _allsky_cache.update(key=None, values=(None, None, None), mtime=None)
+        return _allsky_cache["values"], None
+    
+    key = (st.st_mtime_ns, st.st_size, st.st_ino)
+    if key != _allsky_cache["key"]:
+        allsky_cache_stats["parses"] += 1
+        _allsky_cache.update(key=key, values=get_allsky_data(file_path), mtime=st.st_mtime)
+    return _allsky_cache["values"], _allsky_cache["mtime"]
+
+def clear_allsky_cache():
+    _allsky_cache.update(key=None, values=(None, None, None), mtime=None)
+
+# === Local Sensor Node ===
+# The allsky-sensors ESP32 serves its latest readings on /status over the
+# LAN (firmware/allsky-sensors/src/wifi_fallback.cpp). It is polled on a
+# background worker concurrently with MeetJeStad; the control loop only
+# waits for it up to a short LAN timeout and otherwise picks the result
+# up on the next cycle.
+
+# Node JSON "sensors" key -> snapshot field
+LOCAL_NODE_FIELDS = {
+    "sky_temp_c": "sky_temperature",
+    "ambient_temp_c": "ambient_temperature",
+    "sqm_lux": "sqm_lux",
+    "sqm_ir": "sqm_ir",
+    "sqm_full": "sqm_full",
+    "rain_intensity": "rain_intensity",  # raw ADC, 0 = wet, 1023 = dry
+    "wind_speed_ms": "wind"
+}
+# Snapshot fields set from the node: the mapped readings plus raining,
+# derived from rain_intensity with raining_threshold
+LOCAL_NODE_SNAPSHOT_FIELDS = tuple(LOCAL_NODE_FIELDS.values()) + ("raining",)
+
+_local_node_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-node")
+_local_node = {"future": None, "values": None, "received": None}
+local_node_stats = {"polls": 0, "failures": 0, "last_error": None}
+
+def fetch_local_node(url, timeout, rain_threshold=100):
+    """Read the node's /status document and map it onto snapshot field names"""
+    response = get_http_session(url).get(url, timeout=timeout)
+    response.raise_for_status()
+    sensors = response.json().get("sensors") or {}
+    values = {field: sensors.get(key) for key, field in LOCAL_NODE_FIELDS.items()}
+    values["raining"] = rain_detected(values["rain_intensity"], rain_threshold)
+    return values
+
+def _collect_local_node(future):
+    _local_node["future"] = None
+    try:
+        _local_node["values"] = future.result()
+        _local_node["received"] = time.monotonic()
+        local_node_stats["last_error"] = None
+    except Exception as e:
+        local_node_stats["failures"] += 1
+        local_node_stats["last_error"] = str(e)
+        message = f"Local sensor node poll failed: {e}"
+        if should_log(message):
+            logger.warning(message)
+
+def start_local_node_poll(settings):
+    """Start a background poll of local_node_url unless one is still in flight"""
+    url = settings.get("local_node_url")
+    if not url:
+        return
+    future = _local_node["future"]
+    if future is not None:
+        if not future.done():
+            return
+        _collect_local_node(future)
+    local_node_stats["polls"] += 1
+    _local_node["future"] = _local_node_executor.submit(
+        fetch_local_node, url, settings.get("local_node_timeout_seconds", 0.5), settings.get("raining_threshold", 100))
+
+def get_local_node_data(settings, wait_until=None):
+    """
+    Return (values, age_seconds) from the latest successful poll, waiting for
+    an in-flight poll at most until wait_until (time.monotonic()).
+    values is None when nothing fresher than local_node_max_age_seconds exists.
+    """
+    future = _local_node["future"]
+    if future is not None:
+        timeout = 0 if wait_until is None else max(wait_until - time.monotonic(), 0)
+        wait([future], timeout=timeout)
+        if future.done():
+            _collect_local_node(future)
+    if _local_node["values"] is None:
+        return None, None
+    age = time.monotonic() - _local_node["received"]
+    if age > settings.get("local_node_max_age_seconds", 60):
+        return None, age
+    return _local_node["values"], age
+
+def reset_local_node():
+    _local_node.update(future=None, values=None, received=None)
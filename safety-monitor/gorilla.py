@@ -0,0 +1,374 @@
+# gorilla.py
+# Compressed in-memory measurement history (Gorilla, Pelkonen et al., VLDB 2015).
+#
+# Samples are collected uncompressed in an open head block and sealed every
+# block_size samples: timestamps (integer milliseconds) are stored as
+# delta-of-deltas with variable-length prefixes, and each field's float64
+# values as the XOR with the previous value, so regular timestamps cost one
+# bit and repeated readings one bit per sample. Each sealed block keeps a
+# per-field count/sum/min/max summary: queries whose buckets span whole
+# blocks never decode them, and the rest decode lazily (small LRU cache).
+
+import bisect
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+# Delta-of-delta buckets in milliseconds: (prefix, prefix bits, value bits)
+DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 12), (0b1110, 4, 20))
+DOD_WIDE = (0b1111, 4, 64)
+
+class BitWriter:
+    def __init__(self):
+        self.buffer = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value, bits):
+        self._acc = (self._acc << bits) | (value & ((1 << bits) - 1))
+        self._bits += bits
+        while self._bits >= 8:
+            self._bits -= 8
+            self.buffer.append((self._acc >> self._bits) & 0xFF)
+        self._acc &= (1 << self._bits) - 1
+
+    def bit_length(self):
+        return len(self.buffer) * 8 + self._bits
+
+    def getvalue(self):
+        if self._bits:
+            return bytes(self.buffer) + bytes([(self._acc << (8 - self._bits)) & 0xFF])
+        return bytes(self.buffer)
+
+class BitReader:
+    def __init__(self, data):
+        self._value = int.from_bytes(data, "big")
+        self._remaining = len(data) * 8
+
+    def read(self, bits):
+        self._remaining -= bits
+        return (self._value >> self._remaining) & ((1 << bits) - 1)
+
+    def bit(self):
+        self._remaining -= 1
+        return (self._value >> self._remaining) & 1
+
+def _signed(value, bits):
+    return value - (1 << bits) if value >= 1 << (bits - 1) else value
+
+def encode_timestamps(timestamps):
+    """Integer millisecond timestamps -> (bytes, bit length); the first is stored in full"""
+    writer = BitWriter()
+    writer.write(timestamps[0], 64)
+    previous, previous_delta = timestamps[0], 0
+    for timestamp in timestamps[1:]:
+        delta = timestamp - previous
+        dod = delta - previous_delta
+        if dod == 0:
+            writer.write(0, 1)
+        else:
+            for prefix, prefix_bits, bits in DOD_BUCKETS + (DOD_WIDE,):
+                if -(1 << (bits - 1)) <= dod < (1 << (bits - 1)):
+                    writer.write(prefix, prefix_bits)
+                    writer.write(dod, bits)
+                    break
+        previous, previous_delta = timestamp, delta
+    return writer.getvalue(), writer.bit_length()
+
+def decode_timestamps(data, count):
+    reader = BitReader(data)
+    timestamp = _signed(reader.read(64), 64)
+    result = [timestamp]
+    delta = 0
+    for _ in range(count - 1):
+        if reader.bit():
+            # Prefix 10, 110, 1110 or 1111: each further 1 selects the next wider bucket
+            bits = DOD_WIDE[2]
+            for _, _, bucket_bits in DOD_BUCKETS:
+                if not reader.bit():
+                    bits = bucket_bits
+                    break
+            delta += _signed(reader.read(bits), bits)
+        timestamp += delta
+        result.append(timestamp)
+    return result
+
+def encode_values(values):
+    """float64 values -> (bytes, bit length) using XOR with the previous value"""
+    words = np.asarray(values, dtype=np.float64).view(np.uint64).tolist()
+    writer = BitWriter()
+    writer.write(words[0], 64)
+    previous = words[0]
+    leading, trailing = 65, 0  # no previous window yet
+    for word in words[1:]:
+        xor = word ^ previous
+        previous = word
+        if xor == 0:
+            writer.write(0, 1)
+            continue
+        new_leading = min(64 - xor.bit_length(), 31)
+        new_trailing = (xor & -xor).bit_length() - 1
+        if leading <= new_leading and trailing <= new_trailing:
+            # Fits the previous meaningful-bit window
+            writer.write(0b10, 2)
+            writer.write(xor >> trailing, 64 - leading - trailing)
+        else:
+            leading, trailing = new_leading, new_trailing
+            meaningful = 64 - leading - trailing
+            writer.write(0b11, 2)
+            writer.write(leading, 5)
+            writer.write(meaningful & 63, 6)  # 64 is stored as 0
+            writer.write(xor >> trailing, meaningful)
+    return writer.getvalue(), writer.bit_length()
+
+def decode_values(data, count):
+    reader = BitReader(data)
+    word = reader.read(64)
+    words = [word]
+    leading = trailing = 0
+    for _ in range(count - 1):
+        if reader.bit():
+            if reader.bit():
+                leading = reader.read(5)
+                meaningful = reader.read(6) or 64
+                trailing = 64 - leading - meaningful
+            word ^= reader.read(64 - leading - trailing) << trailing
+        words.append(word)
+    return np.array(words, dtype=np.uint64).view(np.float64)
+
+class GorillaBlock:
+    """
+    Sealed, immutable block of samples for all fields. The timestamp and
+    value streams share one bytes object (stream i at offsets[i]:offsets[i + 1])
+    and summary holds count, sum, min and max per field (NaN when no reading),
+    so a sealed block costs a handful of Python objects whatever the field count.
+    """
+
+    __slots__ = ("start", "end", "count", "data", "offsets", "bits", "summary")
+
+    def __init__(self, epochs, columns):
+        self.start, self.end, self.count = epochs[0], epochs[-1], len(epochs)
+        streams = [encode_timestamps([round(epoch * 1000) for epoch in epochs])]
+        self.summary = np.full((len(columns), 4), np.nan)
+        for index, values in enumerate(columns.values()):
+            array = np.asarray(values, dtype=np.float64)
+            streams.append(encode_values(array))
+            valid = array[~np.isnan(array)]
+            self.summary[index, :2] = len(valid), valid.sum()
+            if len(valid):
+                self.summary[index, 2:] = valid.min(), valid.max()
+        self.data = b"".join(data for data, _ in streams)
+        self.offsets = np.cumsum([0] + [len(data) for data, _ in streams]).astype(np.uint32)
+        self.bits = np.array([bits for _, bits in streams], dtype=np.uint32)
+
+    def _stream(self, index):
+        return self.data[self.offsets[index]:self.offsets[index + 1]]
+
+    def epochs(self):
+        return np.array(decode_timestamps(self._stream(0), self.count), dtype=np.float64) / 1000
+
+    def decode(self, index):
+        """Values of the index-th field"""
+        return decode_values(self._stream(index + 1), self.count)
+
+    def aggregate(self, index):
+        """(count, sum, min, max) of the index-th field, min/max None without readings"""
+        count, total, low, high = self.summary[index].tolist()
+        return (int(count), total, None, None) if count == 0 else (int(count), total, low, high)
+
+class _Buckets:
+    """Per-bucket count/sum/min/max accumulated from summaries and decoded samples"""
+
+    def __init__(self, origin, step):
+        self.origin, self.step = origin, step
+        self.data = {}
+
+    def add(self, bucket, count, total, low, high):
+        current = self.data.get(bucket)
+        if current is None:
+            self.data[bucket] = [count, total, low, high]
+            return
+        current[0] += count
+        current[1] += total
+        if low is not None:
+            current[2] = low if current[2] is None else min(current[2], low)
+            current[3] = high if current[3] is None else max(current[3], high)
+
+    def add_samples(self, epochs, values):
+        if not len(epochs):
+            return
+        buckets = ((epochs - self.origin) // self.step).astype(np.int64)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])
+        valid = ~np.isnan(values)
+        counts = np.add.reduceat(valid.astype(np.int64), starts)
+        sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        lows = np.fmin.reduceat(values, starts)
+        highs = np.fmax.reduceat(values, starts)
+        for bucket, count, total, low, high in zip(buckets[starts].tolist(), counts.tolist(), sums.tolist(),
+                                                   lows.tolist(), highs.tolist()):
+            self.add(bucket, count, total, None if count == 0 else low, None if count == 0 else high)
+
+    def result(self):
+        result = {"t": [], "mean": [], "min": [], "max": [], "count": []}
+        for bucket in sorted(self.data):
+            count, total, low, high = self.data[bucket]
+            result["t"].append(self.origin + bucket * self.step)
+            result["count"].append(count)
+            result["mean"].append(round(total / count, 3) if count else None)
+            result["min"].append(None if low is None else round(low, 3))
+            result["max"].append(None if high is None else round(high, 3))
+        return result
+
+class CompressedHistory:
+    """
+    Long in-memory history of numeric fields in Gorilla-compressed blocks.
+    Appends go to the open head block (late points are sorted into it);
+    points older than the head block are counted and dropped. Blocks
+    entirely older than retention_seconds before the newest point expire.
+    """
+
+    def __init__(self, fields, block_size=256, retention_seconds=365 * 86400, cache_blocks=32):
+        self.fields = tuple(fields)
+        self.block_size = block_size
+        self.retention_seconds = retention_seconds
+        self.cache_blocks = cache_blocks
+        self._blocks = deque()
+        self._head_epochs = []
+        self._head_values = {field: [] for field in self.fields}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"samples": 0, "sealed_blocks": 0, "expired_blocks": 0, "late_dropped": 0,
+                      "decoded_blocks": 0, "cache_hits": 0}
+
+    def append(self, epoch, point):
+        with self._lock:
+            if self._blocks and epoch <= self._blocks[-1].end:
+                self.stats["late_dropped"] += 1
+                return False
+            index = bisect.bisect_left(self._head_epochs, epoch)
+            if index < len(self._head_epochs) and self._head_epochs[index] == epoch:
+                return False
+            self._head_epochs.insert(index, epoch)
+            for field in self.fields:
+                value = point.get(field)
+                try:
+                    value = np.nan if value is None else float(value)
+                except (TypeError, ValueError):
+                    value = np.nan
+                self._head_values[field].insert(index, value)
+            self.stats["samples"] += 1
+            if len(self._head_epochs) >= self.block_size:
+                self._seal()
+            return True
+
+    def load(self, epochs, columns):
+        """
+        Bulk append for rebuilding from disk: epochs sorted ascending, columns
+        maps field -> values of the same length (missing fields are NaN).
+        Points not newer than everything already held are skipped.
+        Returns the number of points added.
+        """
+        epochs = np.asarray(epochs, dtype=np.float64)
+        newest = self.latest_time()
+        with self._lock:
+            first = 0 if newest is None else int(np.searchsorted(epochs, newest, side="right"))
+            values = {field: np.asarray(columns[field], dtype=np.float64)[first:] if field in columns
+                      else np.full(len(epochs) - first, np.nan) for field in self.fields}
+            epochs = epochs[first:]
+            position = 0
+            while position < len(epochs):
+                take = min(self.block_size - len(self._head_epochs), len(epochs) - position)
+                self._head_epochs.extend(epochs[position:position + take].tolist())
+                for field in self.fields:
+                    self._head_values[field].extend(values[field][position:position + take].tolist())
+                position += take
+                self.stats["samples"] += take
+                if len(self._head_epochs) >= self.block_size:
+                    self._seal()
+            return len(epochs)
+
+    def _seal(self):
+        self._blocks.append(GorillaBlock(self._head_epochs, self._head_values))
+        self.stats["sealed_blocks"] += 1
+        self._head_epochs = []
+        self._head_values = {field: [] for field in self.fields}
+        newest = self._blocks[-1].end
+        while self._blocks and self._blocks[0].end < newest - self.retention_seconds:
+            expired = self._blocks.popleft()
+            self.stats["expired_blocks"] += 1
+            self.stats["samples"] -= expired.count
+            for key in [key for key in self._cache if key[0] is expired]:
+                del self._cache[key]
+
+    def oldest_time(self):
+        with self._lock:
+            if self._blocks:
+                return self._blocks[0].start
+            return self._head_epochs[0] if self._head_epochs else None
+
+    def latest_time(self):
+        with self._lock:
+            if self._head_epochs:
+                return self._head_epochs[-1]
+            return self._blocks[-1].end if self._blocks else None
+
+    def _decoded(self, block, index):
+        """(epochs, values of the index-th field) of a sealed block, through the LRU cache"""
+        key = (block, index)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return cached
+        epochs = self._cache.get((block, None))
+        if epochs is None:
+            epochs = self._cache[(block, None)] = block.epochs()
+        decoded = self._cache[key] = (epochs, block.decode(index))
+        self.stats["decoded_blocks"] += 1
+        while len(self._cache) > self.cache_blocks:
+            self._cache.popitem(last=False)
+        return decoded
+
+    def downsample(self, field, start, end, step, origin=None):
+        """Same result as MeasurementHistory.downsample, decoding only blocks that straddle buckets"""
+        origin = start if origin is None else origin
+        buckets = _Buckets(origin, step)
+        with self._lock:
+            blocks = [block for block in self._blocks if block.end >= start and block.start <= end]
+            head_epochs = np.array(self._head_epochs, dtype=np.float64)
+            head_values = np.array(self._head_values[field], dtype=np.float64)
+            index = self.fields.index(field)
+            for block in blocks:
+                first = (block.start - origin) // step
+                if block.start >= start and block.end <= end and first == (block.end - origin) // step:
+                    buckets.add(int(first), *block.aggregate(index))  # whole block in one bucket
+                    continue
+                epochs, values = self._decoded(block, index)
+                selected = (epochs >= start) & (epochs <= end)
+                buckets.add_samples(epochs[selected], values[selected])
+        selected = (head_epochs >= start) & (head_epochs <= end)
+        buckets.add_samples(head_epochs[selected], head_values[selected])
+        return buckets.result()
+
+    def compression(self):
+        """Per-stream compression ratio against 8 bytes per raw value, and total bytes"""
+        with self._lock:
+            blocks = list(self._blocks)
+        samples = sum(block.count for block in blocks)
+        if not samples:
+            return {"blocks": 0, "samples": 0, "bytes": 0, "ratio": {}}
+        bits = np.sum([block.bits for block in blocks], axis=0, dtype=np.float64)
+        ratio = {name: round(samples * 64 / stream_bits, 1)
+                 for name, stream_bits in zip(("epoch",) + self.fields, bits.tolist())}
+        compressed = sum(len(block.data) for block in blocks)
+        return {
+            "blocks": len(blocks),
+            "samples": samples,
+            "bytes": compressed,
+            "bytes_per_sample": round(compressed / samples, 2),
+            "ratio": ratio
+        }
+
+    def __len__(self):
+        return self.stats["samples"]
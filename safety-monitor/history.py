@@ -0,0 +1,203 @@
+# history.py
+# Bounded in-memory measurement history for the control service.
+# A fixed-capacity columnar ring buffer: one preallocated float64 NumPy
+# column per numeric field plus an epoch column, so memory is constant
+# however long the service runs and an in-order append allocates nothing.
+# Points are kept ordered by measurement time so that records backfilled
+# after an outage land in the right place.
+
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+def to_epoch(timestamp):
+    """Convert an ISO timestamp (naive = UTC) or datetime to epoch seconds"""
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+def _to_float(value):
+    """Field value as float, NaN for missing or non-numeric readings"""
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+class MeasurementHistory:
+    """Measurement points ordered by epoch time, oldest dropped beyond max_points"""
+
+    def __init__(self, fields=(), max_points=10000):
+        self.fields = tuple(fields)
+        self.max_points = max_points
+        self._epochs = np.zeros(max_points, dtype=np.float64)
+        self._columns = {field: np.full(max_points, np.nan) for field in self.fields}
+        self._head = 0   # physical index of the oldest point
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def _physical(self, logical):
+        return (self._head + logical) % self.max_points
+
+    def _segments(self, lo, hi):
+        """Physical slices covering logical positions lo..hi-1 in order"""
+        start, end = self._head + lo, self._head + hi
+        if end <= self.max_points:
+            return [slice(start, end)]
+        if start >= self.max_points:
+            return [slice(start - self.max_points, end - self.max_points)]
+        return [slice(start, self.max_points), slice(0, end - self.max_points)]
+
+    def _gather(self, column, lo, hi):
+        segments = self._segments(lo, hi)
+        if len(segments) == 1:
+            return column[segments[0]]
+        return np.concatenate([column[s] for s in segments])
+
+    def _search(self, epoch, side="left"):
+        """Logical insertion position of epoch (bisect over the two sorted segments)"""
+        segments = self._segments(0, self._count)
+        offset = 0
+        for segment in segments:
+            part = self._epochs[segment]
+            if len(part) and (side == "left" and epoch <= part[-1] or side == "right" and epoch < part[-1]):
+                return offset + int(np.searchsorted(part, epoch, side=side))
+            offset += len(part)
+        return offset
+
+    def insert(self, epoch, point):
+        """Insert one point; returns False for a duplicate timestamp"""
+        with self._lock:
+            if not self._count or epoch > self._epochs[self._physical(self._count - 1)]:
+                self._append(epoch, point)
+                return True
+            return self._merge([(epoch, point)]) == 1
+
+    def insert_many(self, items):
+        """Insert (epoch, point) pairs in any order; returns the number inserted"""
+        items = sorted(items, key=lambda item: item[0])
+        with self._lock:
+            if not items:
+                return 0
+            if not self._count or items[0][0] > self._epochs[self._physical(self._count - 1)]:
+                inserted, previous = 0, None
+                for epoch, point in items:
+                    if epoch != previous:
+                        self._append(epoch, point)
+                        inserted += 1
+                    previous = epoch
+                return inserted
+            return self._merge(items)
+
+    def _append(self, epoch, point):
+        """Write at the tail, overwriting the oldest point when full"""
+        if self._count < self.max_points:
+            index = self._physical(self._count)
+            self._count += 1
+        else:
+            index = self._head
+            self._head = (self._head + 1) % self.max_points
+        self._epochs[index] = epoch
+        for field, column in self._columns.items():
+            column[index] = _to_float(point.get(field))
+
+    def _merge(self, items):
+        """
+        Out-of-order (backfill) insert: merge sorted items into the points
+        from the first affected position onwards. Existing points win over
+        duplicates; when full, the oldest points are dropped.
+        """
+        points = [point for _, point in items]
+        new_epochs, first = np.unique(np.array([epoch for epoch, _ in items], dtype=np.float64), return_index=True)
+        lo = self._search(new_epochs[0])
+        old_epochs = self._gather(self._epochs, lo, self._count)
+        fresh = ~np.isin(new_epochs, old_epochs)
+        if not fresh.any():
+            return 0
+        new_epochs, first = new_epochs[fresh], first[fresh]
+
+        merged_epochs = np.concatenate([old_epochs, new_epochs])
+        merged_columns = {
+            field: np.concatenate([self._gather(column, lo, self._count),
+                                   np.array([_to_float(points[i].get(field)) for i in first])])
+            for field, column in self._columns.items()
+        }
+        order = np.argsort(merged_epochs, kind="stable")
+        is_new = order >= len(old_epochs)
+        overflow = lo + len(order) - self.max_points
+        if overflow > 0:
+            # Drop the oldest: first points before lo, then the start of the merged run
+            from_head = min(overflow, lo)
+            self._head = self._physical(from_head)
+            lo -= from_head
+            order, is_new = order[overflow - from_head:], is_new[overflow - from_head:]
+
+        target = self._physical(lo + np.arange(len(order)))
+        self._epochs[target] = merged_epochs[order]
+        for field, column in self._columns.items():
+            column[target] = merged_columns[field][order]
+        self._count = lo + len(order)
+        return int(is_new.sum())
+
+    def oldest_time(self):
+        with self._lock:
+            return float(self._epochs[self._head]) if self._count else None
+
+    def latest_time(self):
+        with self._lock:
+            return float(self._epochs[self._physical(self._count - 1)]) if self._count else None
+
+    def range(self, start=None, end=None):
+        """Return [(epoch, point), ...] with start <= epoch <= end"""
+        with self._lock:
+            lo = 0 if start is None else self._search(start, "left")
+            hi = self._count if end is None else self._search(end, "right")
+            if hi <= lo:
+                return []
+            epochs = self._gather(self._epochs, lo, hi).tolist()
+            columns = {field: self._gather(column, lo, hi).tolist() for field, column in self._columns.items()}
+        return [(epoch, {field: None if values[i] != values[i] else values[i] for field, values in columns.items()})
+                for i, epoch in enumerate(epochs)]
+
+    def downsample(self, field, start, end, step, origin=None):
+        """
+        Aggregate one field over start <= epoch <= end into step-second
+        buckets aligned to origin (default start). Returns columns t (bucket
+        start), mean, min, max and count; missing readings are skipped and
+        buckets without points are left out.
+        """
+        origin = start if origin is None else origin
+        with self._lock:
+            lo = self._search(start, "left")
+            hi = self._search(end, "right")
+            epochs = self._gather(self._epochs, lo, hi).copy()
+            values = self._gather(self._columns[field], lo, hi).copy()
+        result = {"t": [], "mean": [], "min": [], "max": [], "count": []}
+        if not len(epochs):
+            return result
+
+        buckets = ((epochs - origin) // step).astype(np.int64)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])  # epochs are sorted
+        valid = ~np.isnan(values)
+        counts = np.add.reduceat(valid.astype(np.int64), starts)
+        sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        lows = np.fmin.reduceat(values, starts)
+        highs = np.fmax.reduceat(values, starts)
+
+        empty = counts == 0
+        result["t"] = (origin + buckets[starts] * step).tolist()
+        result["count"] = counts.tolist()
+        for key, column in (("mean", means), ("min", lows), ("max", highs)):
+            result[key] = [None if missing else round(value, 3) for value, missing in zip(column.tolist(), empty)]
+        return result
+
+    def __len__(self):
+        return self._count
@@ -0,0 +1,84 @@
+# http_server.py
+# WSGI serving for control.py and app.py on waitress in place of app.run().
+# Waitress parses requests, handles keep-alive, chunked bodies and output
+# buffering on its I/O loop and runs the application on a fixed pool of
+# http_workers threads, so idle keep-alive connections hold no worker.
+# The socket is bound synchronously: a busy port raises at startup and
+# readiness is known without sleeping and probing.
+#
+# A streaming response (the /events SSE stream) occupies a worker for as
+# long as the client stays connected, so stream clients are capped below
+# the pool size (stream_client_limit) to keep workers free for the API.
+
+import os
+import socket
+import threading
+import waitress
+from waitress import wasyncore
+
+def server_options(settings):
+    """Worker threads, connection limit and idle timeout from settings"""
+    return {
+        "threads": settings.get("http_workers", 16),
+        "connection_limit": settings.get("http_connection_limit", 100),
+        "channel_timeout": settings.get("http_request_timeout_seconds", 10)
+    }
+
+def stream_client_limit(settings):
+    """Streaming clients allowed at once; always leaves half the workers for other requests"""
+    return max(min(settings.get("sse_max_clients", 8), settings.get("http_workers", 16) // 2), 1)
+
+class WSGIServer:
+    """Waitress server for one app, run on a background thread or in the foreground"""
+
+    def __init__(self, host, port, app, threads=16, connection_limit=100, channel_timeout=10):
+        self.threads = threads
+        self.ready = threading.Event()
+        self._map = {}  # the server's own socket map, so shutdown can close its connections
+        # Binds now; raises OSError if the port is taken
+        self._server = waitress.create_server(app, self._map, host=host, port=port, threads=threads,
+                                              connection_limit=connection_limit,
+                                              channel_timeout=channel_timeout,
+                                              clear_untrusted_proxy_headers=True)
+        self.port = self._server.effective_port
+
+    @property
+    def stats(self):
+        dispatcher = self._server.task_dispatcher
+        return {
+            "threads": self.threads,
+            "connections": len(self._server.active_channels),
+            "active": dispatcher.active_count,
+            "queued": len(dispatcher.queue)
+        }
+
+    def serve_forever(self):
+        self.ready.set()
+        self._server.run()
+
+    def shutdown(self):
+        """Stop accepting, close open connections and stop the worker threads"""
+        self._server.close()
+        wasyncore.close_all(self._map)
+        self._server.task_dispatcher.shutdown(timeout=1)
+
+def serve_in_background(server, name):
+    """Run server on a daemon thread and return once its loop is running"""
+    thread = threading.Thread(target=server.serve_forever, name=name, daemon=True)
+    thread.start()
+    server.ready.wait()
+    return thread
+
+def notify_systemd(message="READY=1"):
+    """sd_notify for Type=notify units; a no-op outside systemd"""
+    address = os.environ.get("NOTIFY_SOCKET")
+    if not address:
+        return False
+    if address.startswith("@"):
+        address = "\0" + address[1:]  # abstract namespace
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(message.encode(), address)
+        return True
+    except OSError:
+        return False
@@ -0,0 +1,158 @@
+# lora_payload.py
+# Decoder for the 30-byte allsky-sensors LoRaWAN uplink
+# (encodePayload in firmware/allsky-sensors/src/lora.cpp).
+#
+# The layout maps onto a big-endian NumPy structured dtype, so one uplink
+# or an archive of thousands concatenated uplinks is decoded with a single
+# zero-copy np.frombuffer view over the bytes.
+
+import base64
+import binascii
+import numpy as np
+
+PAYLOAD_SIZE = 30
+
+PAYLOAD_DTYPE = np.dtype([
+    ("rain_intensity", ">u2"),      # 0-1023, 0 = wet, 1023 = dry
+    ("wind_x100", ">i2"),           # m/s * 100
+    ("sky_temp_x100", ">i2"),       # °C * 100
+    ("ambient_temp_x100", ">i2"),   # °C * 100
+    ("sqm_ir", ">u2"),
+    ("sqm_full", ">u2"),
+    ("sqm_visible", ">u2"),
+    ("sqm_lux", ">f4"),
+    ("uptime_seconds", ">u4"),
+    ("battery_mv", ">u2"),
+    ("flags", "u1"),
+    ("rssi", ">i2"),
+    ("snr", "i1"),
+    ("reserved", ">u2"),
+])
+assert PAYLOAD_DTYPE.itemsize == PAYLOAD_SIZE
+
+# Data validity flag bits (byte 24)
+FLAG_MLX_VALID = 1 << 0   # sky/ambient temperature
+FLAG_TSL_VALID = 1 << 1   # SQM fields
+FLAG_RAIN_VALID = 1 << 2
+FLAG_WIND_VALID = 1 << 3
+
+# Snapshot field -> (validity flag, source column, scale divisor); raining
+# is derived from rain_intensity by to_columns
+SNAPSHOT_COLUMNS = {
+    "sky_temperature": (FLAG_MLX_VALID, "sky_temp_x100", 100.0),
+    "ambient_temperature": (FLAG_MLX_VALID, "ambient_temp_x100", 100.0),
+    "sqm_ir": (FLAG_TSL_VALID, "sqm_ir", 1.0),
+    "sqm_full": (FLAG_TSL_VALID, "sqm_full", 1.0),
+    "sqm_visible": (FLAG_TSL_VALID, "sqm_visible", 1.0),
+    "sqm_lux": (FLAG_TSL_VALID, "sqm_lux", 1.0),
+    "rain_intensity": (FLAG_RAIN_VALID, "rain_intensity", 1.0),
+    "wind": (FLAG_WIND_VALID, "wind_x100", 100.0),
+}
+
+# Node housekeeping fields, always present
+NODE_COLUMNS = ("uptime_seconds", "battery_mv", "rssi", "snr")
+
+def decode_uplinks(buffer):
+    """
+    Zero-copy view of one or more concatenated 30-byte uplinks as a
+    structured array. buffer may be bytes, bytearray, memoryview or mmap.
+    """
+    if len(buffer) % PAYLOAD_SIZE:
+        raise ValueError(f"Buffer length {len(buffer)} is not a multiple of {PAYLOAD_SIZE} bytes")
+    return np.frombuffer(buffer, dtype=PAYLOAD_DTYPE)
+
+def to_columns(records, rain_threshold=100):
+    """
+    Vectorized conversion of decoded uplinks to scaled float64 columns keyed
+    by snapshot field name. Readings whose validity flag is clear are NaN.
+    raining is 1.0 where rain_intensity is below rain_threshold, else 0.0.
+    """
+    flags = records["flags"]
+    columns = {}
+    for field, (flag, source, scale) in SNAPSHOT_COLUMNS.items():
+        values = records[source].astype(np.float64)
+        if scale != 1.0:
+            values /= scale
+        values[(flags & flag) == 0] = np.nan
+        columns[field] = values
+    rain = columns["rain_intensity"]
+    columns["raining"] = np.where(np.isnan(rain), np.nan, (rain < rain_threshold).astype(np.float64))
+    for field in NODE_COLUMNS:
+        columns[field] = records[field].astype(np.int64)
+    return columns
+
+def to_snapshots(records, rain_threshold=100):
+    """
+    Convert decoded uplinks to a list of snapshot field dicts (one per
+    uplink), with None for readings flagged invalid.
+    """
+    columns = to_columns(records, rain_threshold)
+    names = list(columns)
+    rows = zip(*(columns[name].tolist() for name in names))
+    return [{name: (None if value != value else value) for name, value in zip(names, row)} for row in rows]
+
+def decode_uplink(payload, rain_threshold=100):
+    """Decode a single uplink into a snapshot field dict"""
+    if len(payload) != PAYLOAD_SIZE:
+        raise ValueError(f"Expected {PAYLOAD_SIZE} bytes, got {len(payload)}")
+    return to_snapshots(decode_uplinks(payload), rain_threshold)[0]
+
+def _json_object(value, name):
+    """value as a dict (None -> {}); ValueError for any other JSON type"""
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise ValueError(f"{name} is not a JSON object")
+    return value
+
+def _gateways(value, name):
+    """Gateway metadata list (None -> []); ValueError unless a list of objects"""
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(rx, dict) for rx in value):
+        raise ValueError(f"{name} is not a list of JSON objects")
+    return value
+
+def _rssi(rx):
+    rssi = rx.get("rssi")
+    return rssi if isinstance(rssi, (int, float)) and not isinstance(rssi, bool) else -999
+
+def parse_network_uplink(message):
+    """
+    Extract the raw payload and radio metadata from a network-server uplink
+    webhook body. Accepts TTN v3 (uplink_message.frm_payload) and
+    Chirpstack v4 (data) JSON; raises ValueError when there is no payload
+    or the message does not have the expected shape.
+    """
+    message = _json_object(message, "Uplink message")
+    if "uplink_message" in message:
+        uplink = _json_object(message["uplink_message"], "uplink_message")
+        encoded = uplink.get("frm_payload")
+        rx_metadata = _gateways(uplink.get("rx_metadata"), "rx_metadata")
+        device_id = _json_object(message.get("end_device_ids"), "end_device_ids").get("device_id")
+        received_at = message.get("received_at") or uplink.get("received_at")
+        f_cnt = uplink.get("f_cnt")
+    else:
+        encoded = message.get("data")
+        rx_metadata = _gateways(message.get("rxInfo"), "rxInfo")
+        device_id = _json_object(message.get("deviceInfo"), "deviceInfo").get("deviceName")
+        received_at = message.get("time")
+        f_cnt = message.get("fCnt")
+    if not encoded:
+        raise ValueError("Uplink message has no payload")
+    if not isinstance(encoded, str):
+        raise ValueError("Uplink payload is not a base64 string")
+    try:
+        payload = base64.b64decode(encoded, validate=True)
+    except binascii.Error as e:
+        raise ValueError(f"Invalid base64 payload: {e}")
+
+    # Best gateway by RSSI
+    gateway = max(rx_metadata, key=_rssi, default={})
+    return payload, {
+        "device_id": device_id,
+        "received_at": received_at,
+        "f_cnt": f_cnt,
+        "gateway_rssi": gateway.get("rssi"),
+        "gateway_snr": gateway.get("snr", gateway.get("loRaSNR"))
+    }
@@ -0,0 +1,135 @@
+# rollup.py
+# Incremental 1 min / 15 min / 1 h rollups of the numeric sky_data fields,
+# stored beside the raw rows in sky_data.db.
+#
+# Each sample updates one partial aggregate (min, max, sum, count, last) per
+# tier and field in memory - O(1), whatever the sample's age. The partials
+# are written with the store's batch commits and merged into the stored
+# buckets with an upsert, so late (backfilled) samples fold into buckets
+# that were already written. Retention is per tier; expired raw rows and
+# buckets are deleted a bounded number at a time after each batch.
+
+import threading
+
+# Tier name -> bucket size in seconds, finest first
+ROLLUP_TIERS = (("1m", 60), ("15m", 900), ("1h", 3600))
+
+CREATE_ROLLUP_TABLE_SQL = """CREATE TABLE IF NOT EXISTS sky_data_rollup (
+    tier TEXT NOT NULL, field TEXT NOT NULL, epoch REAL NOT NULL,
+    min REAL, max REAL, sum REAL, count INTEGER, last REAL, last_epoch REAL,
+    PRIMARY KEY (tier, field, epoch)) WITHOUT ROWID"""
+
+UPSERT_ROLLUP_SQL = """INSERT INTO sky_data_rollup (tier, field, epoch, min, max, sum, count, last, last_epoch)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (tier, field, epoch) DO UPDATE SET
+        min = MIN(min, excluded.min), max = MAX(max, excluded.max),
+        sum = sum + excluded.sum, count = count + excluded.count,
+        last = CASE WHEN excluded.last_epoch >= last_epoch THEN excluded.last ELSE last END,
+        last_epoch = MAX(last_epoch, excluded.last_epoch)"""
+
+def setup_rollups(conn):
+    conn.execute(CREATE_ROLLUP_TABLE_SQL)
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value == value
+
+class RollupEngine:
+    """Partial aggregates per (tier, field, bucket) waiting for the next batch commit"""
+
+    def __init__(self, fields, tiers=ROLLUP_TIERS):
+        self.fields = tuple(fields)
+        self.tiers = tuple(tiers)
+        self._partials = {}
+        self._lock = threading.Lock()
+
+    def add(self, epoch, values):
+        """Fold one sample into the partial aggregate of each tier"""
+        with self._lock:
+            for field in self.fields:
+                value = values.get(field)
+                if not _is_number(value):
+                    continue
+                for tier, seconds in self.tiers:
+                    self._fold((tier, field, epoch - epoch % seconds), value, value, value, 1, value, epoch)
+
+    def _fold(self, key, low, high, total, count, last, last_epoch):
+        agg = self._partials.get(key)
+        if agg is None:
+            self._partials[key] = [low, high, total, count, last, last_epoch]
+            return
+        if low < agg[0]:
+            agg[0] = low
+        if high > agg[1]:
+            agg[1] = high
+        agg[2] += total
+        agg[3] += count
+        if last_epoch >= agg[5]:
+            agg[4], agg[5] = last, last_epoch
+
+    def drain(self):
+        """Take the pending partials as UPSERT_ROLLUP_SQL parameter tuples"""
+        with self._lock:
+            partials, self._partials = self._partials, {}
+        return [key + tuple(agg) for key, agg in partials.items()]
+
+def write_rollups(conn, params):
+    conn.executemany(UPSERT_ROLLUP_SQL, params)
+
+def prune_expired(conn, retention, now, limit, raw_floor=None):
+    """
+    Delete at most limit expired rows per table and tier. retention maps
+    "raw" and tier names to seconds (0 or missing = keep). Raw rows at or
+    after raw_floor (e.g. not yet archived) are kept. Returns the number
+    of rows deleted.
+    """
+    deleted = 0
+    raw = retention.get("raw")
+    if raw:
+        cutoff = now - raw if raw_floor is None else min(now - raw, raw_floor)
+        deleted += conn.execute(
+            "DELETE FROM sky_data WHERE id IN (SELECT id FROM sky_data WHERE epoch < ? ORDER BY epoch LIMIT ?)",
+            (cutoff, limit)).rowcount
+    for tier, _ in ROLLUP_TIERS:
+        seconds = retention.get(tier)
+        if seconds:
+            deleted += conn.execute(
+                "DELETE FROM sky_data_rollup WHERE (tier, field, epoch) IN "
+                "(SELECT tier, field, epoch FROM sky_data_rollup WHERE tier = ? AND epoch < ? LIMIT ?)",
+                (tier, now - seconds, limit)).rowcount
+    return deleted
+
+def pick_tier(step):
+    """Coarsest tier whose buckets are no larger than step seconds; None = raw rows"""
+    chosen = None
+    for tier, seconds in ROLLUP_TIERS:
+        if seconds <= step:
+            chosen = tier
+    return chosen
+
+def query_history(conn, field, start, end, step, numeric_fields):
+    """
+    One field over start <= epoch <= end in step-second buckets aligned to
+    start, read from the coarsest adequate tier. Same columns as
+    MeasurementHistory.downsample plus the tier used.
+    """
+    if field not in numeric_fields:
+        raise ValueError(f"Unknown field: {field}")
+    tier = pick_tier(step)
+    if tier is None:
+        sql = (f"SELECT CAST((epoch - ?) / ? AS INTEGER) AS bucket, AVG({field}), MIN({field}), MAX({field}), "
+               f"COUNT({field}) FROM sky_data WHERE epoch BETWEEN ? AND ? GROUP BY bucket ORDER BY bucket")
+        params = (start, step, start, end)
+    else:
+        sql = ("SELECT CAST((epoch - ?) / ? AS INTEGER) AS bucket, SUM(sum) / SUM(count), MIN(min), MAX(max), "
+               "SUM(count) FROM sky_data_rollup WHERE tier = ? AND field = ? AND epoch BETWEEN ? AND ? "
+               "GROUP BY bucket ORDER BY bucket")
+        params = (start, step, tier, field, start, end)
+
+    result = {"tier": tier or "raw", "t": [], "mean": [], "min": [], "max": [], "count": []}
+    for bucket, mean, low, high, count in conn.execute(sql, params):
+        result["t"].append(start + bucket * step)
+        result["mean"].append(None if mean is None else round(mean, 3))
+        result["min"].append(low)
+        result["max"].append(high)
+        result["count"].append(count)
+    return result
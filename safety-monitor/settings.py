@@ -1,6 +1,9 @@
 import os
+import copy
 import json
 import logging
+import threading
+from types import MappingProxyType
 from app_logging import setup_logger
 
 logger = setup_logger(
@@ -9,25 +12,80 @@ logger = setup_logger(
     level=logging.INFO
 )
 
-def load_settings():
-    default_settings = {
-        "raining_threshold": 100,
-        "ambient_temp_threshold": 20,
-        "dewpoint_threshold": 2,
-        "cpu_temp_threshold": 65,
-        "memory_usage_threshold": 65,
-        "sleep_time": 10,
-        "control_port": 5001,
-        "primary_endpoint": "https://meetjestad.net/data/?type=sensors&ids=580&format=json&limit=1",
-        "fallback_endpoint": "https://meetjestad.net/data/?type=sensors&ids=580&format=json&limit=1",
-        "primary_failure_threshold": 3,
-        "max_data_age_seconds": 300,
-        "http_timeout_seconds": 2,
-        "retry_backoff_seconds": 2,
-        "fallback_retry_interval_seconds": 300,
-        "heater_min_off_time_seconds": 600
-    }
+DEFAULT_SETTINGS = {
+    "raining_threshold": 100,
+    "ambient_temp_threshold": 20,
+    "dewpoint_threshold": 2,
+    "cpu_temp_threshold": 65,
+    "memory_usage_threshold": 65,
+    "sleep_time": 10,
+    "local_sensor_interval_seconds": 1,
+    "fetch_interval_seconds": 60,
+    "persist_interval_seconds": 300,
+    "restore_max_age_seconds": 300,
+    "command_poll_interval_seconds": 1,
+    "command_timeout_seconds": 5,
+    "sse_heartbeat_seconds": 15,
+    "sse_max_clients": 8,
+    "control_port": 5001,
+    "http_workers": 16,
+    "http_connection_limit": 100,
+    "http_request_timeout_seconds": 10,
+    "primary_endpoint": "https://meetjestad.net/data/?type=sensors&ids=580&format=json&limit=1",
+    "fallback_endpoint": "https://meetjestad.net/data/?type=sensors&ids=580&format=json&limit=1",
+    "endpoints": [
+        "https://meetjestad.net/data/?type=sensors&ids=580&format=json&limit=1"
+    ],
+    "hedged_fetch": True,
+    "hedge_delay_seconds": 1,
+    "multi_station_mode": False,
+    "multi_station_ids": [580],
+    "fusion_max_deviation": {"temperature": 3.0, "humidity": 15.0},
+    "primary_failure_threshold": 3,
+    "max_data_age_seconds": 300,
+    "http_timeout_seconds": 2,
+    "retry_backoff_seconds": 2,
+    "retry_backoff_max_seconds": 60,
+    "cycle_budget_seconds": 8,
+    "backfill_enabled": True,
+    "backfill_gap_seconds": 900,
+    "backfill_max_window_seconds": 21600,
+    "backfill_min_interval_seconds": 60,
+    "backfill_timeout_seconds": 10,
+    "history_capacity": 60480,
+    "history_max_buckets": 1000,
+    "compressed_history_days": 365,
+    "compressed_block_size": 256,
+    "store_enabled": True,
+    "database_file": "sky_data.db",
+    "store_batch_size": 60,
+    "store_flush_interval_seconds": 600,
+    "store_max_buffered_rows": 10000,
+    "retention_raw_days": 7,
+    "retention_1m_days": 30,
+    "retention_15m_days": 365,
+    "retention_1h_days": 0,
+    "prune_batch_rows": 5000,
+    "archive_enabled": True,
+    "archive_dir": "archive",
+    "archive_interval_seconds": 3600,
+    "fallback_retry_interval_seconds": 300,
+    "breaker_cooldown_seconds": 30,
+    "slow_endpoint_latency_seconds": 1.0,
+    "endpoint_error_rate_threshold": 0.5,
+    "ewma_alpha": 0.2,
+    "heater_min_off_time_seconds": 600,
+    "allsky_data_file": "/home/robert/allsky/tmp/allskydata.json",
+    "allsky_max_age_seconds": 600,
+    "local_node_url": "",
+    "local_node_timeout_seconds": 0.5,
+    "local_node_max_age_seconds": 60,
+    "uplink_webhook_token": "",
+    "uplink_max_age_seconds": 180
+}
 
+def load_settings():
+    """Read settings.json as a plain, editable dict (defaults if missing or malformed)"""
     settings_path = 'settings.json'
     if os.path.exists(settings_path):
         try:
@@ -35,7 +93,152 @@ def load_settings():
                 return json.load(file)
         except json.JSONDecodeError as e:
             logger.warning(f"Error decoding JSON from settings file: {e}. Using default settings.")
-            return default_settings
+            return copy.deepcopy(DEFAULT_SETTINGS)
     else:
         logger.info("Settings file not found. Using default settings.")
-        return default_settings
\ No newline at end of file
+        return copy.deepcopy(DEFAULT_SETTINGS)
+
+def get_endpoint_list(settings):
+    """
+    Ordered sensor endpoints, highest priority first.
+    Falls back to primary/fallback_endpoint for settings files without "endpoints".
+    """
+    endpoints = settings.get("endpoints") or [settings.get("primary_endpoint"), settings.get("fallback_endpoint")]
+    return list(dict.fromkeys(e for e in endpoints if e))
+
+# === Settings service ===
+# Parses settings.json once into a validated, read-only mapping and only
+# re-reads it when the file's mtime/size changes. A file that fails to
+# parse or validate is logged and the last good settings stay in effect.
+
+class SettingsError(ValueError):
+    """settings.json content failed validation"""
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+# Scheduler cadences; a zero interval would make a stage spin (and divide by zero)
+INTERVAL_SETTINGS = (
+    "sleep_time",
+    "local_sensor_interval_seconds",
+    "fetch_interval_seconds",
+    "persist_interval_seconds",
+    "command_poll_interval_seconds",
+    "archive_interval_seconds",
+)
+
+def validate_settings(raw):
+    """
+    Merge raw settings over DEFAULT_SETTINGS and check each known key against
+    the type of its default. Returns a read-only mapping or raises SettingsError.
+    """
+    if not isinstance(raw, dict):
+        raise SettingsError("settings must be a JSON object")
+    merged = copy.deepcopy(DEFAULT_SETTINGS)
+    errors = []
+    for key, value in raw.items():
+        default = DEFAULT_SETTINGS.get(key)
+        if default is None:
+            merged[key] = value  # unknown keys pass through
+        elif isinstance(default, bool):
+            if not isinstance(value, bool):
+                errors.append(f"{key}: expected true/false, got {value!r}")
+        elif isinstance(default, (int, float)):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                errors.append(f"{key}: expected a number, got {value!r}")
+            elif value < 0:
+                errors.append(f"{key}: must not be negative")
+        elif not isinstance(value, type(default)):
+            errors.append(f"{key}: expected {type(default).__name__}, got {type(value).__name__}")
+        merged[key] = value
+
+    if not errors:
+        for key in INTERVAL_SETTINGS:
+            if merged[key] <= 0:
+                errors.append(f"{key}: must be positive")
+        if merged["http_workers"] < 1:
+            errors.append("http_workers: must be at least 1")
+        if merged["history_max_buckets"] < 1:
+            errors.append("history_max_buckets: must be at least 1")
+        if not 1 <= merged["control_port"] <= 65535:
+            errors.append(f"control_port: {merged['control_port']} out of range")
+        if not all(isinstance(e, str) and e for e in merged["endpoints"]):
+            errors.append("endpoints: must be a list of URLs")
+    if errors:
+        raise SettingsError("; ".join(errors))
+    return _freeze(merged)
+
+class SettingsService:
+    """Cached settings with reload on file change and change notification"""
+
+    def __init__(self, path='settings.json'):
+        self.path = path
+        self._settings = _freeze(copy.deepcopy(DEFAULT_SETTINGS))
+        self._signature = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self.stats = {"reloads": 0, "rejected": 0, "last_error": None}
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def get(self):
+        """Return the current settings, reloading first if the file changed"""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return self._settings
+        with self._lock:
+            if signature == self._signature:
+                return self._settings
+            self._signature = signature
+            old = self._settings
+            new = self._load(signature)
+            if new is None:
+                return self._settings
+            self._settings = new
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(new, old)
+            except Exception as e:
+                logger.error(f"Settings subscriber failed: {e}")
+        return new
+
+    def _load(self, signature):
+        if signature is None:
+            if self.stats["reloads"]:
+                logger.warning(f"{self.path} disappeared - keeping last good settings")
+                return None
+            logger.info("Settings file not found. Using default settings.")
+            return self._settings
+        try:
+            with open(self.path, 'r') as file:
+                settings = validate_settings(json.load(file))
+        except (OSError, ValueError) as e:
+            # json.JSONDecodeError and SettingsError are both ValueErrors
+            self.stats["rejected"] += 1
+            self.stats["last_error"] = str(e)
+            logger.warning(f"Invalid settings file {self.path}: {e}. Keeping last good settings.")
+            return None
+        self.stats["reloads"] += 1
+        self.stats["last_error"] = None
+        return settings
+
+    def subscribe(self, callback):
+        """Call callback(new_settings, old_settings) after each successful reload"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+settings_service = SettingsService()
+
+def get_settings():
+    """Current validated, read-only settings (cheap: stat() unless the file changed)"""
+    return settings_service.get()
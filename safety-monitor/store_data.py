@@ -1,34 +1,229 @@
 # store_data.py
-# === DEPRECATED ===
-# This module is deprecated as of the HTTP-only refactor.
-# Historical data storage has been removed to reduce disk I/O.
-# Only the last known good snapshot is retained in state.json.
+# SQLite time-series store for measurement history (sky_data table).
 #
-# This file is kept for backward compatibility only.
-# All functions are now stubs that do nothing.
-# ===================
+# The database runs in WAL mode with synchronous=NORMAL. Snapshots are
+# buffered in memory and written by a background thread in one
+# transaction per batch, so the SD card sees a few large writes per hour
+# instead of one fsync per measurement. Rows are inserted with a single
+# parameterized statement (prepared once and reused by sqlite3's statement
+# cache) and indexed by measurement epoch. Rows that were actually inserted
+# are folded into the rollups (rollup.py) in the same transaction, so
+# duplicates and dropped rows are never counted; expired rows are pruned
+# after each batch.
 
+import logging
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from collections import deque
 from app_logging import setup_logger
-import warnings
+from history import to_epoch
+from rollup import RollupEngine, setup_rollups, write_rollups, prune_expired
 
-warnings.warn("store_data.py is deprecated and will be removed in a future release", DeprecationWarning, stacklevel=2)
-
-logger = setup_logger('store_data', 'store_data.log')
+logger = setup_logger('store_data', 'store_data.log', level=logging.WARNING)
 
 DATABASE_NAME = "sky_data.db"
 
-def setup_database(conn=None):
-    """DEPRECATED: No-op stub - database storage removed"""
-    logger.warning("setup_database() called but is deprecated - no action taken")
-    pass
+# Stored snapshot fields, in column order
+SKY_DATA_COLUMNS = (
+    "temperature", "humidity", "dew_point", "heat_index", "fan_status", "heater_status",
+    "cpu_temperature", "raining", "light", "wind", "sky_temperature", "ambient_temperature",
+    "sqm_ir", "sqm_full", "sqm_visible", "sqm_lux", "cloud_coverage", "cloud_coverage_indicator",
+    "brightness", "bortle", "camera_temp", "star_count", "day_or_night", "mode"
+)
+TEXT_COLUMNS = ("fan_status", "heater_status", "day_or_night", "mode")
+NUMERIC_COLUMNS = tuple(column for column in SKY_DATA_COLUMNS if column not in TEXT_COLUMNS)
+
+CREATE_TABLE_SQL = "CREATE TABLE IF NOT EXISTS sky_data (id INTEGER PRIMARY KEY, epoch REAL NOT NULL, timestamp TEXT, " + \
+    ", ".join(f"{column} {'TEXT' if column in TEXT_COLUMNS else 'REAL'}" for column in SKY_DATA_COLUMNS) + ")"
+CREATE_INDEX_SQL = "CREATE UNIQUE INDEX IF NOT EXISTS idx_sky_data_epoch ON sky_data (epoch)"
+# Duplicate measurement times (e.g. backfilled records) are ignored
+INSERT_SQL = f"INSERT OR IGNORE INTO sky_data (epoch, timestamp, {', '.join(SKY_DATA_COLUMNS)}) " \
+             f"VALUES ({', '.join('?' * (len(SKY_DATA_COLUMNS) + 2))})"
+
+def setup_database(conn=None, path=DATABASE_NAME):
+    """Open (or use) a connection, enable WAL and create the sky_data and rollup tables"""
+    if conn is None:
+        conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent; only the last batch is at risk on power loss
+    conn.execute(CREATE_TABLE_SQL)
+    conn.execute(CREATE_INDEX_SQL)
+    setup_rollups(conn)
+    conn.commit()
+    return conn
+
+def to_row(data, epoch=None):
+    """Parameter tuple for INSERT_SQL from a snapshot dict"""
+    timestamp = data.get("measurement_timestamp") or data.get("timestamp")
+    if epoch is None:
+        try:
+            epoch = to_epoch(timestamp)
+        except ValueError:
+            epoch = None
+        if epoch is None:
+            epoch = time.time()
+    return (epoch, timestamp) + tuple(data.get(column) for column in SKY_DATA_COLUMNS)
 
 def store_sky_data(data, conn=None):
-    """DEPRECATED: No-op stub - database storage removed"""
-    # Silently ignore - this may be called by legacy code
-    pass
+    """Store one snapshot immediately (one commit). Batched writes go through SkyDataStore."""
+    if conn is None:
+        conn = setup_database()
+    with conn:
+        conn.execute(INSERT_SQL, to_row(data))
+
+def query_sky_data(conn, start_epoch, end_epoch, columns=("temperature", "humidity")):
+    """Rows of (epoch, *columns) with start_epoch <= epoch <= end_epoch, using the time index"""
+    unknown = set(columns) - set(SKY_DATA_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+    sql = f"SELECT epoch, {', '.join(columns)} FROM sky_data WHERE epoch BETWEEN ? AND ? ORDER BY epoch"
+    return conn.execute(sql, (start_epoch, end_epoch)).fetchall()
+
+class SkyDataStore:
+    """
+    Buffered writer: add() only appends to memory; a background thread
+    commits the buffer when batch_size rows are waiting or flush_interval
+    seconds have passed. At most max_buffered rows are held (oldest dropped)
+    if the database is unavailable. retention maps "raw" and rollup tier
+    names to seconds; up to prune_limit expired rows per table are deleted
+    after each batch. Raw rows at or after raw_prune_floor are kept (set by
+    the archive compactor to the end of the archived months); rows below it
+    (a late backfill into an archived month) are refused, since the month
+    file would never contain them.
+    """
+
+    def __init__(self, path=DATABASE_NAME, batch_size=60, flush_interval=600, max_buffered=10000,
+                 retention=None, prune_limit=5000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention = retention or {}
+        self.prune_limit = prune_limit
+        self.raw_prune_floor = None
+        self.stats = {"buffered": 0, "written": 0, "duplicates": 0, "below_archive": 0, "commits": 0, "dropped": 0, "rollup_buckets": 0,
+                      "pruned": 0, "last_epoch": None, "last_commit_ms": None, "last_error": None}
+        self._buffer = deque(maxlen=max_buffered)
+        self._wakeup = threading.Condition()
+        self._flush_requested = False
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sky-data-store", daemon=True)
+        self._thread.start()
+        return self
+
+    def add(self, data, epoch=None):
+        """Queue one snapshot for the next batch"""
+        row = to_row(data, epoch)
+        with self._wakeup:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.stats["dropped"] += 1
+            self._buffer.append(row)
+            self.stats["buffered"] = len(self._buffer)
+            if len(self._buffer) >= self.batch_size:
+                self._wakeup.notify()
+
+    def flush(self):
+        """Ask the writer to commit now"""
+        with self._wakeup:
+            self._flush_requested = True
+            self._wakeup.notify()
+
+    def close(self, timeout=10):
+        """Commit what is buffered and stop the writer"""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        conn = None
+        failing = False  # after an error, retry on the flush interval rather than on every add
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            with self._wakeup:
+                while not (self._stopping or self._flush_requested
+                           or (not failing and len(self._buffer) >= self.batch_size)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                rows = list(self._buffer)
+                self._buffer.clear()
+                self.stats["buffered"] = 0
+                self._flush_requested = False
+                stopping = self._stopping
+            deadline = time.monotonic() + self.flush_interval
+
+            if rows:
+                try:
+                    if conn is None:
+                        conn = setup_database(path=self.path)
+                    self._write(conn, rows)
+                    failing = False
+                except sqlite3.Error as e:
+                    failing = True
+                    self.stats["last_error"] = str(e)
+                    logger.error(f"Failed to store {len(rows)} rows: {e}")
+                    self._requeue(rows)
+                    if conn is not None:
+                        conn.close()
+                        conn = None
+            if stopping:
+                break
+        if conn is not None:
+            conn.close()
+
+    def _write(self, conn, rows):
+        """
+        Insert a batch and fold the rows that were actually inserted (not
+        ignored as duplicate epochs) into the rollups, in one transaction
+        """
+        start = time.perf_counter()
+        rollups = RollupEngine(NUMERIC_COLUMNS)
+        floor = self.raw_prune_floor
+        archived = [row for row in rows if floor and row[0] < floor]
+        if archived:
+            self.stats["below_archive"] += len(archived)
+            logger.warning(f"Refused {len(archived)} rows older than the archived months")
+            rows = [row for row in rows if row[0] >= floor]
+        with conn:
+            inserted = 0
+            for row in rows:
+                if conn.execute(INSERT_SQL, row).rowcount:
+                    rollups.add(row[0], dict(zip(SKY_DATA_COLUMNS, row[2:])))
+                    inserted += 1
+            partials = rollups.drain()
+            write_rollups(conn, partials)
+        with conn:
+            self.stats["pruned"] += prune_expired(conn, self.retention, time.time(), self.prune_limit,
+                                                 self.raw_prune_floor)
+        self.stats["written"] += inserted
+        self.stats["duplicates"] += len(rows) - inserted
+        self.stats["rollup_buckets"] += len(partials)
+        newest = max((row[0] for row in rows), default=None)
+        if newest is not None and (self.stats["last_epoch"] is None or newest > self.stats["last_epoch"]):
+            self.stats["last_epoch"] = newest
+        self.stats["commits"] += 1
+        self.stats["last_commit_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self.stats["last_error"] = None
+
+    def _requeue(self, rows):
+        """Put a failed batch back in front of newer rows for the next attempt"""
+        with self._wakeup:
+            newer = list(self._buffer)
+            self._buffer.clear()
+            for row in rows + newer:
+                if len(self._buffer) == self._buffer.maxlen:
+                    self.stats["dropped"] += 1
+                self._buffer.append(row)
+            self.stats["buffered"] = len(self._buffer)
 
 if __name__ == "__main__":
-    print("store_data.py is deprecated - database storage has been removed")
-    print("State is now maintained in memory by control.py")
+    conn = setup_database()
+    count, first, last = conn.execute("SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM sky_data").fetchone()
+    print(f"{DATABASE_NAME}: {count} rows from {first} to {last}")
+    conn.close()
@@ -0,0 +1,79 @@
+# archive_benchmark.py
+# Year-long single-field read: SQLite row store (sky_data) vs memory-mapped
+# monthly columnar archive files.
+# Usage: python test/archive_benchmark.py [cadence_seconds]
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from archive import ArchiveReader, compact_month, month_bounds, next_month
+from store_data import setup_database, to_row, INSERT_SQL
+
+YEAR = 2024
+
+def fill_row_store(conn, cadence):
+    rng = random.Random(42)
+    start, end = month_bounds(YEAR, 1)[0], month_bounds(YEAR, 12)[1]
+    batch = []
+    for epoch in np.arange(start, end, cadence).tolist():
+        batch.append(to_row({"temperature": round(rng.uniform(-5, 25), 1), "humidity": round(rng.uniform(40, 100), 1),
+                             "dew_point": round(rng.uniform(-10, 15), 1), "sky_temperature": round(rng.uniform(-30, 5), 1),
+                             "fan_status": "ON", "heater_status": "OFF", "mode": "NORMAL"}, epoch))
+        if len(batch) == 50000:
+            with conn:
+                conn.executemany(INSERT_SQL, batch)
+            batch = []
+    with conn:
+        conn.executemany(INSERT_SQL, batch)
+    return start, end
+
+def timed(label, func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count, mean = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<36} {best * 1000:9.1f} ms  {count:9,} points  mean {mean:.3f}")
+
+if __name__ == "__main__":
+    cadence = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sky_data.db")
+        directory = os.path.join(tmp, "archive")
+        conn = setup_database(path=path)
+        print(f"Filling one year at {cadence:g} s ...")
+        start, end = fill_row_store(conn, cadence)
+        year, month = YEAR, 1
+        compact_start = time.perf_counter()
+        while (year, month) != (YEAR + 1, 1):
+            compact_month(conn, directory, year, month)
+            year, month = next_month(year, month)
+        print(f"Compacted 12 months in {time.perf_counter() - compact_start:.1f} s")
+        archive_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"Row store {os.path.getsize(path) / 1e6:.1f} MB, archive {archive_bytes / 1e6:.1f} MB")
+
+        def row_store():
+            rows = conn.execute("SELECT epoch, temperature FROM sky_data WHERE epoch BETWEEN ? AND ? ORDER BY epoch",
+                                (start, end)).fetchall()
+            values = np.array([row[1] for row in rows], dtype=np.float64)
+            return len(rows), float(np.nanmean(values))
+
+        def archive():
+            reader = ArchiveReader(directory)
+            count, total = 0, 0.0
+            for _, values in reader.segments("temperature", start, end):
+                count += len(values)
+                total += float(np.nansum(values, dtype=np.float64))
+            reader.close()
+            return count, total / count
+
+        timed("row store (SELECT + fetchall)", row_store)
+        timed("mmap archive (zero-copy segments)", archive)
+        conn.close()
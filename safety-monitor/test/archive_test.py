@@ -0,0 +1,104 @@
+# archive_test.py
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import numpy as np
+
+from archive import ArchiveCompactor, ArchiveFile, ArchiveReader, archive_path, compact_month, month_bounds
+from rollup import prune_expired
+from store_data import setup_database, to_row, INSERT_SQL
+
+FEB_2024 = month_bounds(2024, 2)
+MAR_2024 = month_bounds(2024, 3)
+
+class StoreStub:
+    raw_prune_floor = None
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp.name, "archive")
+        self.conn = setup_database(sqlite3.connect(":memory:"))
+        rows = []
+        for month_start, _ in (FEB_2024, MAR_2024):
+            for i in range(100):
+                rows.append(to_row({"temperature": float(i), "humidity": None if i % 10 else 50.0,
+                                    "fan_status": "ON" if i % 2 else "OFF"}, month_start + i * 600))
+        with self.conn:
+            self.conn.executemany(INSERT_SQL, reversed(rows))
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def test_month_file_round_trip(self):
+        self.assertEqual(compact_month(self.conn, self.directory, 2024, 2), 100)
+        archive = ArchiveFile(archive_path(self.directory, 2024, 2))
+        self.addCleanup(archive.close)
+        self.assertEqual(archive.count, 100)
+        epochs = archive.columns["epoch"]
+        self.assertTrue(np.all(np.diff(epochs) > 0))
+        self.assertEqual(archive.columns["temperature"].dtype, np.float32)
+        self.assertEqual(archive.columns["temperature"].ctypes.data % 64, 0)
+        self.assertTrue(np.isnan(archive.columns["humidity"][1]))
+        self.assertEqual(archive.columns["humidity"][10], 50.0)
+        self.assertEqual(archive.columns["fan_status"].dtype, np.int8)
+        codes = archive.codes["fan_status"]
+        self.assertEqual([codes[c] for c in archive.columns["fan_status"][:2]], ["OFF", "ON"])
+        self.assertNotIn("mode", archive.columns)  # never set: left out of the file
+        self.assertEqual(archive.read("mode", FEB_2024[0], FEB_2024[1])[1].tolist(), [-1] * 100)
+        self.assertTrue(np.isnan(archive.read("wind", FEB_2024[0], FEB_2024[1])[1]).all())
+
+        epochs, values = archive.read("temperature", FEB_2024[0] + 600, FEB_2024[0] + 1800)
+        self.assertEqual(values.tolist(), [1.0, 2.0, 3.0])
+        self.assertFalse(values.flags.owndata)  # a view on the mapping
+
+    def test_many_distinct_text_values_widen_codes(self):
+        month_start = month_bounds(2024, 4)[0]
+        with self.conn:
+            self.conn.executemany(INSERT_SQL, [to_row({"mode": f"MODE-{i}"}, month_start + i * 60) for i in range(300)])
+        compact_month(self.conn, self.directory, 2024, 4)
+        archive = ArchiveFile(archive_path(self.directory, 2024, 4))
+        self.addCleanup(archive.close)
+        self.assertEqual(archive.columns["mode"].dtype, np.int16)
+        codes = archive.codes["mode"]
+        self.assertEqual([codes[c] for c in archive.columns["mode"]], [f"MODE-{i}" for i in range(300)])
+
+    def test_reader_spans_months(self):
+        compact_month(self.conn, self.directory, 2024, 2)
+        compact_month(self.conn, self.directory, 2024, 3)
+        reader = ArchiveReader(self.directory)
+        self.addCleanup(reader.close)
+        self.assertEqual(reader.months(), [(2024, 2), (2024, 3)])
+        self.assertEqual(reader.archived_until(), MAR_2024[1])
+        epochs, values = reader.read("temperature", FEB_2024[0] + 99 * 600, MAR_2024[0])
+        self.assertEqual(values.tolist(), [99.0, 0.0])
+        self.assertEqual(len(reader.read("temperature", 0, 1)[0]), 0)
+
+    def test_compactor_archives_complete_months_outside_window(self):
+        store = StoreStub()
+        compactor = ArchiveCompactor(":unused:", self.directory, store)
+        self.addCleanup(compactor.close)
+        self.assertEqual(store.raw_prune_floor, 0)
+        # March is complete but still inside the live window
+        compactor.compact(self.conn, live_window=86400, now=MAR_2024[1] + 3600)
+        self.assertEqual(compactor.reader.months(), [(2024, 2)])
+        self.assertEqual(store.raw_prune_floor, FEB_2024[1])
+        compactor.compact(self.conn, live_window=86400, now=MAR_2024[1] + 2 * 86400)
+        self.assertEqual(compactor.reader.months(), [(2024, 2), (2024, 3)])
+        self.assertEqual(compactor.stats["months_archived"], 2)
+        self.assertEqual(compactor.stats["rows_archived"], 200)
+        compactor.compact(self.conn, live_window=86400, now=MAR_2024[1] + 2 * 86400)
+        self.assertEqual(compactor.stats["months_archived"], 2)
+
+    def test_raw_rows_kept_until_archived(self):
+        retention = {"raw": 86400}
+        now = MAR_2024[1] + 10 * 86400
+        self.assertEqual(prune_expired(self.conn, retention, now, 1000, raw_floor=FEB_2024[1]), 100)
+        (remaining,) = self.conn.execute("SELECT COUNT(*) FROM sky_data").fetchone()
+        self.assertEqual(remaining, 100)
+
+if __name__ == '__main__':
+    unittest.main()
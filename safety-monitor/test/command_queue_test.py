@@ -0,0 +1,65 @@
+# command_queue_test.py
+import unittest
+from unittest.mock import Mock
+
+import control
+from control_fixture import ControlTestCase
+from uplink_ingest_test import start_command_worker
+
+class TestCommandQueue(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        control.state["snapshot"] = None
+        # Drain what a test left queued before its state is rolled back
+        self.addCleanup(control.process_commands, {})
+
+    def test_command_applied_by_control_thread(self):
+        worker = start_command_worker()
+        try:
+            processed = control.command_stats["processed"]
+            response = self.client.post("/actuators", json={"fan": "off", "heater": "on"})
+            self.assertEqual(response.status_code, 200)
+            applied = response.get_json()["applied_state"]
+            self.assertEqual(applied["fan_mode"], "MANUAL")
+            # Invalid snapshot: safety logic keeps the fail-safe defaults
+            self.assertEqual(applied["fan_status"], "ON")
+            self.assertEqual(applied["heater_status"], "OFF")
+            self.assertFalse(control.state["fan_override"])
+            self.assertEqual(control.command_stats["processed"], processed + 1)
+            self.assertIsNotNone(control.command_stats["last_latency_ms"])
+        finally:
+            worker.set()
+
+    def test_batch_evaluates_safety_once(self):
+        futures = [control.submit_command(lambda: None) for _ in range(5)]
+        cycles = control.state["cycle_count"]
+        control.process_commands({})
+        self.assertEqual(control.state["cycle_count"], cycles + 1)
+        versions = {future.result(timeout=1)["version"] for future in futures}
+        self.assertEqual(len(versions), 1)
+
+    def test_failed_command_sets_exception(self):
+        future = control.submit_command(lambda: 1 / 0)
+        control.process_commands({})
+        with self.assertRaises(ZeroDivisionError):
+            future.result(timeout=1)
+
+    def test_failed_safety_evaluation_fails_batch(self):
+        futures = [control.submit_command(lambda: None) for _ in range(3)]
+        failed = control.command_stats["failed"]
+        self.patch_control(evaluate_safety=Mock(side_effect=RuntimeError("relay write failed")))
+        with self.assertRaises(RuntimeError):
+            control.process_commands({})
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=0)
+        self.assertEqual(control.command_stats["failed"], failed + 3)
+
+    def test_full_queue_rejected(self):
+        for _ in range(control.COMMAND_QUEUE_SIZE):
+            control.submit_command(lambda: None)
+        response = self.client.post("/actuators", json={"fan": "auto"})
+        self.assertEqual(response.status_code, 503)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+# control_fixture.py
+# Shared base for tests that drive control.py in-process. control's state
+# dict, stats dicts and module globals outlive a test, so every change goes
+# through unittest.mock patchers that are undone by addCleanup - also when
+# the test fails or its setUp raises half way.
+
+import unittest
+from unittest.mock import patch
+
+import control
+
+class ControlTestCase(unittest.TestCase):
+    """Each test gets a private copy of control.state, republished when it ends"""
+
+    def setUp(self):
+        self.client = control.app.test_client()
+        # Cleanups run last in, first out: the state is rolled back, then republished
+        self.addCleanup(control.publish_state)
+        self.patch_dict(control.state)
+
+    def patch_dict(self, target, **values):
+        """patch.dict target (optionally setting values) until the test ends"""
+        patcher = patch.dict(target, values)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def patch_control(self, **attributes):
+        """patch.object control's module attributes until the test ends"""
+        for name, value in attributes.items():
+            patcher = patch.object(control, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
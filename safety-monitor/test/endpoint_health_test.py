@@ -0,0 +1,74 @@
+# endpoint_health_test.py
+import unittest
+from endpoint_health import EndpointHealth, order_endpoints, get_endpoint_health, reset_endpoint_health, CLOSED, OPEN, HALF_OPEN
+
+SETTINGS = {
+    "primary_failure_threshold": 3,
+    "breaker_cooldown_seconds": 30,
+    "fallback_retry_interval_seconds": 300,
+    "slow_endpoint_latency_seconds": 1.0,
+    "endpoint_error_rate_threshold": 0.5,
+    "ewma_alpha": 0.5
+}
+
+class TestEndpointHealth(unittest.TestCase):
+    def test_histogram_buckets(self):
+        health = EndpointHealth("a")
+        for latency in (0.01, 0.15, 0.15, 9.0):
+            health.record(latency, True, SETTINGS)
+        histogram = health.snapshot()["histogram"]
+        self.assertEqual(histogram["le_50ms"], 1)
+        self.assertEqual(histogram["le_200ms"], 2)
+        self.assertEqual(histogram["overflow"], 1)
+
+    def test_breaker_trips_and_half_open_probe(self):
+        health = EndpointHealth("a")
+        for _ in range(3):
+            health.record(0.1, False, SETTINGS)
+        self.assertEqual(health.breaker, OPEN)
+        self.assertEqual(health.classify(SETTINGS), "blocked")
+
+        health.open_until = 0  # cooldown elapsed
+        self.assertEqual(health.classify(SETTINGS), "probe")
+        self.assertEqual(health.breaker, HALF_OPEN)
+        self.assertEqual(health.classify(SETTINGS), "blocked")  # one probe at a time
+
+        health.record(0.1, False, SETTINGS)
+        self.assertEqual(health.breaker, OPEN)
+        self.assertEqual(health.cooldown, 60)
+
+        health.open_until = 0
+        health.classify(SETTINGS)
+        health.record(0.1, True, SETTINGS)
+        self.assertEqual(health.breaker, CLOSED)
+
+    def test_released_probe_can_be_claimed_again(self):
+        health = EndpointHealth("a")
+        health.breaker, health.open_until = OPEN, 0
+        self.assertEqual(health.classify(SETTINGS), "probe")
+        health.release_probe()
+        self.assertEqual(health.classify(SETTINGS), "probe")
+
+class TestEndpointOrdering(unittest.TestCase):
+    def setUp(self):
+        reset_endpoint_health()
+
+    def test_slow_primary_is_demoted(self):
+        primary = get_endpoint_health("primary")
+        primary.record(2.0, True, SETTINGS)
+        primary.next_probe = float("inf")
+        self.assertEqual(order_endpoints(["primary", "fallback"], SETTINGS), [(1, "fallback"), (0, "primary")])
+
+    def test_open_breaker_skipped(self):
+        for _ in range(3):
+            get_endpoint_health("primary").record(0.1, False, SETTINGS)
+        self.assertEqual(order_endpoints(["primary", "fallback"], SETTINGS), [(1, "fallback")])
+
+    def test_all_blocked_keeps_configured_order(self):
+        for url in ("primary", "fallback"):
+            for _ in range(3):
+                get_endpoint_health(url).record(0.1, False, SETTINGS)
+        self.assertEqual(order_endpoints(["primary", "fallback"], SETTINGS), [(0, "primary"), (1, "fallback")])
+
+if __name__ == '__main__':
+    unittest.main()
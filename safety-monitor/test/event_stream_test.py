@@ -0,0 +1,80 @@
+# event_stream_test.py
+import json
+import unittest
+
+import control
+from control_fixture import ControlTestCase
+from event_stream import EventBroker, TooManyClients
+
+class TestEventBroker(unittest.TestCase):
+    def test_fan_out(self):
+        broker = EventBroker()
+        first, _ = broker.subscribe()
+        second, _ = broker.subscribe()
+        broker.publish(1, "{}")
+        self.assertEqual(first.next(0.1)[0], 1)
+        self.assertEqual(second.next(0.1)[0], 1)
+        self.assertIsNone(first.next(0.01))
+
+    def test_resume_from_last_event_id(self):
+        broker = EventBroker(history_size=5)
+        for event_id in range(1, 8):
+            broker.publish(event_id, "{}")
+        client, resumed = broker.subscribe(last_event_id=5)
+        self.assertTrue(resumed)
+        self.assertEqual([client.next(0.1)[0], client.next(0.1)[0]], [6, 7])
+
+        # Gap older than the history, or an id from before a restart: full resync
+        self.assertFalse(broker.subscribe(last_event_id=1)[1])
+        self.assertFalse(broker.subscribe(last_event_id=50)[1])
+
+    def test_slow_client_drops_oldest(self):
+        broker = EventBroker(client_queue_size=3)
+        client, _ = broker.subscribe()
+        for event_id in range(1, 11):
+            broker.publish(event_id, "{}")
+        self.assertEqual(client.dropped, 7)
+        self.assertEqual(client.next(0.1)[0], 8)
+
+    def test_client_limit(self):
+        broker = EventBroker(max_clients=1)
+        client, _ = broker.subscribe()
+        with self.assertRaises(TooManyClients):
+            broker.subscribe()
+        broker.unsubscribe(client)
+        broker.subscribe()
+
+class TestEventsEndpoint(ControlTestCase):
+    def read_event(self, chunks):
+        for chunk in chunks:
+            if chunk.startswith(b"id:"):
+                lines = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n"))
+                return int(lines["id"]), json.loads(lines["data"])
+
+    def test_stream_resync_then_changes(self):
+        response = self.client.get("/events")
+        self.assertEqual(response.mimetype, "text/event-stream")
+        chunks = iter(response.response)
+        event_id, data = self.read_event(chunks)
+        self.assertEqual(data["changes"], ["resync"])
+        self.assertEqual(event_id, control.published_state["version"])
+
+        control.state["mode"] = "FALLBACK" if control.state["mode"] != "FALLBACK" else "NORMAL"
+        control.state["fan_status"] = "OFF" if control.state["fan_status"] == "ON" else "ON"
+        version = control.publish_state()
+        event_id, data = self.read_event(chunks)
+        self.assertEqual(event_id, version)
+        self.assertEqual(data["changes"], ["mode", "relays"])
+        self.assertEqual(data["state"]["mode"], control.state["mode"])
+        response.close()
+        self.assertEqual(control.event_broker.stats()["clients"], 0)
+
+    def test_unchanged_version_not_pushed(self):
+        control.publish_state()
+        published = control.event_broker.published
+        control.state["cycle_count"] += 1
+        control.publish_state()
+        self.assertEqual(control.event_broker.published, published)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,400 @@
+# fetch_data_test.py
+# Tests for the HTTP fetch path against a local stand-in for the MeetJeStad API
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fetch_data
+from endpoint_health import reset_endpoint_health, get_endpoint_health
+from history import to_epoch
+
+SETTINGS = {
+    "http_timeout_seconds": 2,
+    "retry_backoff_seconds": 0,
+    "max_data_age_seconds": 300
+}
+
+class MeetJeStadHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        server.get_count += 1
+        time.sleep(server.delay)
+        if server.etag and self.headers.get("If-None-Match") == server.etag:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        records = server.records or [{
+            "id": 580,
+            "timestamp": server.timestamp or datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            "temperature": 12.34,
+            "humidity": 81.2,
+            "request": server.get_count if server.vary_body else 0
+        }]
+        body = json.dumps(records).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if server.etag:
+            self.send_header("ETag", server.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def start_stand_in_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MeetJeStadHandler)
+    server.get_count = 0
+    server.etag = None
+    server.timestamp = None
+    server.vary_body = False
+    server.delay = 0
+    server.records = None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class StandInServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = start_stand_in_server()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/data/?type=sensors&ids=580&format=json&limit=1"
+        fetch_data.close_http_sessions()
+        fetch_data.clear_endpoint_cache()
+
+    def tearDown(self):
+        fetch_data.close_http_sessions()
+        fetch_data.clear_endpoint_cache()
+        self.server.shutdown()
+        self.server.server_close()
+
+class TestPooledHttpSessions(StandInServerTestCase):
+    def test_fetch_returns_valid_snapshot(self):
+        snapshot = fetch_data.fetch_sensor_data_http(self.url, SETTINGS)
+        self.assertTrue(snapshot["valid"], snapshot["errors"])
+        self.assertEqual(snapshot["temperature"], 12.3)
+        self.assertEqual(snapshot["humidity"], 81.2)
+
+    def test_connection_reused_across_polls(self):
+        fetch_data.warm_http_sessions([self.url], SETTINGS)
+        for _ in range(5):
+            fetch_data.fetch_sensor_data_http(self.url, SETTINGS)
+        stats = fetch_data.get_http_session_stats()[f"http://127.0.0.1:{self.server.server_port}"]
+        self.assertEqual(stats["requests"], 6)
+        self.assertEqual(stats["handshakes"], 1)
+        self.assertEqual(stats["reused_requests"], 5)
+
+    def test_same_origin_shares_session(self):
+        other = self.url.replace("ids=580", "ids=1087")
+        self.assertIs(fetch_data.get_http_session(self.url), fetch_data.get_http_session(other))
+
+class TestUnchangedMeasurement(StandInServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server.timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+    def test_identical_body_returns_same_snapshot(self):
+        first = fetch_data.fetch_sensor_data_http(self.url, SETTINGS)
+        second = fetch_data.fetch_sensor_data_http(self.url, SETTINGS)
+        self.assertTrue(first["valid"])
+        self.assertIs(first, second)
+
+    def test_same_timestamp_returns_same_snapshot(self):
+        self.server.vary_body = True
+        first = fetch_data.fetch_sensor_data_http(self.url, SETTINGS)
+        second = fetch_data.fetch_sensor_data_http(self.url, SETTINGS)
+        self.assertIs(first, second)
+
+    def test_etag_not_modified(self):
+        self.server.etag = '"m-1"'
+        first = fetch_data.fetch_sensor_data_http(self.url, SETTINGS)
+        second = fetch_data.fetch_sensor_data_http(self.url, SETTINGS)
+        self.assertIs(first, second)
+        self.assertEqual(self.server.get_count, 2)
+
+    def test_reused_snapshot_is_not_modified(self):
+        first = fetch_data.fetch_sensor_data_http(self.url, SETTINGS)
+        age = first["age_seconds"]
+        time.sleep(0.05)
+        self.assertIs(fetch_data.fetch_sensor_data_http(self.url, SETTINGS), first)
+        self.assertEqual(first["age_seconds"], age)
+
+    def test_new_timestamp_builds_new_snapshot(self):
+        first = fetch_data.fetch_sensor_data_http(self.url, SETTINGS)
+        self.server.timestamp = (datetime.utcnow() + timedelta(seconds=5)).strftime("%Y-%m-%d %H:%M:%S")
+        second = fetch_data.fetch_sensor_data_http(self.url, SETTINGS)
+        self.assertIsNot(first, second)
+        self.assertTrue(second["valid"])
+
+    def test_unchanged_but_too_old_is_invalid(self):
+        fetch_data.fetch_sensor_data_http(self.url, SETTINGS)
+        expired = dict(SETTINGS, max_data_age_seconds=-1)
+        snapshot = fetch_data.fetch_sensor_data_http(self.url, expired, max_retries=1)
+        self.assertFalse(snapshot["valid"])
+
+class TestCycleDeadline(StandInServerTestCase):
+    def test_slow_endpoint_cut_off_at_deadline(self):
+        self.server.delay = 2
+        start = time.monotonic()
+        snapshot = fetch_data.fetch_sensor_data_http(
+            self.url, dict(SETTINGS, http_timeout_seconds=5), deadline=start + 0.5)
+        self.assertFalse(snapshot["valid"])
+        self.assertLess(time.monotonic() - start, 1.5)
+
+    def test_no_inline_backoff_past_deadline(self):
+        start = time.monotonic()
+        snapshot = fetch_data.fetch_sensor_data_http(
+            "http://127.0.0.1:9/data", dict(SETTINGS, retry_backoff_seconds=5),
+            max_retries=3, deadline=start + 1)
+        self.assertFalse(snapshot["valid"])
+        self.assertLess(time.monotonic() - start, 1)
+
+def station_record(station_id, temperature, humidity, age_seconds=0):
+    timestamp = datetime.utcnow() - timedelta(seconds=age_seconds)
+    return {"id": station_id, "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            "temperature": temperature, "humidity": humidity}
+
+class TestMultiStation(StandInServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.settings = dict(SETTINGS,
+            multi_station_ids=[580, 1087, 2001],
+            multi_station_base_url=f"http://127.0.0.1:{self.server.server_port}/data/?type=sensors&format=json")
+
+    def test_fuse_median_rejects_outlier(self):
+        value, used = fetch_data.fuse_median([(1, 10.0), (2, 10.4), (3, 30.0)], 3.0)
+        self.assertAlmostEqual(value, 10.2)
+        self.assertEqual(used, [1, 2])
+
+    def test_fuse_median_two_disagreeing_stations_trusts_first(self):
+        value, used = fetch_data.fuse_median([(1, 10.0), (2, 30.0)], 3.0)
+        self.assertEqual((value, used), (10.0, [1]))
+
+    def test_single_request_for_all_stations(self):
+        self.server.records = [
+            station_record(580, 10.0, 80.0),
+            station_record(1087, 10.6, 82.0),
+            station_record(2001, 45.0, 81.0),
+            station_record(580, 9.0, 70.0, age_seconds=600)
+        ]
+        snapshot = fetch_data.fetch_multi_station_http(self.settings)
+        self.assertTrue(snapshot["valid"], snapshot["errors"])
+        self.assertEqual(self.server.get_count, 1)
+        self.assertEqual(snapshot["temperature"], 10.3)
+        self.assertEqual(snapshot["humidity"], 81.0)
+        self.assertFalse(snapshot["stations"]["2001"]["used_temperature"])
+        self.assertTrue(snapshot["stations"]["2001"]["used_humidity"])
+        self.assertLess(snapshot["stations"]["580"]["age_seconds"], 60)
+
+    def test_stale_and_missing_stations_recorded(self):
+        self.server.records = [
+            station_record(580, 10.0, 80.0),
+            station_record(1087, 11.0, 82.0, age_seconds=900)
+        ]
+        snapshot = fetch_data.fetch_multi_station_http(self.settings)
+        self.assertTrue(snapshot["valid"])
+        self.assertEqual(snapshot["temperature"], 10.0)
+        self.assertEqual(snapshot["stations"]["1087"]["status"], "too_old")
+        self.assertEqual(snapshot["stations"]["2001"]["status"], "missing")
+
+class TestBackfill(StandInServerTestCase):
+    def test_iter_json_array_across_chunks(self):
+        text = json.dumps([{"a": i, "s": "x,]" * i} for i in range(20)])
+        chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+        self.assertEqual([r["a"] for r in fetch_data.iter_json_array(chunks)], list(range(20)))
+
+    def test_iter_json_array_truncated(self):
+        with self.assertRaises(ValueError):
+            list(fetch_data.iter_json_array(['[{"a": 1}, {"a"']))
+
+    def test_with_limit_replaces_limit(self):
+        url = fetch_data._with_limit("https://x/data/?type=sensors&ids=580,1087&limit=1", 50)
+        self.assertEqual(url, "https://x/data/?type=sensors&ids=580,1087&limit=50")
+
+    def test_backfill_inserts_only_gap_records_in_order(self):
+        self.server.records = [station_record(580, 10 + i, 80, age_seconds=600 * i) for i in range(6)]
+        newest = to_epoch(self.server.records[0]["timestamp"])
+        oldest = to_epoch(self.server.records[5]["timestamp"])
+        received = []
+        def on_records(points):
+            received.extend(points)
+            return len(points)
+        inserted = fetch_data.run_backfill(self.url, oldest, newest, SETTINGS, on_records)
+        self.assertEqual(inserted, 4)
+        self.assertEqual([p["temperature"] for _, p in received], [14, 13, 12, 11])
+
+    def test_backfill_is_rate_limited(self):
+        self.server.records = [station_record(580, 10, 80)]
+        settings = dict(SETTINGS, backfill_min_interval_seconds=60)
+        fetch_data._last_backfill_start = None
+        self.assertTrue(fetch_data.request_backfill(self.url, 0, 1, settings, len))
+        fetch_data._backfill_future.result(timeout=5)
+        self.assertFalse(fetch_data.request_backfill(self.url, 0, 1, settings, len))
+
+class TestHedgedFetch(unittest.TestCase):
+    def setUp(self):
+        self.primary = start_stand_in_server()
+        self.fallback = start_stand_in_server()
+        self.urls = [
+            f"http://127.0.0.1:{self.primary.server_port}/data/?ids=580",
+            f"http://127.0.0.1:{self.fallback.server_port}/data/?ids=1087"
+        ]
+        self.settings = dict(SETTINGS, http_timeout_seconds=3, hedge_delay_seconds=0.2)
+        fetch_data.clear_endpoint_cache()
+        reset_endpoint_health()
+
+    def tearDown(self):
+        fetch_data.close_http_sessions()
+        fetch_data.clear_endpoint_cache()
+        for server in (self.primary, self.fallback):
+            server.shutdown()
+            server.server_close()
+
+    def test_fast_primary_wins(self):
+        snapshot, index = fetch_data.fetch_sensor_data_hedged(self.urls, self.settings)
+        self.assertTrue(snapshot["valid"])
+        self.assertEqual(index, 0)
+        self.assertEqual(self.fallback.get_count, 0)
+
+    def test_slow_primary_is_hedged(self):
+        self.primary.delay = 2
+        start = time.monotonic()
+        snapshot, index = fetch_data.fetch_sensor_data_hedged(self.urls, self.settings)
+        self.assertTrue(snapshot["valid"])
+        self.assertEqual(index, 1)
+        self.assertLess(time.monotonic() - start, 1.5)
+
+    def test_dead_primary_falls_through_immediately(self):
+        self.urls[0] = "http://127.0.0.1:9/data/?ids=580"
+        snapshot, index = fetch_data.fetch_sensor_data_hedged(self.urls, dict(self.settings, hedge_delay_seconds=5))
+        self.assertTrue(snapshot["valid"])
+        self.assertEqual(index, 1)
+
+    def test_attempts_feed_endpoint_statistics(self):
+        self.primary.delay = 2
+        fetch_data.fetch_sensor_data_hedged(self.urls, self.settings)
+        fallback = get_endpoint_health(self.urls[1]).snapshot()
+        self.assertEqual(fallback["requests"], 1)
+        self.assertEqual(fallback["histogram"]["le_50ms"] + fallback["histogram"]["le_100ms"], 1)
+
+    def test_all_endpoints_failing(self):
+        urls = ["http://127.0.0.1:9/a", "http://127.0.0.1:9/b"]
+        snapshot, index = fetch_data.fetch_sensor_data_hedged(urls, self.settings)
+        self.assertIsNone(index)
+        self.assertFalse(snapshot["valid"])
+        self.assertEqual(len(snapshot["errors"]), 2)
+
+class TestAllSkyCache(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        fetch_data.clear_allsky_cache()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, data, mtime):
+        with open(self.path, "w") as f:
+            json.dump(data, f)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_parsed_only_when_file_changes(self):
+        self.write({"AS_TEMPERATURE_C": "31", "DAY_OR_NIGHT": "NIGHT", "AS_STARCOUNT": "120"}, 1000)
+        parses = fetch_data.allsky_cache_stats["parses"]
+        for _ in range(5):
+            values, mtime = fetch_data.get_allsky_data_cached(self.path)
+        self.assertEqual(values, (31, 120, "NIGHT"))
+        self.assertEqual(mtime, 1000)
+        self.assertEqual(fetch_data.allsky_cache_stats["parses"], parses + 1)
+
+        self.write({"AS_TEMPERATURE_C": "20", "DAY_OR_NIGHT": "DAY"}, 2000)
+        values, _ = fetch_data.get_allsky_data_cached(self.path)
+        self.assertEqual(values, (20, 0, "DAY"))
+        self.assertEqual(fetch_data.allsky_cache_stats["parses"], parses + 2)
+
+    def test_missing_file(self):
+        values, mtime = fetch_data.get_allsky_data_cached(self.path + ".missing")
+        self.assertEqual(values, (None, None, None))
+        self.assertIsNone(mtime)
+
+class SensorNodeHandler(BaseHTTPRequestHandler):
+    """Stand-in for the allsky-sensors Wi-Fi /status endpoint"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        body = json.dumps({
+            "uptime_seconds": 120,
+            "lora_joined": False,
+            "sensors": {
+                "sky_temp_c": -12.5, "ambient_temp_c": 8.25,
+                "sqm_lux": 0.02, "sqm_ir": 12, "sqm_full": 40,
+                "rain_intensity": self.server.rain_intensity, "wind_speed_ms": 1.5
+            }
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestLocalNode(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), SensorNodeHandler)
+        self.server.delay = 0
+        self.server.rain_intensity = 1023  # dry
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.settings = {"local_node_url": f"http://127.0.0.1:{self.server.server_port}/status",
+                         "local_node_timeout_seconds": 0.5, "local_node_max_age_seconds": 60,
+                         "raining_threshold": 100}
+        fetch_data.reset_local_node()
+
+    def tearDown(self):
+        fetch_data.close_http_sessions()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_fields_mapped_onto_snapshot_names(self):
+        fetch_data.start_local_node_poll(self.settings)
+        values, age = fetch_data.get_local_node_data(self.settings, time.monotonic() + 1)
+        self.assertEqual(values["sky_temperature"], -12.5)
+        self.assertEqual(values["ambient_temperature"], 8.25)
+        self.assertEqual(values["rain_intensity"], 1023)
+        self.assertEqual(values["raining"], 0)
+        self.assertEqual(values["wind"], 1.5)
+        self.assertLess(age, 1)
+
+    def test_low_rain_intensity_is_rain(self):
+        self.server.rain_intensity = 0  # soaked sensor
+        fetch_data.start_local_node_poll(self.settings)
+        values, _ = fetch_data.get_local_node_data(self.settings, time.monotonic() + 1)
+        self.assertEqual(values["raining"], 1)
+
+    def test_slow_node_never_blocks_past_wait_until(self):
+        self.server.delay = 0.3
+        fetch_data.start_local_node_poll(self.settings)
+        start = time.monotonic()
+        values, _ = fetch_data.get_local_node_data(self.settings, start + 0.05)
+        self.assertIsNone(values)
+        self.assertLess(time.monotonic() - start, 0.2)
+        # Result is picked up on a later cycle
+        time.sleep(0.4)
+        values, _ = fetch_data.get_local_node_data(self.settings)
+        self.assertEqual(values["sqm_full"], 40)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+# gorilla_benchmark.py
+# A year of every history field in Gorilla-compressed blocks: memory,
+# per-field compression ratio, append/seal cost and query/decode speed.
+# Usage: python test/gorilla_benchmark.py [cadence_seconds]
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from control import HISTORY_FIELDS
+from gorilla import CompressedHistory
+
+def simulated_year(cadence):
+    """Slowly varying readings rounded like the sensors, some fields never fitted"""
+    rng = np.random.default_rng(42)
+    epochs = np.arange(1704067200, 1704067200 + 365 * 86400, cadence, dtype=np.float64)
+    epochs += rng.integers(0, 3, len(epochs)) / 1000  # ms jitter
+    day = np.sin(2 * np.pi * (epochs % 86400) / 86400)
+    drift = lambda scale: np.cumsum(rng.normal(0, scale, len(epochs)))
+    columns = {
+        "temperature": np.round(10 + 8 * day + drift(0.01), 1),
+        "humidity": np.round(np.clip(75 - 20 * day + drift(0.02), 0, 100), 1),
+        "dew_point": np.round(5 + 3 * day + drift(0.01), 2),
+        "heat_index": np.round(10 + 8 * day, 1),
+        "raining": (rng.random(len(epochs)) < 0.05).astype(float),
+        "wind": np.round(np.abs(drift(0.05)) % 20, 1),
+        "cpu_temperature": np.round(45 + 5 * day + rng.integers(0, 3, len(epochs))),
+        "sky_temperature": np.round(-20 + 10 * day + drift(0.01), 2),
+        "ambient_temperature": np.round(10 + 8 * day + drift(0.01), 2),
+        "sqm_lux": np.round(np.maximum(day, 0) * 1000, 0),
+        "cloud_coverage": np.round(np.clip(50 + drift(0.5), 0, 100), 0),
+    }
+    for field in HISTORY_FIELDS:
+        columns.setdefault(field, np.full(len(epochs), np.nan))
+    return epochs, columns
+
+def main():
+    cadence = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    epochs, columns = simulated_year(cadence)
+    rows = [dict(zip(columns, values)) for values in zip(*(column.tolist() for column in columns.values()))]
+    history = CompressedHistory(HISTORY_FIELDS)
+
+    start = time.perf_counter()
+    for epoch, point in zip(epochs.tolist(), rows):
+        history.append(epoch, point)
+    elapsed = time.perf_counter() - start
+    print(f"{len(epochs)} samples at {cadence:.0f}s: append {elapsed / len(epochs) * 1e6:.1f} us/sample "
+          f"(including sealing)")
+
+    report = history.compression()
+    raw = report["samples"] * 8 * (len(HISTORY_FIELDS) + 1)
+    print(f"Sealed: {report['bytes'] / 1e6:.1f} MB compressed vs {raw / 1e6:.1f} MB as float64 columns "
+          f"({raw / report['bytes']:.1f}x, {report['bytes_per_sample']} bytes per sample)")
+    for field, ratio in report["ratio"].items():
+        print(f"  {field:20s} {ratio:6.1f}x")
+
+    first, last = float(epochs[0]), float(epochs[-1])
+    for label, start_epoch, step in (("year, 1000 buckets", first, (last - first) / 1000),
+                                     ("day, 1 min buckets", last - 86400 + 30, 60),
+                                     ("week, 10 min buckets", last - 7 * 86400 + 30, 600)):
+        history._cache.clear()
+        start = time.perf_counter()
+        result = history.downsample("temperature", start_epoch, last, step)
+        print(f"{label:22s} {(time.perf_counter() - start) * 1000:7.1f} ms cold, "
+              f"{sum(result['count'])} points in {len(result['t'])} buckets")
+
+    block = history._blocks[-1]
+    start = time.perf_counter()
+    block.epochs()
+    block.decode(HISTORY_FIELDS.index("temperature"))
+    print(f"Block decode: {(time.perf_counter() - start) / block.count * 1e6:.2f} us/sample")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# gorilla_test.py
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import closing
+
+import numpy as np
+
+from gorilla import CompressedHistory, encode_timestamps, decode_timestamps, encode_values, decode_values
+from history import MeasurementHistory
+from archive import compact_month, month_bounds
+from store_data import setup_database, to_row, INSERT_SQL
+
+import control
+from control_fixture import ControlTestCase
+
+class TestGorillaCodec(unittest.TestCase):
+    def test_timestamps_round_trip(self):
+        timestamps = [1700000000000 + i * 10000 + (i % 7) * 3 for i in range(500)]
+        timestamps += [timestamps[-1] + 3600000, timestamps[-1] + 86400000 * 30, timestamps[-1] + 86400000 * 30 + 1]
+        data, bits = encode_timestamps(timestamps)
+        self.assertEqual(decode_timestamps(data, len(timestamps)), timestamps)
+        self.assertLess(bits, 64 * len(timestamps) / 4)
+
+    def test_regular_timestamps_cost_one_bit(self):
+        _, bits = encode_timestamps([i * 10000 for i in range(1001)])
+        self.assertEqual(bits, 64 + 4 + 20 + 999)  # first delta is a delta-of-delta from 0
+
+    def test_values_round_trip(self):
+        values = np.round(np.cumsum(np.random.default_rng(1).normal(size=1000)) * 0.1, 1)
+        values[[3, 50, 51]] = np.nan
+        values[100:200] = values[99]
+        values[300] = np.inf
+        values[301] = -0.0
+        data, _ = encode_values(values)
+        decoded = decode_values(data, len(values))
+        self.assertTrue(np.array_equal(decoded.view(np.uint64), values.view(np.uint64)))
+
+    def test_repeated_values_cost_one_bit(self):
+        _, bits = encode_values([21.5] * 1000)
+        self.assertEqual(bits, 64 + 999)
+
+class TestCompressedHistory(unittest.TestCase):
+    def setUp(self):
+        self.history = CompressedHistory(("temperature", "wind"), block_size=64)
+        self.reference = MeasurementHistory(("temperature", "wind"), max_points=1000)
+        for i in range(500):
+            point = {"temperature": round(10 + np.sin(i / 20), 1), "wind": None if i % 9 else i * 0.5}
+            self.history.append(1000 + i * 10, point)
+            self.reference.insert(1000 + i * 10, point)
+
+    def test_seals_blocks(self):
+        self.assertEqual(len(self.history), 500)
+        self.assertEqual(self.history.stats["sealed_blocks"], 500 // 64)
+        self.assertEqual(self.history.oldest_time(), 1000)
+
+    def test_downsample_matches_uncompressed(self):
+        for start, end, step in ((1000, 6000, 60), (1000, 6000, 1000), (1234, 4321, 7), (0, 10000, 10000)):
+            for field in ("temperature", "wind"):
+                self.assertEqual(self.history.downsample(field, start, end, step),
+                                 self.reference.downsample(field, start, end, step))
+
+    def test_whole_blocks_use_summaries(self):
+        self.history.downsample("temperature", 0, 10000, 10000)
+        self.assertEqual(self.history.stats["decoded_blocks"], 0)
+        self.history.downsample("temperature", 1000, 1100, 10)
+        self.history.downsample("temperature", 1000, 1100, 10)
+        self.assertEqual(self.history.stats["decoded_blocks"], 1)
+        self.assertEqual(self.history.stats["cache_hits"], 1)
+
+    def test_late_points(self):
+        self.assertTrue(self.history.append(5985, {"temperature": 1.0}))  # within the open block
+        self.assertFalse(self.history.append(1005, {"temperature": 1.0}))  # already sealed
+        self.assertEqual(self.history.stats["late_dropped"], 1)
+        self.assertEqual(self.history.downsample("temperature", 5985, 5985, 1)["count"], [1])
+
+    def test_retention(self):
+        history = CompressedHistory(("temperature",), block_size=10, retention_seconds=100)
+        for t in range(0, 1000, 5):
+            history.append(t, {"temperature": 1.0})
+        self.assertGreater(history.stats["expired_blocks"], 0)
+        self.assertGreaterEqual(history.oldest_time(), 995 - 100 - 50)
+
+    def test_bulk_load_matches_appends(self):
+        loaded = CompressedHistory(("temperature", "wind"), block_size=64)
+        epochs = np.arange(1000, 1000 + 200 * 10, 10, dtype=np.float64)
+        self.assertEqual(loaded.load(epochs[:150], {"temperature": epochs[:150] / 100}), 150)
+        # Overlapping reload: only the newer points are taken
+        self.assertEqual(loaded.load(epochs, {"temperature": epochs / 100}), 50)
+        appended = CompressedHistory(("temperature", "wind"), block_size=64)
+        for epoch in epochs:
+            appended.append(epoch, {"temperature": epoch / 100})
+        self.assertEqual(loaded.stats["sealed_blocks"], 3)
+        self.assertEqual(len(loaded), 200)
+        for field in ("temperature", "wind"):
+            self.assertEqual(loaded.downsample(field, 1000, 2990, 100), appended.downsample(field, 1000, 2990, 100))
+
+    def test_compression_report(self):
+        report = self.history.compression()
+        self.assertEqual(report["samples"], 7 * 64)
+        self.assertEqual(set(report["ratio"]), {"epoch", "temperature", "wind"})
+        self.assertGreater(report["ratio"]["epoch"], 20)
+
+class TestHistoryFromCompressed(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch_control(compressed_history=CompressedHistory(control.HISTORY_FIELDS, block_size=16),
+                           measurement_history=MeasurementHistory(control.HISTORY_FIELDS, max_points=10))
+        for t in range(1000, 2000, 10):
+            control.compressed_history.append(t, {"temperature": 2.0})
+            control.measurement_history.insert(t, {"temperature": 2.0})
+
+    def test_older_range_from_compressed(self):
+        data = self.client.get("/history?field=temperature&from=1000&to=1990&step=100").get_json()
+        self.assertEqual(data["source"], "compressed")
+        self.assertEqual(sum(data["count"]), 100)
+        self.assertEqual(set(data["mean"]), {2.0})
+
+    def test_rebuilt_from_archive_and_database(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path, directory = os.path.join(tmp.name, "sky_data.db"), os.path.join(tmp.name, "archive")
+        feb, mar = month_bounds(2024, 2)[0], month_bounds(2024, 3)[0]
+        rows = [to_row({"temperature": 1.0, "humidity": 80.0}, feb + i * 600) for i in range(100)]
+        rows += [to_row({"temperature": 3.0, "wind": None}, mar + i * 600) for i in range(100)]
+        with closing(setup_database(path=path)) as conn:
+            with conn:
+                conn.executemany(INSERT_SQL, rows)
+            compact_month(conn, directory, 2024, 2)
+            with conn:
+                conn.execute("DELETE FROM sky_data WHERE epoch < ?", (mar,))  # pruned once archived
+        self.patch_control(sky_data_store=type("Store", (), {"path": path})())
+        history = CompressedHistory(control.HISTORY_FIELDS, block_size=16)
+
+        loaded = control.load_compressed_history({"archive_dir": directory}, history, now=mar + 86400 * 30)
+        self.assertEqual(loaded, 200)
+        result = history.downsample("temperature", feb, mar + 86400, mar - feb, origin=feb)
+        self.assertEqual(result["count"], [100, 100])
+        self.assertEqual(result["mean"], [1.0, 3.0])
+        # Points older than the retention window are left out
+        history = CompressedHistory(control.HISTORY_FIELDS, retention_seconds=86400 * 20)
+        self.assertEqual(control.load_compressed_history({"archive_dir": directory}, history, now=mar + 86400 * 20), 100)
+
+    def test_rebuild_keeps_points_recorded_during_load(self):
+        self.patch_control(sky_data_store=None)
+        control.rebuild_compressed_history({"archive_enabled": False})
+        self.assertEqual(len(control.compressed_history), 10)  # the ring buffer's points
+        self.assertEqual(control.compressed_history.latest_time(), 1990)
+
+    def test_recent_range_from_memory(self):
+        data = self.client.get("/history?field=temperature&from=1950&to=1990&step=10").get_json()
+        self.assertEqual(data["source"], "memory")
+
+if __name__ == "__main__":
+    unittest.main()
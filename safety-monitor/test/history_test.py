@@ -0,0 +1,130 @@
+# history_test.py
+import unittest
+from history import MeasurementHistory, to_epoch
+
+import control
+from control_fixture import ControlTestCase
+
+class TestMeasurementHistory(unittest.TestCase):
+    def test_out_of_order_inserts_are_sorted(self):
+        history = MeasurementHistory()
+        history.insert(300, {"temperature": 3})
+        history.insert_many([(200, {"temperature": 2}), (100, {"temperature": 1})])
+        self.assertEqual([t for t, _ in history.range()], [100, 200, 300])
+        self.assertEqual(history.latest_time(), 300)
+
+    def test_duplicates_ignored(self):
+        history = MeasurementHistory()
+        self.assertTrue(history.insert(100, {}))
+        self.assertFalse(history.insert(100, {}))
+        self.assertEqual(history.insert_many([(100, {}), (101, {})]), 1)
+
+    def test_bounded(self):
+        history = MeasurementHistory(max_points=3)
+        history.insert_many((t, {}) for t in range(10))
+        self.assertEqual([t for t, _ in history.range()], [7, 8, 9])
+
+    def test_range(self):
+        history = MeasurementHistory()
+        history.insert_many((t, {}) for t in range(10))
+        self.assertEqual([t for t, _ in history.range(3, 5)], [3, 4, 5])
+
+    def test_wraps_without_reallocating(self):
+        history = MeasurementHistory(("temperature",), max_points=4)
+        epochs, column = history._epochs, history._columns["temperature"]
+        for t in range(100):
+            history.insert(t, {"temperature": t / 2})
+        self.assertIs(history._epochs, epochs)
+        self.assertIs(history._columns["temperature"], column)
+        self.assertEqual(history.range(), [(96.0, {"temperature": 48.0}), (97.0, {"temperature": 48.5}),
+                                           (98.0, {"temperature": 49.0}), (99.0, {"temperature": 49.5})])
+
+    def test_backfill_across_wrap(self):
+        history = MeasurementHistory(("temperature",), max_points=6)
+        history.insert_many((t, {"temperature": t}) for t in (0, 10, 20, 30, 40, 90, 100))
+        # Full and wrapped; the gap 50..80 is backfilled out of order
+        self.assertEqual(history.insert_many([(t, {"temperature": t}) for t in (80, 50, 60, 70, 90)]), 4)
+        self.assertEqual([t for t, _ in history.range()], [50, 60, 70, 80, 90, 100])
+        self.assertEqual(history.range(60, 70), [(60.0, {"temperature": 60.0}), (70.0, {"temperature": 70.0})])
+        self.assertEqual(history.latest_time(), 100)
+
+    def test_missing_readings_are_none(self):
+        history = MeasurementHistory(("temperature", "wind"))
+        history.insert(1, {"temperature": 5.0, "wind": None})
+        self.assertEqual(history.range(), [(1.0, {"temperature": 5.0, "wind": None})])
+
+    def test_downsample(self):
+        history = MeasurementHistory(("temperature",), max_points=100)
+        history.insert_many((t, {"temperature": None if t == 25 else float(t)}) for t in range(0, 60, 5))
+        result = history.downsample("temperature", 10, 50, 20)
+        self.assertEqual(result["t"], [10, 30, 50])
+        self.assertEqual(result["count"], [3, 4, 1])
+        self.assertEqual(result["mean"], [15.0, 37.5, 50.0])
+        self.assertEqual(result["min"], [10.0, 30.0, 50.0])
+        self.assertEqual(result["max"], [20.0, 45.0, 50.0])
+        self.assertEqual(history.downsample("temperature", 100, 200, 10)["t"], [])
+
+    def test_downsample_all_missing_bucket(self):
+        history = MeasurementHistory(("wind",))
+        history.insert(1, {"wind": None})
+        result = history.downsample("wind", 0, 10, 10)
+        self.assertEqual(result["count"], [0])
+        self.assertEqual(result["mean"], [None])
+
+    def test_to_epoch_naive_is_utc(self):
+        self.assertEqual(to_epoch("1970-01-01 00:01:00"), 60)
+        self.assertEqual(to_epoch("1970-01-01T00:01:00Z"), 60)
+
+class TestHistoryEndpoint(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch_control(measurement_history=MeasurementHistory(control.HISTORY_FIELDS, max_points=100))
+        control.measurement_history.insert_many((1000 + t, {"temperature": float(t)}) for t in range(0, 100, 10))
+
+    def test_history(self):
+        body = self.client.get("/history?field=temperature&from=1000&to=1099&step=50").get_json()
+        self.assertEqual(body["t"], [1000, 1050])
+        self.assertEqual(body["mean"], [20.0, 70.0])
+        self.assertEqual(body["count"], [5, 5])
+
+    def test_iso_bounds_and_bucket_limit(self):
+        body = self.client.get("/history?field=temperature&from=1970-01-01T00:16:40Z&to=1100").get_json()
+        self.assertEqual(body["start"], 1000)
+        self.assertGreaterEqual(body["step"], 100 / control.get_settings().get("history_max_buckets", 1000))
+        self.assertEqual(sum(body["count"]), 10)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get("/history?field=nope").status_code, 400)
+        self.assertEqual(self.client.get("/history?field=temperature&from=x").status_code, 400)
+        self.assertEqual(self.client.get("/history?field=temperature&from=10&to=5").status_code, 400)
+        for query in ("step=nan", "step=inf", "step=-5", "step=0", "from=nan", "from=-inf", "to=inf"):
+            self.assertEqual(self.client.get(f"/history?field=temperature&{query}").status_code, 400, query)
+
+class TestRecordHistory(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stored = []
+        self.patch_control(measurement_history=MeasurementHistory(control.HISTORY_FIELDS, max_points=100),
+                           sky_data_store=type("Store", (), {"add": lambda _, data, epoch: self.stored.append(epoch)})())
+
+    def test_refetched_measurement_is_recorded_once(self):
+        snapshot = {"measurement_timestamp": "2024-01-01T00:00:00Z", "temperature": 5.0}
+        control.record_history(snapshot, {"backfill_enabled": False})
+        control.record_history(dict(snapshot), {"backfill_enabled": False})
+        self.assertEqual(len(control.measurement_history), 1)
+        self.assertEqual(len(self.stored), 1)
+
+    def test_failback_to_older_snapshot_is_unchanged(self):
+        newer = {"valid": True, "measurement_timestamp": "2024-01-01T00:10:00Z", "temperature": 6.0, "humidity": 80}
+        older = {"valid": True, "measurement_timestamp": "2024-01-01T00:05:00Z", "temperature": 5.0, "humidity": 80}
+        control.state["snapshot"], control.state["unchanged_cycles"] = None, 0
+        with control.control_lock:
+            control.install_snapshot(newer, {"backfill_enabled": False})
+            control.install_snapshot(older, {"backfill_enabled": False})
+        self.assertIs(control.state["snapshot"], newer)
+        self.assertEqual(control.state["unchanged_cycles"], 1)
+        self.assertNotIn("dew_point", older)
+        self.assertEqual(len(self.stored), 1)
+
+if __name__ == '__main__':
+    unittest.main()
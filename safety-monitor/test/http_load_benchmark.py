@@ -0,0 +1,92 @@
+# http_load_benchmark.py
+# Request rate and latency of the control API under concurrent keep-alive clients.
+# Without URLs, control.app is served in-process on waitress and on the
+# Werkzeug threaded development server (the previous app.run) for comparison.
+# Against the running services on the Pi:
+#   python test/http_load_benchmark.py http://127.0.0.1:5001/status http://127.0.0.1:5000/
+# Usage: python test/http_load_benchmark.py [--clients N] [--seconds S] [url ...]
+import argparse
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+def run_load(url, clients, seconds):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        session = requests.Session()
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.get(url, timeout=5)
+                response.content
+                if response.status_code >= 400:
+                    failed += 1
+            except requests.RequestException:
+                failed += 1
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rate": len(latencies) / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+        "errors": errors[0]
+    }
+
+def report(label, result):
+    print(f"{label:<44} {result['rate']:9,.0f} req/s  p50 {result['p50']:7.2f} ms  "
+          f"p99 {result['p99']:7.2f} ms  errors {result['errors']}")
+
+def in_process_servers():
+    """Yield (label, base url, close) for control.app on each server"""
+    import logging
+    from werkzeug.serving import make_server
+    from http_server import WSGIServer, serve_in_background
+    import control
+
+    control.publish_state()
+    server = WSGIServer("127.0.0.1", 0, control.app)
+    serve_in_background(server, "bench-waitress")
+    yield "waitress", f"http://127.0.0.1:{server.port}", server.shutdown
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    werkzeug = make_server("127.0.0.1", 0, control.app, threaded=True)
+    threading.Thread(target=werkzeug.serve_forever, daemon=True).start()
+    yield "werkzeug threaded", f"http://127.0.0.1:{werkzeug.port}", lambda: (werkzeug.shutdown(), werkzeug.server_close())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("urls", nargs="*")
+    args = parser.parse_args()
+    print(f"{args.clients} clients, {args.seconds:g} s per run")
+
+    if args.urls:
+        for url in args.urls:
+            report(url, run_load(url, args.clients, args.seconds))
+    else:
+        for label, base, close in in_process_servers():
+            for path in ("/status", "/health"):
+                report(f"{label} {path}", run_load(base + path, args.clients, args.seconds))
+            close()
@@ -0,0 +1,137 @@
+# http_server_test.py
+import socket
+import threading
+import time
+import unittest
+
+import requests
+from flask import Flask, Response, request
+
+from http_server import WSGIServer, serve_in_background, stream_client_limit
+
+def make_app(release=None):
+    app = Flask(__name__)
+
+    @app.route("/ping")
+    def ping():
+        return "pong"
+
+    @app.route("/echo", methods=["POST"])
+    def echo():
+        return request.get_json()
+
+    @app.route("/ignore", methods=["POST"])
+    def ignore():
+        return "ignored"  # leaves the request body unread
+
+    @app.route("/stream")
+    def stream():
+        return Response((f"line {i}\n" for i in range(3)), mimetype="text/plain")
+
+    @app.route("/events")
+    def events():
+        def held():
+            yield b"open\n"
+            release.wait(5)  # a long-lived stream occupies its worker until released
+        return Response(held(), mimetype="text/event-stream")
+
+    @app.route("/remote")
+    def remote():
+        return {"port": request.environ["REMOTE_PORT"]}
+
+    return app
+
+def raw_request(port, data):
+    """Send raw bytes and return the status line of the response"""
+    with socket.create_connection(("127.0.0.1", port), timeout=2) as sock:
+        sock.sendall(data)
+        return sock.recv(4096).split(b"\r\n", 1)[0]
+
+class TestWSGIServer(unittest.TestCase):
+    def start(self, **options):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        server = WSGIServer("127.0.0.1", 0, make_app(self.release), **options)
+        serve_in_background(server, "test-http")
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_ready_and_keep_alive(self):
+        server = self.start()
+        self.assertTrue(server.ready.is_set())
+        session = requests.Session()
+        for _ in range(3):
+            response = session.get(f"http://127.0.0.1:{server.port}/ping", timeout=2)
+            self.assertEqual(response.text, "pong")
+        # All three requests shared one keep-alive connection
+        self.assertEqual(server.stats["connections"], 1)
+
+    def test_bodies_and_streaming_on_one_connection(self):
+        server = self.start()
+        session = requests.Session()
+        base = f"http://127.0.0.1:{server.port}"
+        self.assertEqual(session.post(f"{base}/echo", json={"a": 1}, timeout=2).json(), {"a": 1})
+        self.assertEqual(session.post(f"{base}/ignore", json={"b": 2}, timeout=2).text, "ignored")
+        response = session.get(f"{base}/stream", timeout=2)
+        self.assertEqual(response.headers["Transfer-Encoding"], "chunked")
+        self.assertEqual(response.text, "line 0\nline 1\nline 2\n")
+        self.assertEqual(session.get(f"{base}/ping", timeout=2).text, "pong")
+        self.assertEqual(server.stats["connections"], 1)
+
+    def test_chunked_request_body(self):
+        server = self.start()
+        body = iter([b'{"a":', b' 1}'])  # a generator body is sent chunked
+        response = requests.post(f"http://127.0.0.1:{server.port}/echo", data=body, timeout=2,
+                                 headers={"Content-Type": "application/json"})
+        self.assertEqual(response.json(), {"a": 1})
+
+    def test_malformed_requests(self):
+        server = self.start()
+        self.assertIn(b" 400 ", raw_request(server.port, b"NOT A REQUEST\r\n\r\n"))
+        oversized = b"GET /ping HTTP/1.1\r\nHost: x\r\nX-Big: " + b"a" * 300000 + b"\r\n\r\n"
+        self.assertIn(b" 431 ", raw_request(server.port, oversized))
+        # The server keeps serving afterwards
+        self.assertEqual(requests.get(f"http://127.0.0.1:{server.port}/ping", timeout=2).text, "pong")
+
+    def test_remote_port_is_string(self):
+        server = self.start()
+        port = requests.get(f"http://127.0.0.1:{server.port}/remote", timeout=2).json()["port"]
+        self.assertIsInstance(port, str)
+        self.assertTrue(port.isdigit())
+
+    def test_streams_leave_workers_for_requests(self):
+        server = self.start(threads=2)
+        streams = []
+        for _ in range(stream_client_limit({"http_workers": 2})):
+            stream = requests.get(f"http://127.0.0.1:{server.port}/events", stream=True, timeout=2)
+            self.assertEqual(next(stream.iter_lines()), b"open")
+            streams.append(stream)
+        self.assertEqual(server.stats["active"], 1)
+        start = time.monotonic()
+        self.assertEqual(requests.get(f"http://127.0.0.1:{server.port}/ping", timeout=2).text, "pong")
+        self.assertLess(time.monotonic() - start, 1)
+        self.release.set()
+        for stream in streams:
+            stream.close()
+
+    def test_exhausted_pool_queues_requests(self):
+        server = self.start(threads=1)
+        stream = requests.get(f"http://127.0.0.1:{server.port}/events", stream=True, timeout=2)
+        self.addCleanup(stream.close)
+        next(stream.iter_lines())
+        threading.Timer(0.3, self.release.set).start()
+        # Waits for the busy worker instead of failing
+        self.assertEqual(requests.get(f"http://127.0.0.1:{server.port}/ping", timeout=3).text, "pong")
+
+    def test_stream_client_limit(self):
+        self.assertEqual(stream_client_limit({"http_workers": 16, "sse_max_clients": 8}), 8)
+        self.assertEqual(stream_client_limit({"http_workers": 6, "sse_max_clients": 8}), 3)
+        self.assertEqual(stream_client_limit({"http_workers": 1, "sse_max_clients": 8}), 1)
+
+    def test_port_in_use_raises(self):
+        server = self.start()
+        with self.assertRaises(OSError):
+            WSGIServer("127.0.0.1", server.port, make_app())
+
+if __name__ == '__main__':
+    unittest.main()
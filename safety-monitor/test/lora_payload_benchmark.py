@@ -0,0 +1,48 @@
+# lora_payload_benchmark.py
+# Per-record struct.unpack decoding vs bulk NumPy decoding of LoRaWAN uplinks.
+# Usage: python test/lora_payload_benchmark.py [count]
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from lora_payload import decode_uplinks, to_columns, to_snapshots, PAYLOAD_SIZE
+
+FORMAT = struct.Struct(">HhhhHHHfIHBhbH")
+
+def make_buffer(count):
+    rng = random.Random(42)
+    return b"".join(
+        FORMAT.pack(rng.randint(0, 1023), rng.randint(0, 3000), rng.randint(-4000, 2000), rng.randint(-2000, 3500),
+                    rng.randint(0, 65535), rng.randint(0, 65535), rng.randint(0, 65535), rng.random() * 10,
+                    i, rng.randint(3300, 4200), rng.randint(0, 15), rng.randint(-120, -30), rng.randint(-20, 10), 0)
+        for i in range(count))
+
+def decode_per_record(buffer):
+    columns = {"sky_temperature": [], "ambient_temperature": [], "wind": [], "rain_intensity": [], "raining": [],
+               "sqm_lux": []}
+    for offset in range(0, len(buffer), PAYLOAD_SIZE):
+        rain, wind, sky, ambient, _, _, _, lux, _, _, flags, _, _, _ = FORMAT.unpack_from(buffer, offset)
+        columns["sky_temperature"].append(sky / 100 if flags & 1 else None)
+        columns["ambient_temperature"].append(ambient / 100 if flags & 1 else None)
+        columns["sqm_lux"].append(lux if flags & 2 else None)
+        columns["rain_intensity"].append(rain if flags & 4 else None)
+        columns["raining"].append((1 if rain < 100 else 0) if flags & 4 else None)
+        columns["wind"].append(wind / 100 if flags & 8 else None)
+    return columns
+
+def timed(label, func, count):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms  {count / elapsed:12,.0f} records/s")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    buffer = make_buffer(count)
+    print(f"{count} uplinks, {len(buffer)} bytes")
+    timed("struct.unpack per record", lambda: decode_per_record(buffer), count)
+    timed("numpy bulk -> columns", lambda: to_columns(decode_uplinks(buffer)), count)
+    timed("numpy bulk -> snapshot dicts", lambda: to_snapshots(decode_uplinks(buffer)), count)
@@ -0,0 +1,83 @@
+# lora_payload_test.py
+import unittest
+from lora_payload import decode_uplink, decode_uplinks, to_columns, to_snapshots, parse_network_uplink, PAYLOAD_SIZE
+from uplink_sender import encode_payload, ttn_uplink_message, chirpstack_uplink_message
+
+class TestLoraPayload(unittest.TestCase):
+    def test_layout_matches_firmware(self):
+        self.assertEqual(len(encode_payload()), PAYLOAD_SIZE)
+
+    def test_decode_single(self):
+        fields = decode_uplink(encode_payload(rain=512))
+        self.assertEqual(fields["rain_intensity"], 512)
+        self.assertEqual(fields["raining"], 0)
+        self.assertEqual(fields["wind"], 3.25)
+        self.assertEqual(fields["sky_temperature"], -12.5)
+        self.assertEqual(fields["ambient_temperature"], 8.75)
+        self.assertEqual(fields["sqm_lux"], 0.125)
+        self.assertEqual(fields["uptime_seconds"], 3600)
+        self.assertEqual(fields["battery_mv"], 3700)
+        self.assertEqual(fields["rssi"], -97)
+        self.assertEqual(fields["snr"], -7)
+
+    def test_invalid_flags_give_none(self):
+        fields = decode_uplink(encode_payload(flags=0x01))
+        self.assertEqual(fields["sky_temperature"], -12.5)
+        self.assertIsNone(fields["sqm_lux"])
+        self.assertIsNone(fields["rain_intensity"])
+        self.assertIsNone(fields["raining"])
+        self.assertIsNone(fields["wind"])
+
+    def test_rain_polarity(self):
+        # The sensor reads 0 when soaked and 1023 when dry
+        self.assertEqual(decode_uplink(encode_payload(rain=0), rain_threshold=100)["raining"], 1)
+        self.assertEqual(decode_uplink(encode_payload(rain=99), rain_threshold=100)["raining"], 1)
+        self.assertEqual(decode_uplink(encode_payload(rain=100), rain_threshold=100)["raining"], 0)
+        self.assertEqual(decode_uplink(encode_payload(rain=1023), rain_threshold=100)["raining"], 0)
+
+    def test_bulk_decode_is_zero_copy(self):
+        buffer = bytearray(b"".join(encode_payload(uptime=i) for i in range(1000)))
+        records = decode_uplinks(buffer)
+        self.assertEqual(len(records), 1000)
+        self.assertFalse(records.flags.owndata)
+        self.assertEqual(to_columns(records)["uptime_seconds"][999], 999)
+        snapshots = to_snapshots(records[10:12])
+        self.assertEqual([s["uptime_seconds"] for s in snapshots], [10, 11])
+
+    def test_bad_length(self):
+        with self.assertRaises(ValueError):
+            decode_uplinks(b"\x00" * 31)
+        with self.assertRaises(ValueError):
+            decode_uplink(b"\x00" * 60)
+
+class TestNetworkUplink(unittest.TestCase):
+    def test_ttn(self):
+        payload, meta = parse_network_uplink(ttn_uplink_message(encode_payload(), f_cnt=42))
+        self.assertEqual(payload, encode_payload())
+        self.assertEqual(meta["device_id"], "allsky-sensors")
+        self.assertEqual(meta["f_cnt"], 42)
+        self.assertEqual(meta["gateway_rssi"], -97)
+
+    def test_chirpstack(self):
+        payload, meta = parse_network_uplink(chirpstack_uplink_message(encode_payload()))
+        self.assertEqual(payload, encode_payload())
+        self.assertEqual(meta["gateway_snr"], 5.0)
+
+    def test_missing_or_bad_payload(self):
+        for message in (None, {}, {"uplink_message": {}}, {"data": "not base64!"}):
+            with self.assertRaises(ValueError):
+                parse_network_uplink(message)
+
+    def test_malformed_shapes_are_value_errors(self):
+        good = ttn_uplink_message(encode_payload())
+        for message in ([good], {"uplink_message": [1]}, dict(good, end_device_ids="allsky"),
+                        dict(good, uplink_message=dict(good["uplink_message"], rx_metadata=["gw"])),
+                        dict(good, uplink_message=dict(good["uplink_message"], frm_payload=123)),
+                        {"data": "AAAA", "rxInfo": {"rssi": -90}}):
+            with self.assertRaises(ValueError):
+                parse_network_uplink(message)
+        message = dict(good, uplink_message=dict(good["uplink_message"], rx_metadata=[{"rssi": "strong"}]))
+        self.assertEqual(parse_network_uplink(message)[0], encode_payload())  # non-numeric rssi is ignored
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+# published_state_test.py
+import unittest
+
+import control
+from control_fixture import ControlTestCase
+
+class TestPublishedState(ControlTestCase):
+    def test_published_copy_is_isolated_and_read_only(self):
+        control.state["snapshot"] = {"valid": True, "temperature": 12.0}
+        control.state["mode"] = "NORMAL"
+        version = control.publish_state()
+        published = control.published_state
+        self.assertEqual(published["version"], version)
+
+        # Later control-thread mutations don't leak into the published version
+        control.state["mode"] = "FALLBACK"
+        control.state["snapshot"]["temperature"] = 99.0
+        self.assertEqual(published["mode"], "NORMAL")
+        self.assertEqual(published["snapshot"]["temperature"], 12.0)
+        with self.assertRaises(TypeError):
+            published["mode"] = "ERROR"
+        with self.assertRaises(TypeError):
+            published["snapshot"]["temperature"] = 0
+
+        self.assertEqual(control.publish_state(), version + 1)
+        self.assertEqual(control.published_state["mode"], "FALLBACK")
+
+    def test_api_reads_published_version(self):
+        control.state["mode"] = "NORMAL"
+        version = control.publish_state()
+        control.state["mode"] = "FALLBACK"  # not yet published
+        status = self.client.get("/status").get_json()
+        self.assertEqual(status["mode"], "NORMAL")
+        self.assertEqual(status["state_version"], version)
+        self.assertEqual(self.client.get("/health").get_json()["mode"], "NORMAL")
+
+if __name__ == '__main__':
+    unittest.main()
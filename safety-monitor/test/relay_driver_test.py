@@ -0,0 +1,67 @@
+# relay_driver_test.py
+import unittest
+from unittest.mock import patch
+
+import control
+from control import RelayDriver, relay_levels, RELAY_FAN_IN
+
+class FakeLgpio:
+    """Records group writes; group_read returns the pin levels (optionally stuck bits)"""
+
+    def __init__(self):
+        self.bits = 0
+        self.stuck = 0
+        self.calls = []
+
+    def group_claim_output(self, handle, gpios, levels):
+        self.calls.append(("claim", tuple(gpios), tuple(levels)))
+        self.bits = sum(level << i for i, level in enumerate(levels))
+
+    def group_write(self, handle, gpio, bits, mask):
+        self.calls.append(("write", gpio, bits, mask))
+        self.bits = (self.bits & ~mask) | (bits & mask)
+
+    def group_read(self, handle, gpio):
+        return self.bits | self.stuck
+
+class TestRelayDriver(unittest.TestCase):
+    def test_writes_only_on_transitions(self):
+        driver = RelayDriver()
+        self.assertTrue(driver.apply(relay_levels(fan_on=True, heater_on=False)))
+        self.assertFalse(driver.apply(relay_levels(fan_on=True, heater_on=False)))
+        self.assertTrue(driver.apply(relay_levels(fan_on=True, heater_on=True)))
+        stats = driver.stats()
+        self.assertEqual(stats["writes"], 2)
+        self.assertEqual(stats["skipped_writes"], 1)
+        # The initial write is not an actuation; only the heater switched afterwards
+        self.assertEqual(stats["actuations"], {"fan_in": 0, "fan_out": 0, "heater": 1})
+        self.assertEqual(stats["levels"]["heater"], 0)
+
+    def test_group_write_and_readback(self):
+        fake = FakeLgpio()
+        with patch.object(control, "GPIO_AVAILABLE", True), patch.object(control, "lgpio", fake, create=True):
+            driver = RelayDriver()
+            driver.claim(relay_levels(fan_on=True, heater_on=False))
+            driver.apply(relay_levels(fan_on=True, heater_on=False))
+            driver.apply(relay_levels(fan_on=False, heater_on=False))
+        writes = [call for call in fake.calls if call[0] == "write"]
+        self.assertEqual(len(writes), 1)
+        # One write for both fan pins, leader pin first, heater bit untouched by the mask
+        self.assertEqual(writes[0], ("write", RELAY_FAN_IN, 0b111, 0b011))
+        self.assertEqual(driver.stats()["actuations"], {"fan_in": 1, "fan_out": 1, "heater": 0})
+
+    def test_readback_mismatch_forces_rewrite(self):
+        fake = FakeLgpio()
+        fake.stuck = 0b100  # heater pin stuck high
+        with patch.object(control, "GPIO_AVAILABLE", True), patch.object(control, "lgpio", fake, create=True):
+            driver = RelayDriver()
+            driver.claim(relay_levels(fan_on=True, heater_on=False))
+            driver.apply(relay_levels(fan_on=True, heater_on=True))
+            self.assertEqual(driver.stats()["verify_failures"], 1)
+            self.assertIsNone(driver.levels)
+            driver.apply(relay_levels(fan_on=True, heater_on=True))
+        self.assertEqual(len([call for call in fake.calls if call[0] == "write"]), 2)
+        self.assertEqual(fake.calls[-1][3], 0b111)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# rollup_test.py
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import control
+from control_fixture import ControlTestCase
+from history import MeasurementHistory
+from rollup import RollupEngine, write_rollups, prune_expired, pick_tier, query_history
+from store_data import setup_database, SkyDataStore, NUMERIC_COLUMNS
+
+def rollup_rows(conn, tier, field="temperature"):
+    return conn.execute("SELECT epoch, min, max, sum, count, last FROM sky_data_rollup "
+                        "WHERE tier = ? AND field = ? ORDER BY epoch", (tier, field)).fetchall()
+
+class TestRollupEngine(unittest.TestCase):
+    def setUp(self):
+        self.conn = setup_database(sqlite3.connect(":memory:"))
+        self.engine = RollupEngine(("temperature", "raining"))
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_aggregates_per_tier(self):
+        for epoch, value in ((0, 5.0), (30, 1.0), (70, 3.0), (950, 7.0)):
+            self.engine.add(epoch, {"temperature": value, "raining": "no"})
+        write_rollups(self.conn, self.engine.drain())
+        self.assertEqual(rollup_rows(self.conn, "1m"), [(0, 1.0, 5.0, 6.0, 2, 1.0), (60, 3.0, 3.0, 3.0, 1, 3.0),
+                                                        (900, 7.0, 7.0, 7.0, 1, 7.0)])
+        self.assertEqual(rollup_rows(self.conn, "15m"), [(0, 1.0, 5.0, 9.0, 3, 3.0), (900, 7.0, 7.0, 7.0, 1, 7.0)])
+        self.assertEqual(rollup_rows(self.conn, "1h"), [(0, 1.0, 7.0, 16.0, 4, 7.0)])
+        self.assertEqual(rollup_rows(self.conn, "1h", "raining"), [])
+        self.assertEqual(self.engine.drain(), [])
+
+    def test_late_sample_merges_into_written_bucket(self):
+        self.engine.add(40, {"temperature": 2.0})
+        write_rollups(self.conn, self.engine.drain())
+        self.engine.add(10, {"temperature": 9.0})  # backfilled, older than the last
+        write_rollups(self.conn, self.engine.drain())
+        self.assertEqual(rollup_rows(self.conn, "1m"), [(0, 2.0, 9.0, 11.0, 2, 2.0)])
+
+    def test_prune_is_bounded(self):
+        with self.conn:
+            self.conn.executemany("INSERT INTO sky_data (epoch, temperature) VALUES (?, ?)",
+                                  [(t, 1.0) for t in range(10)])
+        for t in range(0, 600, 60):
+            self.engine.add(t, {"temperature": 1.0})
+        write_rollups(self.conn, self.engine.drain())
+        retention = {"raw": 5, "1m": 300}
+        self.assertEqual(prune_expired(self.conn, retention, now=10, limit=3), 3)
+        self.assertEqual(prune_expired(self.conn, retention, now=10, limit=3), 2)
+        self.assertEqual(prune_expired(self.conn, retention, now=10, limit=3), 0)
+        self.assertEqual(prune_expired(self.conn, retention, now=600, limit=100), 5 + 5)
+        self.assertEqual([row[0] for row in rollup_rows(self.conn, "1m")], [300, 360, 420, 480, 540])
+        self.assertEqual(len(rollup_rows(self.conn, "15m")), 1)  # no retention = kept
+
+class TestQueryHistory(unittest.TestCase):
+    def setUp(self):
+        self.conn = setup_database(sqlite3.connect(":memory:"))
+        engine = RollupEngine(NUMERIC_COLUMNS)
+        rows = [(t, float(t // 10)) for t in range(0, 7200, 10)]
+        with self.conn:
+            self.conn.executemany("INSERT INTO sky_data (epoch, temperature) VALUES (?, ?)", rows)
+            for epoch, value in rows:
+                engine.add(epoch, {"temperature": value})
+            write_rollups(self.conn, engine.drain())
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_pick_tier(self):
+        self.assertIsNone(pick_tier(30))
+        self.assertEqual(pick_tier(60), "1m")
+        self.assertEqual(pick_tier(1800), "15m")
+        self.assertEqual(pick_tier(86400), "1h")
+
+    def test_coarsest_tier_matches_raw(self):
+        for step in (30, 120, 1800, 7200):
+            result = query_history(self.conn, "temperature", 0, 7199, step, NUMERIC_COLUMNS)
+            self.assertEqual(result["tier"], pick_tier(step) or "raw")
+            self.assertEqual(sum(result["count"]), 720)
+            self.assertEqual(result["min"][0], 0.0)
+            self.assertEqual(result["max"][-1], 719.0)
+        hourly = query_history(self.conn, "temperature", 0, 7199, 3600, NUMERIC_COLUMNS)
+        self.assertEqual(hourly["t"], [0, 3600])
+        self.assertEqual(hourly["mean"], [179.5, 539.5])
+
+    def test_unknown_field(self):
+        with self.assertRaises(ValueError):
+            query_history(self.conn, "fan_status", 0, 1, 60, NUMERIC_COLUMNS)
+
+class TestHistoryFromDatabase(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        path = os.path.join(self.tmp.name, "sky_data.db")
+        store = SkyDataStore(path, batch_size=1000, flush_interval=60).start()
+        for t in range(0, 3600, 60):
+            store.add({"temperature": 1.0}, epoch=t)
+        store.close()
+        # Committed up to 3540; 3600..3840 are only in memory
+        self.patch_control(sky_data_store=store,
+                           measurement_history=MeasurementHistory(control.HISTORY_FIELDS, max_points=100))
+        control.measurement_history.insert_many((t, {"temperature": 3.0}) for t in range(3000, 3900, 60))
+
+    def test_database_and_uncommitted_memory(self):
+        body = self.client.get("/history?field=temperature&from=0&to=3899&step=1800").get_json()
+        self.assertEqual(body["source"], "15m")
+        self.assertEqual(body["t"], [0, 1800, 3600])
+        self.assertEqual(body["count"], [30, 30, 5])
+        self.assertEqual(body["max"], [1.0, 1.0, 3.0])
+
+    def test_range_in_memory(self):
+        body = self.client.get("/history?field=temperature&from=3000&to=3899&step=60").get_json()
+        self.assertEqual(body["source"], "memory")
+        self.assertEqual(sum(body["count"]), 15)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# scheduler_test.py
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import control
+from control import ScheduledTask, Scheduler
+from control_fixture import ControlTestCase
+
+class TestScheduledTask(unittest.TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.calls = []
+
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+
+    def make_task(self, interval=10, run_async=False, func=None):
+        task = ScheduledTask("test", func or self.calls.append, "interval", interval, run_async)
+        task.next_due = 100.0
+        return task
+
+    def test_runs_on_cadence_and_reports_lateness(self):
+        task = self.make_task()
+        task.run_if_due(99.0, {}, self.executor)
+        self.assertEqual(len(self.calls), 0)
+        task.run_if_due(100.5, {}, self.executor)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(task.last_lateness, 0.5)
+        self.assertEqual(task.next_due, 110.0)  # stays on the grid
+        self.assertEqual(task.missed, 0)
+
+    def test_missed_slots_reanchor(self):
+        task = self.make_task()
+        task.run_if_due(135.0, {}, self.executor)
+        self.assertEqual(task.missed, 3)
+        self.assertEqual(task.next_due, 145.0)
+
+    def test_interval_from_settings(self):
+        task = self.make_task()
+        task.run_if_due(100.0, {"interval": 2}, self.executor)
+        self.assertEqual(task.next_due, 102.0)
+
+    def test_zero_interval_falls_back_to_default(self):
+        task = self.make_task()
+        task.run_if_due(135.0, {"interval": 0}, self.executor)
+        self.assertEqual(task.missed, 3)
+        self.assertEqual(task.next_due, 145.0)
+
+    def test_trigger_runs_before_deadline(self):
+        task = self.make_task()
+        task.next_due = time.monotonic() + 100
+        task.trigger()
+        task.run_if_due(time.monotonic(), {}, self.executor)
+        self.assertEqual(len(self.calls), 1)
+        self.assertLess(task.last_lateness, 1)
+        self.assertIsNone(task.triggered)
+
+    def test_async_overrun_is_missed_deadline(self):
+        release = threading.Event()
+        task = self.make_task(run_async=True, func=lambda settings: release.wait(5))
+        task.run_if_due(100.0, {}, self.executor)
+        task.run_if_due(110.0, {}, self.executor)
+        self.assertEqual(task.runs, 1)
+        self.assertEqual(task.missed, 1)
+        release.set()
+        task.future.result(timeout=5)
+        task.run_if_due(120.0, {}, self.executor)
+        self.assertEqual(task.runs, 2)
+        self.assertIsNotNone(task.stats()["last_duration_seconds"])
+
+class TestScheduler(ControlTestCase):
+    def test_trigger_wakes_wait(self):
+        task = ScheduledTask("slow", lambda settings: None, "interval", 60)
+        scheduler = Scheduler([task])
+        scheduler.start()
+        scheduler.run_pending({})
+        threading.Timer(0.05, scheduler.trigger, args=(task,)).start()
+        start = time.monotonic()
+        scheduler.wait()
+        self.assertLess(time.monotonic() - start, 5)
+        scheduler.run_pending({})
+        self.assertEqual(task.runs, 2)
+        scheduler.executor.shutdown()
+
+    def test_failed_fetch_brings_retry_forward(self):
+        control.fetch_task.next_due = time.monotonic() + 60
+        control.state["next_fetch_time"] = 0.0
+        control.state["snapshot"] = None
+        def failing(settings):
+            control.state["next_fetch_time"] = time.monotonic() + 2
+            return False
+        self.patch_control(run_fetch_stage=failing)
+        control.scheduled_fetch({})
+        self.assertLess(control.fetch_task.next_due - time.monotonic(), 3)
+
+    def test_fetch_outcome_applied_under_control_lock(self):
+        settings = {"endpoints": ["http://primary.invalid/"], "hedged_fetch": False, "sleep_time": 10,
+                    "primary_failure_threshold": 3}
+        control.state.update(next_fetch_time=0.0, fetch_failure_streak=0, primary_failure_count=0,
+                             last_error=None)
+        self.patch_control(fetch_with_health=lambda endpoint, settings, deadline: None)
+        worker = threading.Thread(target=control.run_fetch_stage, args=(settings,))
+        with control.control_lock:
+            worker.start()
+            worker.join(0.2)
+            # The worker's state update waits for the lock: nothing half applied
+            self.assertTrue(worker.is_alive())
+            self.assertEqual((control.state["primary_failure_count"], control.state["fetch_failure_streak"],
+                              control.state["last_error"]), (0, 0, None))
+        worker.join(5)
+        self.assertEqual((control.state["primary_failure_count"], control.state["fetch_failure_streak"]), (1, 1))
+        self.assertGreater(control.state["next_fetch_time"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# settings_test.py
+import json
+import os
+import tempfile
+import unittest
+
+from settings import SettingsService, SettingsError, validate_settings, DEFAULT_SETTINGS
+
+class TestSettingsService(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "settings.json")
+        self.write({"sleep_time": 5})
+        self.service = SettingsService(self.path)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, content, bump=0):
+        with open(self.path, "w") as f:
+            f.write(content if isinstance(content, str) else json.dumps(content))
+        # Make the change visible even on coarse mtime filesystems
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + bump * 1_000_000_000))
+
+    def test_merged_with_defaults_and_read_only(self):
+        settings = self.service.get()
+        self.assertEqual(settings["sleep_time"], 5)
+        self.assertEqual(settings["control_port"], DEFAULT_SETTINGS["control_port"])
+        with self.assertRaises(TypeError):
+            settings["sleep_time"] = 1
+
+    def test_cached_until_file_changes(self):
+        first = self.service.get()
+        self.assertIs(self.service.get(), first)
+        self.write({"sleep_time": 7}, bump=1)
+        self.assertEqual(self.service.get()["sleep_time"], 7)
+        self.assertEqual(self.service.stats["reloads"], 2)
+
+    def test_subscribers_notified(self):
+        calls = []
+        self.service.get()
+        self.service.subscribe(lambda new, old: calls.append((old["sleep_time"], new["sleep_time"])))
+        self.write({"sleep_time": 9}, bump=1)
+        self.service.get()
+        self.assertEqual(calls, [(5, 9)])
+
+    def test_invalid_file_keeps_last_good(self):
+        self.service.get()
+        for bump, content in enumerate(['{"sleep_time": ', {"sleep_time": "fast"}, {"control_port": 0}], start=1):
+            self.write(content, bump=bump)
+            self.assertEqual(self.service.get()["sleep_time"], 5)
+        self.assertEqual(self.service.stats["rejected"], 3)
+        self.assertIsNotNone(self.service.stats["last_error"])
+
+    def test_validation(self):
+        with self.assertRaises(SettingsError):
+            validate_settings({"hedged_fetch": "yes"})
+        with self.assertRaises(SettingsError):
+            validate_settings({"http_timeout_seconds": -1})
+        for key in ("fetch_interval_seconds", "command_poll_interval_seconds", "archive_interval_seconds"):
+            with self.assertRaises(SettingsError):
+                validate_settings({key: 0})
+        with self.assertRaises(SettingsError):
+            validate_settings({"history_max_buckets": 0})
+        settings = validate_settings({"http_timeout_seconds": 2.5, "custom": [1]})
+        self.assertEqual(settings["http_timeout_seconds"], 2.5)
+        self.assertEqual(settings["custom"], (1,))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# status_cache_test.py
+import time
+import unittest
+from datetime import datetime
+
+import control
+from control_fixture import ControlTestCase
+
+class TestStatusCache(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        control.state["snapshot"] = {"valid": True, "temperature": 12.0,
+                                     "received_timestamp": datetime.utcnow().isoformat()}
+        control.publish_state()
+
+    def test_cached_per_version_with_volatile_fields(self):
+        first = self.client.get("/status")
+        misses = control.status_cache_stats["misses"]
+        time.sleep(0.2)
+        second = self.client.get("/status")
+        self.assertEqual(control.status_cache_stats["misses"], misses)
+        self.assertEqual(first.headers["ETag"], second.headers["ETag"])
+        body = second.get_json()
+        self.assertEqual(body["snapshot"]["temperature"], 12.0)
+        self.assertEqual(body["state_version"], control.published_state["version"])
+        # Naive received_timestamp is UTC
+        self.assertLess(body["age_seconds"], 5)
+        self.assertGreaterEqual(body["age_seconds"], 0)
+        self.assertGreaterEqual(body["uptime_seconds"], first.get_json()["uptime_seconds"])
+
+    def test_not_modified_until_new_version(self):
+        etag = self.client.get("/status").headers["ETag"]
+        response = self.client.get("/status", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+        control.state["mode"] = "FALLBACK"
+        control.publish_state()
+        response = self.client.get("/status", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.get_json()["mode"], "FALLBACK")
+
+    def test_diagnostics(self):
+        diagnostics = self.client.get("/diagnostics").get_json()
+        self.assertIn("scheduler", diagnostics)
+        self.assertIn("status_cache", diagnostics)
+        timing = diagnostics["cycle_timing"]
+        for key in ("last_duration_seconds", "last_lateness_seconds", "max_lateness_seconds",
+                    "cycle_overruns", "budget_overruns", "deferred_fetches", "fetch_failure_streak"):
+            self.assertIn(key, timing)
+        self.assertEqual(timing["cycle_overruns"], control.safety_task.stats()["missed_deadlines"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# store_data_benchmark.py
+# Per-row commits vs batched executemany into the WAL sky_data table, and
+# commits per hour at the 10 s measurement cadence.
+# Usage: python test/store_data_benchmark.py [rows] [batch_size] [flush_interval_seconds]
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from store_data import setup_database, to_row, INSERT_SQL, SkyDataStore
+
+CADENCE_SECONDS = 10
+
+def make_rows(count, start=1_700_000_000):
+    rng = random.Random(42)
+    return [to_row({"temperature": rng.uniform(-5, 25), "humidity": rng.uniform(40, 100),
+                    "dew_point": rng.uniform(-10, 15), "fan_status": "ON", "heater_status": "OFF",
+                    "sky_temperature": rng.uniform(-30, 5), "mode": "NORMAL"}, start + i * CADENCE_SECONDS)
+            for i in range(count)]
+
+def timed(label, func, count):
+    start = time.perf_counter()
+    commits = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed * 1000:9.1f} ms  {count / elapsed:12,.0f} rows/s  {commits:6} commits")
+
+def per_row(path, rows):
+    conn = setup_database(path=path)
+    for row in rows:
+        with conn:
+            conn.execute(INSERT_SQL, row)
+    conn.close()
+    return len(rows)
+
+def batched(path, rows, batch_size):
+    conn = setup_database(path=path)
+    for i in range(0, len(rows), batch_size):
+        with conn:
+            conn.executemany(INSERT_SQL, rows[i:i + batch_size])
+    conn.close()
+    return -(-len(rows) // batch_size)
+
+def via_store(path, rows, batch_size):
+    store = SkyDataStore(path, batch_size=batch_size, flush_interval=3600).start()
+    for row in rows:
+        store.add({"temperature": row[2]}, epoch=row[0])
+    store.close(timeout=60)
+    return store.stats["commits"]
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    flush_interval = float(sys.argv[3]) if len(sys.argv) > 3 else 600
+    rows = make_rows(count)
+    print(f"{count} rows, batch size {batch_size}")
+    with tempfile.TemporaryDirectory() as tmp:
+        timed("commit per row", lambda: per_row(os.path.join(tmp, "a.db"), rows[:min(count, 2000)]), min(count, 2000))
+        timed(f"executemany x{batch_size}", lambda: batched(os.path.join(tmp, "b.db"), rows, batch_size), count)
+        timed(f"SkyDataStore (batch {batch_size})", lambda: via_store(os.path.join(tmp, "c.db"), rows, batch_size), count)
+
+    rows_per_hour = 3600 / CADENCE_SECONDS
+    batched_commits = max(rows_per_hour / batch_size, 3600 / flush_interval)
+    print(f"At a {CADENCE_SECONDS} s cadence: {rows_per_hour:.0f} rows/hour, "
+          f"{rows_per_hour:.0f} commits/hour per row vs {batched_commits:.0f} commits/hour batched "
+          f"(batch {batch_size}, flush every {flush_interval:g} s)")
@@ -1,7 +1,10 @@
 # store_data_test.py
+import os
+import tempfile
+import time
 import unittest
 import sqlite3
-from store_data import store_sky_data, setup_database
+from store_data import store_sky_data, setup_database, query_sky_data, SkyDataStore
 
 class TestDatabaseIntegration(unittest.TestCase):
     def setUp(self):
@@ -49,5 +52,94 @@ class TestDatabaseIntegration(unittest.TestCase):
                     sample_data['fan_status'], sample_data['heater_status'])
         self.assertEqual(results, expected)
 
+class TestSkyDataStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "sky_data.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def rows(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            return query_sky_data(conn, 0, 1e10, ("temperature",))
+        finally:
+            conn.close()
+
+    def wait_for_commits(self, store, commits):
+        deadline = time.monotonic() + 5
+        while store.stats["commits"] < commits and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_batches_commits(self):
+        store = SkyDataStore(self.path, batch_size=5, flush_interval=60).start()
+        self.addCleanup(store.close)
+        for t in range(4):
+            store.add({"temperature": float(t)}, epoch=1000 + t)
+        time.sleep(0.1)
+        self.assertEqual(store.stats["commits"], 0)
+        store.add({"temperature": 4.0}, epoch=1004)
+        self.wait_for_commits(store, 1)
+        self.assertEqual(store.stats["commits"], 1)
+        self.assertEqual(self.rows(), [(1000.0 + t, float(t)) for t in range(5)])
+
+    def test_close_flushes_and_duplicates_ignored(self):
+        store = SkyDataStore(self.path, batch_size=100, flush_interval=60).start()
+        store.add({"temperature": 1.0}, epoch=1000)
+        store.add({"temperature": 2.0}, epoch=1000)
+        store.add({"temperature": 3.0, "measurement_timestamp": "1970-01-01T00:16:50Z"})
+        store.close()
+        self.assertEqual(self.rows(), [(1000.0, 1.0), (1010.0, 3.0)])
+        conn = sqlite3.connect(self.path)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        conn.close()
+
+    def test_rollups_count_only_inserted_rows(self):
+        store = SkyDataStore(self.path, batch_size=100, flush_interval=60, max_buffered=3).start()
+        store.add({"temperature": 99.0}, epoch=990)  # dropped when the buffer overflows
+        store.add({"temperature": 1.0}, epoch=1000)
+        store.add({"temperature": 2.0}, epoch=1001)
+        store.add({"temperature": 5.0}, epoch=1000)  # duplicate epoch, ignored
+        store.flush()
+        self.wait_for_commits(store, 1)
+        store.add({"temperature": 2.0}, epoch=1001)  # re-fetched in a later batch
+        store.close()
+        conn = sqlite3.connect(self.path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute("SELECT min, max, sum, count FROM sky_data_rollup "
+                                      "WHERE tier = '1h' AND field = 'temperature'").fetchall(),
+                         [(1.0, 2.0, 3.0, 2)])
+        self.assertEqual(store.stats["dropped"], 1)
+        self.assertEqual(store.stats["duplicates"], 2)
+        self.assertEqual(store.stats["written"], 2)
+
+    def test_rows_below_archive_refused(self):
+        store = SkyDataStore(self.path, batch_size=100, flush_interval=60).start()
+        store.raw_prune_floor = 1000  # months before this are archived
+        store.add({"temperature": 1.0}, epoch=990)  # late backfill
+        store.add({"temperature": 2.0}, epoch=1000)
+        store.close()
+        self.assertEqual(self.rows(), [(1000.0, 2.0)])
+        self.assertEqual(store.stats["below_archive"], 1)
+        self.assertEqual(store.stats["duplicates"], 0)
+
+    def test_flush_interval(self):
+        store = SkyDataStore(self.path, batch_size=100, flush_interval=0.1).start()
+        self.addCleanup(store.close)
+        store.add({"temperature": 1.0}, epoch=1000)
+        self.wait_for_commits(store, 1)
+        self.assertEqual(self.rows(), [(1000.0, 1.0)])
+
+    def test_failed_batch_is_kept(self):
+        store = SkyDataStore(os.path.join(self.tmp.name, "missing", "sky.db"), batch_size=1, flush_interval=60).start()
+        self.addCleanup(store.close)
+        store.add({"temperature": 1.0}, epoch=1000)
+        deadline = time.monotonic() + 5
+        while store.stats["last_error"] is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNotNone(store.stats["last_error"])
+        self.assertEqual(store.stats["buffered"], 1)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,77 @@
+# uplink_ingest_test.py
+import threading
+import unittest
+from unittest.mock import Mock
+
+import control
+from control_fixture import ControlTestCase
+from settings import get_settings
+from uplink_sender import encode_payload, ttn_uplink_message
+
+def start_command_worker():
+    """Stand-in for the control thread: drain the command queue until stopped"""
+    stop = threading.Event()
+    def run():
+        while not stop.is_set():
+            control.process_commands(get_settings())
+            stop.wait(0.005)
+    threading.Thread(target=run, daemon=True).start()
+    return stop
+
+class TestUplinkWebhook(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch_control(get_settings=Mock(return_value=dict(get_settings(), uplink_webhook_token="secret")))
+        self.patch_dict(control.latest_uplink, values=None, received=None)
+        self.worker = start_command_worker()
+        self.addCleanup(self.worker.set)
+        control.state["snapshot"] = {"valid": True, "temperature": 10.0, "humidity": 95.0,
+                                     "dew_point": 9.3, "raining": None, "received_timestamp": None}
+        control.state["heater_override"] = True
+        control.state["heater_status"] = "OFF"
+        control.state["last_heater_off_time"] = None
+
+    def post(self, message, token="secret"):
+        return self.client.post("/uplink", json=message, headers={"Authorization": f"Bearer {token}"})
+
+    def test_uplink_updates_snapshot_and_relays_immediately(self):
+        response = self.post(ttn_uplink_message(encode_payload(rain=1023)))  # dry
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["heater_status"], "ON")
+        self.assertEqual(control.state["snapshot"]["sky_temperature"], -12.5)
+        self.assertIsNotNone(control.state["snapshot"].get("cloud_coverage"))
+
+        # Rain in the next uplink forces the manual heater override off without waiting for a cycle
+        response = self.post(ttn_uplink_message(encode_payload(rain=20), f_cnt=2))  # wet
+        self.assertEqual(response.get_json()["heater_status"], "OFF")
+        self.assertEqual(control.state["snapshot"]["rain_intensity"], 20)
+        self.assertEqual(control.state["snapshot"]["raining"], 1)
+        self.assertEqual(control.uplink_stats["last_device"], "allsky-sensors")
+
+    def test_token_required(self):
+        self.assertEqual(self.post(ttn_uplink_message(encode_payload()), token="wrong").status_code, 401)
+        control.get_settings.return_value = dict(get_settings(), uplink_webhook_token="")
+        self.assertEqual(self.post(ttn_uplink_message(encode_payload()), token="").status_code, 503)
+        self.assertIsNone(control.latest_uplink["values"])
+
+    def test_invalid_payload_rejected(self):
+        rejected = control.uplink_stats["rejected"]
+        message = ttn_uplink_message(encode_payload()[:20])
+        self.assertEqual(self.post(message).status_code, 400)
+        self.assertEqual(self.post({"foo": 1}).status_code, 400)
+        self.assertEqual(self.post({"uplink_message": {"frm_payload": "AAAA", "rx_metadata": ["gw"]}}).status_code, 400)
+        self.assertEqual(self.post({"uplink_message": ["not", "an", "object"]}).status_code, 400)
+        self.assertEqual(control.uplink_stats["rejected"], rejected + 4)
+        self.assertIsNone(control.latest_uplink["values"])
+
+    def test_stale_uplink_is_cleared(self):
+        self.post(ttn_uplink_message(encode_payload()))
+        control.latest_uplink["received"] -= 1000
+        snapshot = control.state["snapshot"]
+        control.merge_uplink_data(snapshot, {"uplink_max_age_seconds": 180})
+        self.assertIsNone(snapshot["sky_temperature"])
+        self.assertGreater(snapshot["uplink_age_seconds"], 180)
+        self.assertFalse(control.uplink_is_fresh({"uplink_max_age_seconds": 180}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+# uplink_sender.py
+# Stand-in network server: posts TTN v3 style uplink webhooks carrying an
+# allsky-sensors payload to the control service's /uplink endpoint.
+# Usage: python test/uplink_sender.py <token> [url] [count] [interval_seconds]
+import base64
+import struct
+import sys
+import time
+from datetime import datetime, timezone
+
+import requests
+
+def encode_payload(rain=1023, wind=3.25, sky=-12.5, ambient=8.75, ir=100, full=400, visible=300,
+                   lux=0.125, uptime=3600, battery=3700, flags=0x0F, rssi=-97, snr=-7):
+    """Mirror of encodePayload() in firmware/allsky-sensors/src/lora.cpp (rain: 0 = wet, 1023 = dry)"""
+    return struct.pack(">HhhhHHHfIHBhbH", rain, round(wind * 100), round(sky * 100), round(ambient * 100),
+                       ir, full, visible, lux, uptime, battery, flags, rssi, snr, 0)
+
+def ttn_uplink_message(payload, f_cnt=1, device_id="allsky-sensors"):
+    """Minimal TTN v3 uplink webhook body"""
+    now = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    return {
+        "end_device_ids": {"device_id": device_id},
+        "received_at": now,
+        "uplink_message": {
+            "f_port": 1,
+            "f_cnt": f_cnt,
+            "frm_payload": base64.b64encode(payload).decode("ascii"),
+            "rx_metadata": [{"gateway_ids": {"gateway_id": "stand-in"}, "rssi": -97, "snr": 7.5}],
+            "received_at": now
+        }
+    }
+
+def chirpstack_uplink_message(payload, f_cnt=1, device_name="allsky-sensors"):
+    """Minimal Chirpstack v4 uplink event body"""
+    return {
+        "deviceInfo": {"deviceName": device_name},
+        "time": datetime.now(timezone.utc).isoformat(),
+        "fCnt": f_cnt,
+        "fPort": 1,
+        "data": base64.b64encode(payload).decode("ascii"),
+        "rxInfo": [{"rssi": -101, "snr": 5.0}]
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python test/uplink_sender.py <token> [url] [count] [interval_seconds]")
+        sys.exit(1)
+    headers = {"Authorization": f"Bearer {sys.argv[1]}"}
+    url = sys.argv[2] if len(sys.argv) > 2 else "http://127.0.0.1:5001/uplink"
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    interval = float(sys.argv[4]) if len(sys.argv) > 4 else 60
+    for f_cnt in range(1, count + 1):
+        message = ttn_uplink_message(encode_payload(uptime=int(time.monotonic())), f_cnt)
+        start = time.perf_counter()
+        response = requests.post(url, json=message, headers=headers, timeout=5)
+        print(f"#{f_cnt}: HTTP {response.status_code} in {(time.perf_counter() - start) * 1000:.1f} ms {response.text.strip()}")
+        if f_cnt < count:
+            time.sleep(interval)
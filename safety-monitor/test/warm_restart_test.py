@@ -0,0 +1,109 @@
+# warm_restart_test.py
+import json
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import control
+from control_fixture import ControlTestCase
+
+SETTINGS = {"restore_max_age_seconds": 600, "max_data_age_seconds": 300, "dewpoint_threshold": 2,
+            "cpu_temp_threshold": 70, "ambient_temp_threshold": 30, "heater_min_off_time_seconds": 1800}
+
+def iso(seconds_ago):
+    return (datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)).isoformat()
+
+class TestWarmRestart(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch_dict(control.startup_stats)
+        self.patch_dict(control._startup)
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "state.json")
+        control.state.update(snapshot=None, mode="INITIALIZING", last_heater_off_time=None, heater_status="OFF")
+
+    def write(self, **overrides):
+        saved = {"snapshot": {"valid": True, "temperature": 10.0, "humidity": 80.0, "dew_point": 6.7,
+                              "measurement_timestamp": iso(120)},
+                 "mode": "FALLBACK", "heater_status": "OFF", "last_heater_off_time": iso(60),
+                 "active_endpoint_index": 1, "timestamp": iso(60)}
+        saved.update(overrides)
+        with open(self.path, "w") as f:
+            json.dump(saved, f)
+
+    def test_save_and_restore_round_trip(self):
+        off_time = datetime.now(timezone.utc) - timedelta(seconds=30)
+        control.state.update(snapshot={"valid": True, "temperature": 10.0, "humidity": 80.0,
+                                       "measurement_timestamp": iso(5)},
+                             mode="NORMAL", last_heater_off_time=off_time, active_endpoint_index=0)
+        control.save_state_snapshot(self.path)
+        control.state.update(snapshot=None, mode="INITIALIZING", last_heater_off_time=None)
+
+        self.assertTrue(control.restore_state_snapshot(SETTINGS, self.path))
+        self.assertEqual(control.state["mode"], "NORMAL")
+        self.assertEqual(control.state["snapshot"]["temperature"], 10.0)
+        self.assertEqual(control.state["last_heater_off_time"], off_time)
+        self.assertEqual(control.state["active_endpoint_index"], 0)
+        self.assertTrue(control.startup_stats["restored"])
+
+    def test_stale_snapshot_keeps_heater_off_time_only(self):
+        self.write(snapshot={"valid": True, "temperature": 10.0, "humidity": 80.0,
+                             "measurement_timestamp": iso(3600)})
+        self.assertFalse(control.restore_state_snapshot(SETTINGS, self.path))
+        self.assertIsNone(control.state["snapshot"])
+        self.assertEqual(control.state["mode"], "INITIALIZING")
+        self.assertIsNotNone(control.state["last_heater_off_time"])
+        self.assertIn("too old", control.startup_stats["restore_error"])
+
+    def test_bound_capped_at_live_data_age_limit(self):
+        self.write(snapshot={"valid": True, "temperature": 10.0, "humidity": 80.0,
+                             "measurement_timestamp": iso(400)})
+        self.assertFalse(control.restore_state_snapshot(SETTINGS, self.path))
+        self.assertIn("limit 300s", control.startup_stats["restore_error"])
+
+    def test_heater_on_counts_as_switched_off_at_restart(self):
+        self.write(heater_status="ON", last_heater_off_time=iso(7200))
+        control.restore_state_snapshot(SETTINGS, self.path)
+        elapsed = (datetime.now(timezone.utc) - control.state["last_heater_off_time"]).total_seconds()
+        self.assertLess(elapsed, 5)
+
+    def test_rejects_invalid_state(self):
+        for overrides in ({"mode": "STALE"},
+                          {"snapshot": {"valid": False, "temperature": 10.0, "humidity": 80.0}},
+                          {"snapshot": {"valid": True, "temperature": "warm", "humidity": 80.0}},
+                          {"snapshot": {"valid": True, "temperature": 10.0, "humidity": None}},
+                          {"timestamp": None}):
+            self.write(**overrides)
+            self.assertFalse(control.restore_state_snapshot(SETTINGS, self.path), overrides)
+            self.assertIsNone(control.state["snapshot"])
+        with open(self.path, "w") as f:
+            f.write("{truncated")
+        self.assertFalse(control.restore_state_snapshot(SETTINGS, self.path))
+        os.remove(self.path)
+        self.assertFalse(control.restore_state_snapshot(SETTINGS, self.path))
+        self.assertEqual(control.startup_stats["restore_error"], "No saved state")
+
+    def test_first_decision_uses_restored_snapshot(self):
+        self.write()
+        control._startup.update(started=time.monotonic())
+        control.startup_stats.update(first_decision_ms=None, first_decision_source=None)
+        control.restore_state_snapshot(SETTINGS, self.path)
+        control.evaluate_safety(dict(SETTINGS, local_node_url=None))
+        self.assertEqual(control.state["mode"], "FALLBACK")
+        self.assertEqual(control.startup_stats["first_decision_source"], "restored")
+        self.assertIsNotNone(control.startup_stats["first_decision_ms"])
+
+    def test_restored_snapshot_expires(self):
+        self.write()
+        control.restore_state_snapshot(SETTINGS, self.path)
+        control._startup["expires"] = time.monotonic() - 1
+        control.evaluate_safety(dict(SETTINGS, local_node_url=None))
+        self.assertIsNone(control.state["snapshot"])
+        self.assertEqual(control.state["mode"], "STALE")
+        self.assertTrue(control.startup_stats["restored_snapshot_expired"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -36,3 +36,9 @@ def calculate_dewPoint(T, RH):
     _dewPoint = (c * gamma) / (b - gamma)
     return _dewPoint
 
+
+def rain_detected(rain_intensity, threshold):
+    """Rain sensor ADC reading (0 = wet, 1023 = dry) -> 1 raining, 0 dry, None without a reading"""
+    if rain_intensity is None or rain_intensity != rain_intensity:
+        return None
+    return 1 if rain_intensity < threshold else 0